@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of the merge phase of Playlist.preprocess over synthetic playlists.
+
+Usage: python -m benchmarks.bench_merge [--sizes 100,1000,10000,50000]
+"""
+
+import argparse
+import logging
+import random
+import shutil
+import tempfile
+
+from music_dl.core.playlist import Playlist
+from music_dl.core.state import StateStore
+from music_dl.core.youtube_dl import YDLQueueStatus
+from music_dl.lib.log import logger
+
+# URL of synthetic playlists, which is never requested
+BENCHMARK_URL = 'https://www.youtube.com/playlist?list=PLbenchmark'
+
+
+class PlaylistYoutubeDL(object):
+    """
+    Stand-in for YoutubeDL which extracts a synthetic playlist
+    """
+
+    def __init__(self, params=None, pl_data=None, host_limiter=None):
+        # Playlist re-initializes YoutubeDL with options, which must not reset the synthetic playlist
+        if params is None:
+            self.pl_data = pl_data
+
+    def extract_info(self, url, download=False, process=False):
+        return self.pl_data
+
+
+def preprocess_playlist(working_dir, pl_data, playlist_start=1, playlist_end=0):
+    """
+    The function that retrieves a synthetic playlist and merges it with its saved state by Playlist.preprocess
+
+    :param str working_dir: Working directory
+    :param dict pl_data: Playlist data extracted
+    :param int playlist_start: Index specifying playlist item to start at
+    :param int playlist_end: Index specifying playlist item to end at
+    :rtype Playlist
+    :return: Playlist ready to download, whose key is 'benchmark'
+    """
+    playlist = Playlist(download_url=BENCHMARK_URL, working_dir=working_dir, playlist_start=playlist_start, playlist_end=playlist_end,
+                        cache_ttl=0, test_id='benchmark')
+    playlist.ydl = PlaylistYoutubeDL(pl_data=pl_data)
+    playlist.preprocess(playlist.download_url, working_dir)
+    return playlist
+
+
+def generate_playlist(size, private_ratio=0.01, seed=0):
+    """
+    The function that generates playlist data in the same form youtube-dl returns without processing
+
+    :param int size: Number of entries
+    :param float private_ratio: Ratio of private or deleted entries
+    :param int seed: Random seed
+    :rtype dict
+    :return: Playlist data
+    """
+    rand = random.Random(seed)
+    entries = []
+    for index in range(size):
+        title = '[Private video]' if rand.random() < private_ratio else 'Song {}'.format(index + 1)
+        entries.append({
+            '_type': 'url',
+            'ie_key': 'Youtube',
+            'id': 'id{:09d}'.format(index),
+            'url': 'id{:09d}'.format(index),
+            'title': title,
+        })
+    return {
+        '_type': 'playlist',
+        'id': 'PLbenchmark',
+        'title': 'Benchmark',
+        'extractor': 'youtube:tab',
+        'extractor_key': 'YoutubeTab',
+        'entries': entries,
+    }
+
+
+def generate_saved_playlist(pl_data, finished_ratio=0.5, seed=1):
+    """
+    The function that generates playlist data previously saved on download directory, shuffled so ids do not line up with the remote playlist
+
+    :param dict pl_data: Playlist data
+    :param float finished_ratio: Ratio of finished entries
+    :param int seed: Random seed
+    :rtype dict
+    :return: Playlist data
+    """
+    rand = random.Random(seed)
+    entries = [dict(entry) for entry in pl_data['entries']]
+    rand.shuffle(entries)
+    for entry in entries:
+        entry['status'] = YDLQueueStatus.finished.value if rand.random() < finished_ratio else YDLQueueStatus.ready.value
+    return dict(pl_data, entries=entries)
+
+
+def bench_merge(size, repeat=3):
+    """
+    The function that measures merge time of a range of a playlist with the given number of entries.
+    The merge phase recorded by the metrics of the playlist is reported, so retrieval and directories created by preprocess are not measured.
+
+    :param int size: Number of entries
+    :param int repeat: Number of measurements. The fastest is reported.
+    :rtype float
+    :return: Elapsed seconds
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        head_playlist_data = generate_playlist(size)
+        base_playlist_data = generate_saved_playlist(head_playlist_data)
+        state_store = StateStore(working_dir)
+
+        best = float('inf')
+        for _ in range(repeat):
+            state_store.save_playlist('benchmark', base_playlist_data)
+            pl_data = dict(head_playlist_data, entries=[dict(entry) for entry in head_playlist_data['entries']])
+
+            playlist = preprocess_playlist(working_dir, pl_data, playlist_start=size // 4 + 1, playlist_end=size * 3 // 4)
+            best = min(best, playlist.metrics.phases['merge'])
+        return best
+
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of playlist merge')
+    parser.add_argument('--sizes', default='100,1000,5000,10000,50000', help='Comma separated numbers of entries.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of measurements for each size.')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+
+    print('{:>8} {:>12} {:>14}'.format('entries', 'seconds', 'usec/entry'))
+    for size in [int(size) for size in args.sizes.split(',')]:
+        elapsed = bench_merge(size, args.repeat)
+        print('{:>8} {:>12.4f} {:>14.2f}'.format(size, elapsed, elapsed / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
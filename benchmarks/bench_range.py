@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of Playlist.preprocess with a narrow range over paged playlists of growing length.
+
+Usage: python -m benchmarks.bench_range [--lengths 5000,50000,500000] [--start 4000] [--end 4010]
+"""
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+
+from youtube_dl.utils import OnDemandPagedList
+
+from music_dl.core.playlist import Playlist
+from music_dl.lib.log import logger
+
+
+class PagedPlaylistYoutubeDL(object):
+    """
+    Stand-in for YoutubeDL which extracts a synthetic playlist whose entries are fetched page by page
+    """
+
+    def __init__(self, params=None, length=0, page_size=100, host_limiter=None):
+        # Playlist re-initializes YoutubeDL with options, which must not reset the synthetic playlist
+        if params is None:
+            self.length = length
+            self.page_size = page_size
+            self.fetched_pages = 0
+
+    def extract_info(self, url, download=False, process=False):
+        return {
+            '_type': 'playlist',
+            'id': 'PLbenchmark',
+            'title': 'Benchmark',
+            'extractor': 'youtube:playlist',
+            'extractor_key': 'YoutubePlaylist',
+            'entries': OnDemandPagedList(self.__fetch_page, self.page_size),
+        }
+
+    def __fetch_page(self, page_number):
+        self.fetched_pages += 1
+        start = page_number * self.page_size
+        for index in range(start, min(start + self.page_size, self.length)):
+            yield {'_type': 'url', 'ie_key': 'Youtube', 'id': 'id{:09d}'.format(index), 'url': 'id{:09d}'.format(index), 'title': 'Song {}'.format(index + 1)}
+
+
+def bench_range(length, playlist_start, playlist_end):
+    """
+    The function that measures preprocess of a range of the playlist
+
+    :param int length: Number of entries on the playlist
+    :param int playlist_start: Index specifying playlist item to start at
+    :param int playlist_end: Index specifying playlist item to end at
+    :rtype (float, int, int)
+    :return: (Elapsed seconds, Number of pages fetched, Number of entries scheduled)
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        playlist = Playlist(download_url='https://www.youtube.com/playlist?list=PLbenchmark', working_dir=working_dir,
+                            playlist_start=playlist_start, playlist_end=playlist_end)
+        ydl = PagedPlaylistYoutubeDL(length=length)
+        playlist.ydl = ydl
+
+        start = time.perf_counter()
+        playlist.preprocess(playlist.download_url, working_dir)
+        elapsed = time.perf_counter() - start
+        return elapsed, ydl.fetched_pages, len(playlist.scheduled_queue_indices)
+
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of range-aware playlist retrieval')
+    parser.add_argument('--lengths', default='5000,50000,500000', help='Comma separated numbers of entries on the playlist.')
+    parser.add_argument('--start', type=int, default=4000, help='Index specifying playlist item to start at.')
+    parser.add_argument('--end', type=int, default=4010, help='Index specifying playlist item to end at.')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+
+    print('{:>8} {:>12} {:>8} {:>10}'.format('entries', 'seconds', 'pages', 'scheduled'))
+    for length in [int(length) for length in args.lengths.split(',')]:
+        elapsed, pages, scheduled = bench_range(length, args.start, args.end)
+        print('{:>8} {:>12.4f} {:>8} {:>10}'.format(length, elapsed, pages, scheduled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of adaptive concurrency against a local server which refuses more connections than it allows at once.
+
+Usage: python -m benchmarks.bench_ratelimit [--songs 24] [--jobs 8] [--allowed 2] [--size 1048576]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from music_dl.core.ratelimit import RateLimiter
+from music_dl.core.youtube_dl import YDLRateLimited
+from music_dl.lib.log import logger
+
+
+class QuietLogger(object):
+    def debug(self, msg):
+        pass
+
+    warning = error = debug
+
+
+class ThrottlingServer(ThreadingHTTPServer):
+    """
+    Stand-in for a site which responds with HTTP 429 while more songs than allowed are downloaded at once
+    """
+
+    def __init__(self, allowed=2, size=1024 * 1024, chunk_delay=0.005):
+        super().__init__(('127.0.0.1', 0), ThrottlingHandler)
+        self.allowed = allowed
+        self.size = size
+        self.chunk_delay = chunk_delay
+        self.active = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.__send_headers(200, self.server.size)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            is_throttled = self.server.active > self.server.allowed
+            if is_throttled:
+                self.server.throttled += 1
+
+        try:
+            if is_throttled:
+                self.__send_headers(429, 0)
+                return
+
+            self.__send_headers(200, self.server.size)
+            chunk = b'\0' * 64 * 1024
+            for _ in range(self.server.size // len(chunk)):
+                self.wfile.write(chunk)
+                time.sleep(self.server.chunk_delay)
+
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def __send_headers(self, status, length):
+        self.send_response(status)
+        self.send_header('Content-Type', 'audio/webm')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+
+def bench_ratelimit(songs, jobs, allowed, size, adaptive):
+    """
+    The function that downloads songs from the throttling server with a pool of workers
+
+    :param int songs: Number of songs downloaded
+    :param int jobs: Number of songs downloaded concurrently
+    :param int allowed: Number of songs the server allows to download at once
+    :param int size: Bytes of each song
+    :param bool adaptive: Flag that indicates workers are limited by adaptive concurrency
+    :rtype (float, int, int, float)
+    :return: (Elapsed seconds, Number of songs downloaded, Number of throttled responses, Final concurrency limit)
+    """
+    server = ThrottlingServer(allowed=allowed, size=size)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    working_dir = tempfile.mkdtemp()
+    host_limiter = RateLimiter(max_concurrency=jobs, cooldown=0.5, min_sample_bytes=0).get(server.url) if adaptive else None
+
+    def download(index):
+        ydl = YDLRateLimited(params={'outtmpl': '{}/%(id)s.%(ext)s'.format(working_dir), 'logger': QuietLogger(), 'noprogress': True, 'ignoreerrors': True}, host_limiter=host_limiter)
+        entry = {'_type': 'url', 'ie_key': 'Generic', 'id': 'id{:05d}'.format(index), 'url': '{}/id{:05d}.webm'.format(server.url, index)}
+        if host_limiter is None:
+            ydl.process_ie_result(entry, download=True)
+            return
+        with host_limiter.slot():
+            ydl.process_ie_result(entry, download=True)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(download, range(songs)))
+        elapsed = time.perf_counter() - start
+        downloaded = len([name for name in os.listdir(working_dir) if name.endswith('.webm')])
+        return elapsed, downloaded, server.throttled, host_limiter.concurrency.limit if adaptive else jobs
+
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of adaptive concurrency against a throttling server')
+    parser.add_argument('--songs', type=int, default=24, help='Number of songs downloaded.')
+    parser.add_argument('--jobs', type=int, default=8, help='Number of songs downloaded concurrently.')
+    parser.add_argument('--allowed', type=int, default=2, help='Number of songs the server allows to download at once.')
+    parser.add_argument('--size', type=int, default=1024 * 1024, help='Bytes of each song.')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+
+    print('{:>10} {:>10} {:>12} {:>10} {:>8}'.format('mode', 'seconds', 'downloaded', 'throttled', 'limit'))
+    for adaptive in [False, True]:
+        elapsed, downloaded, throttled, limit = bench_ratelimit(args.songs, args.jobs, args.allowed, args.size, adaptive)
+        print('{:>10} {:>10.2f} {:>12} {:>10} {:>8.2f}'.format('adaptive' if adaptive else 'fixed', elapsed, downloaded, throttled, limit))
+
+
+if __name__ == '__main__':
+    main()
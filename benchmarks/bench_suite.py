@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Offline benchmark suite of playlist merge, state persistence, status of songs, metadata update and cleanup.
+Playlists and audio files are synthetic, so nothing is downloaded and ffmpeg is not required.
+Cases run public entry points, and their results are checked by tests/test_benchmarks.py.
+Results are compared with the baseline scaled by a calibration workload, and cases slower than the threshold are reported as regressions.
+
+Usage: python -m benchmarks.bench_suite [--sizes 100,1000,5000] [--tag-sizes 10,100] [--repeat 5]
+                                        [--baseline benchmarks/baseline.json] [--threshold 0.25] [--save-baseline]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_merge import bench_merge, generate_playlist, generate_saved_playlist, preprocess_playlist
+from benchmarks.bench_tag import CREATORS
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.playlist import Playlist
+from music_dl.core.state import StateStore
+from music_dl.core.youtube_dl import YDLQueueStatus
+from music_dl.lib.log import logger
+
+# Baseline stored next to the suite
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Codecs of audio files tagged by the metadata cases
+TAG_CODECS = ['m4a', 'mp3', 'flac']
+
+# Differences below these seconds are regarded as noise whatever the ratio is
+NOISE_SECONDS = 0.001
+
+# Case measured to scale the baseline to the speed of the machine running the suite
+CALIBRATION = 'calibration'
+
+
+def measure(setup, run):
+    """
+    The function that measures a case in a fresh temporary directory
+
+    :param function setup: Function called with the temporary directory, which returns the argument of run. Not measured.
+    :param function run: Function measured
+    :rtype float
+    :return: Elapsed seconds
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        argument = setup(working_dir)
+        start = time.perf_counter()
+        run(argument)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+""""""""""""""" Cases """""""""""""""
+
+
+def bench_calibration(size):
+    """
+    The function that measures a reference workload of JSON, SQLite and small files, which the code benchmarked does not change.
+    Cases are compared with the baseline relative to it, so the baseline holds on slower machines and while the machine is busy.
+    """
+    pl_data = generate_playlist(size, private_ratio=0)
+
+    def run(working_dir):
+        connection = sqlite3.connect(os.path.join(working_dir, 'calibration.sqlite3'))
+        with connection:
+            connection.execute('CREATE TABLE entries (entry_id TEXT PRIMARY KEY, info TEXT)')
+            connection.executemany('INSERT INTO entries VALUES (?, ?)', ((entry['id'], json.dumps(entry)) for entry in pl_data['entries']))
+        entries = [json.loads(info) for info, in connection.execute('SELECT info FROM entries')]
+        connection.close()
+        for entry in entries[:size // 10]:
+            with open(os.path.join(working_dir, entry['id']), 'wb') as f:
+                f.write(b'\0' * 1024)
+
+    return measure(lambda working_dir: working_dir, run)
+
+
+def bench_state_save(size):
+    pl_data = generate_saved_playlist(generate_playlist(size, private_ratio=0))
+    return measure(StateStore, lambda state_store: state_store.save_playlist('benchmark', pl_data))
+
+
+def bench_state_load(size):
+    pl_data = generate_saved_playlist(generate_playlist(size, private_ratio=0))
+
+    def setup(working_dir):
+        state_store = StateStore(working_dir)
+        state_store.save_playlist('benchmark', pl_data)
+        return state_store
+
+    return measure(setup, lambda state_store: state_store.load_playlist('benchmark'))
+
+
+def bench_state_status(size):
+    pl_data = generate_playlist(size, private_ratio=0)
+
+    def setup(working_dir):
+        state_store = StateStore(working_dir)
+        state_store.save_playlist('benchmark', pl_data)
+        return state_store
+
+    def run(state_store):
+        for entry in pl_data['entries']:
+            state_store.set_status('benchmark', entry['id'], YDLQueueStatus.finished.value)
+
+    return measure(setup, run)
+
+
+def bench_set_tagged(size):
+    def setup(working_dir):
+        return preprocess_playlist(working_dir, generate_playlist(size, private_ratio=0))
+
+    def run(playlist):
+        for entry in playlist.playlist_data['entries']:
+            playlist.set_tagged({'id': entry['id']})
+
+    return measure(setup, run)
+
+
+def bench_metadata(audio_codec, size):
+    pl_data = generate_playlist(size, private_ratio=0)
+    payload = os.urandom(256 * 1024)
+    editor = MetadataEditor(audio_codec=audio_codec, no_artwork=True, no_album_title=False, no_album_artist=False,
+                            no_track_number=False, no_composer=False, no_compilation=False, verbose=False)
+
+    def setup(working_dir):
+        for entry in pl_data['entries']:
+            CREATORS[audio_codec](os.path.join(working_dir, '{}.{}'.format(entry['id'], audio_codec)), payload)
+        return working_dir
+
+    return measure(setup, lambda working_dir: editor.update(download_dir=working_dir, pl_data=pl_data, is_playlist=True))
+
+
+def bench_cleanup(size):
+    def setup(working_dir):
+        playlist = Playlist(download_url=None, working_dir=working_dir)
+        playlist.download_dir = working_dir
+        # Every tenth file is left empty by youtube-dl
+        for index in range(size):
+            with open(os.path.join(working_dir, 'id{:09d}.m4a'.format(index)), 'wb') as f:
+                f.write(b'' if index % 10 == 0 else b'\0' * 1024)
+        return playlist
+
+    return measure(setup, lambda playlist: playlist.cleanup())
+
+
+def run_suite(sizes, tag_sizes, repeat):
+    """
+    The function that runs all cases
+
+    :param list sizes: Numbers of entries of playlist cases
+    :param list tag_sizes: Numbers of audio files of metadata cases
+    :param int repeat: Number of measurements of each case. The fastest is reported.
+    :rtype list
+    :return: List of (case name, size, elapsed seconds)
+    """
+    cases = [(CALIBRATION, 1000, lambda: bench_calibration(1000))]
+    for size in sizes:
+        cases.append(('merge', size, lambda size=size: bench_merge(size, repeat=1)))
+        cases.append(('state_save', size, lambda size=size: bench_state_save(size)))
+        cases.append(('state_load', size, lambda size=size: bench_state_load(size)))
+        cases.append(('state_status', size, lambda size=size: bench_state_status(size)))
+        cases.append(('set_tagged', size, lambda size=size: bench_set_tagged(size)))
+        cases.append(('cleanup', size, lambda size=size: bench_cleanup(size)))
+    for size in tag_sizes:
+        for audio_codec in TAG_CODECS:
+            cases.append(('metadata_{}'.format(audio_codec), size, lambda size=size, audio_codec=audio_codec: bench_metadata(audio_codec, size)))
+
+    # Cases are measured in rounds, so a machine busy for a while slows down a round instead of every measurement of a few cases
+    best = [float('inf')] * len(cases)
+    for _ in range(repeat):
+        for index, (_, _, bench) in enumerate(cases):
+            best[index] = min(best[index], bench())
+    return [(name, size, elapsed) for (name, size, _), elapsed in zip(cases, best)]
+
+
+""""""""""""""" Baseline """""""""""""""
+
+
+def case_key(name, size):
+    return '{}/{}'.format(name, size)
+
+
+def load_baseline(baseline_file):
+    """
+    :param str baseline_file: Path to the baseline
+    :rtype dict
+    :return: Dictionary that maps case key and elapsed seconds, or empty if the baseline does not exist
+    """
+    if not os.path.isfile(baseline_file):
+        return {}
+    with open(baseline_file, encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(baseline_file, results):
+    """
+    :param str baseline_file: Path to the baseline
+    :param list results: List of (case name, size, elapsed seconds)
+    """
+    with open(baseline_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': {case_key(name, size): elapsed for name, size, elapsed in results},
+        }, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def is_regressed(elapsed, baseline, threshold):
+    """
+    :param float elapsed: Elapsed seconds measured
+    :param float baseline: Elapsed seconds of the baseline, or None
+    :param float threshold: Ratio of slowdown allowed
+    :rtype bool
+    :return: Flag that indicates the case is slower than the baseline beyond the threshold
+    """
+    return baseline is not None and elapsed > baseline * (1 + threshold) and elapsed - baseline > NOISE_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite compared with the baseline')
+    parser.add_argument('--sizes', default='100,1000,5000', help='Comma separated numbers of entries of playlist cases.')
+    parser.add_argument('--tag-sizes', default='10,100', help='Comma separated numbers of audio files of metadata cases.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements for each case.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Path to the baseline JSON.')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Ratio of slowdown from the baseline reported as a regression.')
+    parser.add_argument('--save-baseline', action='store_true', help='Replace the baseline with the results.')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+
+    baseline = load_baseline(args.baseline)
+    results = run_suite([int(size) for size in args.sizes.split(',')], [int(size) for size in args.tag_sizes.split(',')], args.repeat)
+
+    # Baseline is scaled by the speed of this machine relative to the machine which saved it
+    calibration = next(elapsed for name, size, elapsed in results if name == CALIBRATION)
+    baseline_calibration = next((elapsed for key, elapsed in baseline.items() if key.startswith(CALIBRATION + '/')), None)
+    scale = calibration / baseline_calibration if baseline_calibration else 1.0
+
+    regressions = []
+    print('Machine speed relative to the baseline: {:.2f}x\n'.format(1 / scale))
+    print('{:>14} {:>8} {:>12} {:>12} {:>12} {:>9}'.format('case', 'size', 'seconds', 'usec/item', 'baseline', 'change'))
+    for name, size, elapsed in results:
+        baseline_elapsed = baseline.get(case_key(name, size))
+        baseline_elapsed = baseline_elapsed * scale if baseline_elapsed and name != CALIBRATION else baseline_elapsed
+        change = '{:+.1%}'.format(elapsed / baseline_elapsed - 1) if baseline_elapsed else ''
+        if name != CALIBRATION and is_regressed(elapsed, baseline_elapsed, args.threshold):
+            regressions.append(case_key(name, size))
+            change += ' !'
+        print('{:>14} {:>8} {:>12.4f} {:>12.2f} {:>12} {:>9}'.format(
+            name, size, elapsed, elapsed / size * 1e6, '{:.4f}'.format(baseline_elapsed) if baseline_elapsed else '-', change))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print('\nBaseline is saved to {}'.format(args.baseline))
+        return
+
+    if regressions:
+        print('\n{} cases are slower than the baseline by more than {:.0%}: {}'.format(len(regressions), args.threshold, ', '.join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
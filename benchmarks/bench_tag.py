@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark of bytes rewritten by tagging and re-tagging synthetic files of each audio format supported.
+
+Usage: python -m benchmarks.bench_tag [--size 8] [--padding 65536] [--artwork 65536]
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+from mutagen import id3, ogg
+
+from music_dl.core.metadata import MetadataEditor
+from music_dl.lib.log import logger
+
+
+def atom(name, data):
+    return struct.pack('>I4s', 8 + len(data), name) + data
+
+
+def full_atom(name, data, version=0, flags=0):
+    return atom(name, struct.pack('>I', (version << 24) | flags) + data)
+
+
+def create_m4a(file, payload):
+    """
+    The function that writes an m4a file with one audio track whose chunk offset points at mdat following moov
+    """
+
+    def build(mdat_offset):
+        mvhd = full_atom(b'mvhd', struct.pack('>5I', 0, 0, 44100, 44100 * 60, 0x10000) + b'\x00' * 80)
+        mdhd = full_atom(b'mdhd', struct.pack('>4I2H', 0, 0, 44100, 44100 * 60, 0x55c4, 0))
+        hdlr = full_atom(b'hdlr', struct.pack('>I4s3I', 0, b'soun', 0, 0, 0) + b'\x00')
+        stco = full_atom(b'stco', struct.pack('>II', 1, mdat_offset))
+        stbl = atom(b'stbl', stco)
+        trak = atom(b'trak', atom(b'mdia', mdhd + hdlr + atom(b'minf', stbl)))
+        ftyp = atom(b'ftyp', b'M4A ' + struct.pack('>I', 0) + b'M4A mp42isom')
+        return ftyp + atom(b'moov', mvhd + trak)
+
+    header = build(0)
+    header = build(len(header) + 8)
+    with open(file, 'wb') as f:
+        f.write(header)
+        f.write(atom(b'mdat', payload))
+
+
+def create_mp3(file, payload):
+    with open(file, 'wb') as f:
+        f.write(payload)
+    # youtube-dl writes an ID3 tag by FFmpegMetadata before artwork is added
+    tags = id3.ID3()
+    tags.add(id3.TIT2(encoding=3, text=['Song']))
+    tags.save(file, padding=lambda info: 0)
+
+
+def create_flac(file, payload):
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6
+    streaminfo += struct.pack('>Q', (44100 << 44) | (1 << 41) | (15 << 36) | (44100 * 60))
+    streaminfo += b'\x00' * 16
+    with open(file, 'wb') as f:
+        f.write(b'fLaC' + struct.pack('>I', (0x80 << 24) | len(streaminfo)) + streaminfo)
+        f.write(payload)
+
+
+def create_ogg_stream(file, header, comment, payload):
+    """
+    The function that writes an Ogg stream with identification and comment headers followed by audio data
+    """
+    pages = []
+    for sequence, packet in enumerate([header, comment]):
+        page = ogg.OggPage()
+        page.serial = 1
+        page.sequence = sequence
+        page.first = sequence == 0
+        page.packets = [packet]
+        pages.append(page)
+    # Audio data is split into pages as an encoder does
+    chunk_size = 32 * 1024
+    for index in range(0, len(payload), chunk_size):
+        page = ogg.OggPage()
+        page.serial = 1
+        page.sequence = len(pages)
+        page.position = 48000 * (index // chunk_size + 1)
+        page.packets = [payload[index:index + chunk_size]]
+        pages.append(page)
+    pages[-1].last = True
+    with open(file, 'wb') as f:
+        for page in pages:
+            f.write(page.write())
+
+
+def create_opus(file, payload):
+    header = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)
+    create_ogg_stream(file, header, b'OpusTags' + struct.pack('<I', 0) + struct.pack('<I', 0), payload)
+
+
+def create_ogg(file, payload):
+    header = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, 44100, 0, 128000, 0, 0xb8, 1)
+    create_ogg_stream(file, header, b'\x03vorbis' + struct.pack('<I', 0) + struct.pack('<I', 0) + b'\x01', payload)
+
+
+def create_aac(file, payload):
+    with open(file, 'wb') as f:
+        f.write(b'\xff\xf1' + payload)
+
+
+CREATORS = {
+    'm4a': create_m4a,
+    'mp3': create_mp3,
+    'flac': create_flac,
+    'opus': create_opus,
+    'ogg': create_ogg,
+    'aac': create_aac,
+}
+
+
+def bytes_rewritten(before, after):
+    """
+    The function that counts bytes which differ between two versions of a file.
+    Data following a tag which has grown or shrunk is moved, so it counts as rewritten up to the end of the file.
+
+    :param bytes before: Content of the file before tagging
+    :param bytes after: Content of the file after tagging
+    :rtype int
+    :return: Number of bytes rewritten
+    """
+    length = min(len(before), len(after))
+    first = next((index for index in range(length) if before[index] != after[index]), length)
+    if len(before) != len(after):
+        return len(after) - first
+    if first == length:
+        return 0
+    last = next(index for index in range(length - 1, first - 1, -1) if before[index] != after[index])
+    return last - first + 1
+
+
+class StaticArtworkCache(object):
+    """
+    Stand-in for ArtworkCache which returns the same artwork for every song
+    """
+
+    def __init__(self):
+        self.artwork = None
+
+    def get(self, entry):
+        return self.artwork
+
+
+def bench_tag(audio_codec, size, tag_padding, artwork_size):
+    """
+    The function that tags a synthetic file, then re-tags it with a different album title and artwork
+
+    :param str audio_codec: Audio codec of the file
+    :param int size: Bytes of audio data
+    :param int tag_padding: Padding budget of MetadataEditor, or None to use the default policy of mutagen
+    :param int artwork_size: Bytes of artwork embedded
+    :rtype list
+    :return: [(Bytes rewritten, Elapsed seconds)] of the first tag and the re-tag
+    """
+    working_dir = tempfile.mkdtemp()
+    try:
+        audio_file = os.path.join(working_dir, 'id.{}'.format(audio_codec))
+        CREATORS[audio_codec](audio_file, os.urandom(size))
+
+        artwork_cache = StaticArtworkCache()
+        editor = MetadataEditor(audio_codec=audio_codec, no_artwork=False, no_album_title=False, no_album_artist=False,
+                                no_track_number=False, no_composer=False, no_compilation=False, verbose=False,
+                                artwork_cache=artwork_cache, tag_padding=tag_padding)
+
+        results = []
+        for album_title, artwork_length in [('Album', artwork_size), ('Album (Deluxe Edition)', artwork_size + artwork_size // 8)]:
+            artwork_cache.artwork = (b'\xff\xd8\xff\xe0' + os.urandom(artwork_length), 'image/jpeg')
+            with open(audio_file, 'rb') as f:
+                before = f.read()
+
+            start = time.perf_counter()
+            editor.update_entry(working_dir, {'id': 'id', 'title': 'Song'}, {'title': album_title, 'uploader': 'Artist'}, is_playlist=True, track_number=1)
+            elapsed = time.perf_counter() - start
+
+            # Tagged file is renamed to the song title
+            os.rename(os.path.join(working_dir, 'Song.{}'.format(audio_codec)), audio_file)
+            with open(audio_file, 'rb') as f:
+                after = f.read()
+            results.append((bytes_rewritten(before, after), elapsed))
+        return results
+
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of bytes rewritten by tagging')
+    parser.add_argument('--size', type=int, default=8, help='MiB of audio data of each file.')
+    parser.add_argument('--padding', type=int, default=64 * 1024, help='Padding budget reserved after tags.')
+    parser.add_argument('--artwork', type=int, default=64 * 1024, help='Bytes of artwork embedded.')
+    args = parser.parse_args()
+
+    logger.setLevel(logging.CRITICAL)
+
+    print('{:>6} {:>10} {:>8} {:>14} {:>12}'.format('codec', 'padding', 'write', 'rewritten', 'seconds'))
+    for audio_codec in CREATORS:
+        for label, tag_padding in [('default', None), (str(args.padding), args.padding)]:
+            results = bench_tag(audio_codec, args.size * 1024 * 1024, tag_padding, args.artwork)
+            for write, (rewritten, elapsed) in zip(['tag', 'retag'], results):
+                print('{:>6} {:>10} {:>8} {:>14} {:>12.4f}'.format(audio_codec, label, write, rewritten, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import atexit
+import logging
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pkg_resources
+
+from music_dl.MusicDL import MusicDL
+from music_dl.core.artwork import ArtworkCache
+from music_dl.core.cache import ExtractionCache
+from music_dl.core.error import PlaylistParameterException, PlaylistPreprocessException, PlaylistDownloadException, DirectoryException
+from music_dl.core.metrics import MetricsRecorder
+from music_dl.core.ratelimit import RateLimiter
+from music_dl.core.scheduler import DownloadScheduler
+from music_dl.core.trace import TraceRecorder
+from music_dl.core.transcode import Transcoder
+from music_dl.lib.dir import is_path_exists_or_creatable
+from music_dl.lib.log import logger
+
+
+class BatchDL(object):
+    """"""""""""""" Initializer """""""""""""""
+
+    def __init__(self,
+                 download_urls,
+                 working_dir=os.path.expanduser('~/Music/Downloads'),
+                 playlist_start=1,
+                 playlist_end=0,
+                 jobs=1,
+                 transcode_jobs=0,
+                 transcode_nice=0,
+                 transcode_ionice=None,
+                 request_rate=0,
+                 limit_rate=0,
+                 metrics_dir=None,
+                 trace_file=None,
+                 artwork_size=600,
+                 open_dir=False,
+                 verbose=False,
+                 **options):
+        """
+        Initializer
+
+        :param list download_urls: URLs to download
+        :param str working_dir: Path to working directory
+        :param int playlist_start: Index specifying playlist item to start at
+        :param int playlist_end: Index specifying playlist item to end at
+        :param int jobs: Number of songs downloaded concurrently across all playlists
+        :param int transcode_jobs: Number of ffmpeg processes transcoding songs of all playlists at once. Zero means the number of CPU cores.
+        :param int transcode_nice: Niceness added to ffmpeg processes
+        :param str transcode_ionice: I/O scheduling class of ffmpeg processes
+        :param float request_rate: Maximum number of requests per second sent to each site across all playlists. Zero means unlimited.
+        :param float limit_rate: Maximum number of bytes per second downloaded from each site across all playlists. Zero means unlimited.
+        :param str metrics_dir: Directory where metrics of all playlists are written, or None
+        :param str trace_file: Path to the trace file where spans of all playlists are written, or None
+        :param int artwork_size: Width and height that artwork should have at least
+        :param bool open_dir: Open working directory after all songs are downloaded
+        :param bool verbose: Print verbose message
+        :param options: Other options passed to MusicDL for each URL
+        """
+        # Download URLs
+        self.download_urls = download_urls
+        # Working directory
+        self.working_dir = working_dir
+        # Range of each playlist
+        self.playlist_start = playlist_start
+        self.playlist_end = playlist_end
+        # Number of songs downloaded concurrently
+        self.jobs = jobs
+        # Options of transcoder shared by all playlists
+        self.transcode_jobs = transcode_jobs
+        self.transcode_nice = transcode_nice
+        self.transcode_ionice = transcode_ionice
+        # Limits of each site shared by all playlists
+        self.request_rate = request_rate
+        self.limit_rate = limit_rate
+        # Metrics of all playlists
+        self.metrics_dir = metrics_dir
+        # Spans of all playlists
+        self.trace_file = trace_file
+        # Artwork shared by all playlists
+        self.artwork_size = artwork_size
+        # Open directory configuration
+        self.open_dir = open_dir
+        # Verbose
+        self.verbose = verbose
+        # Options of MusicDL
+        self.options = options
+
+    """"""""""""""" Download Music (Public) """""""""""""""
+
+    def download(self):
+        """
+        The function that downloads songs of all URLs with one scheduler.
+        Playlists are retrieved while songs of other playlists are downloaded,
+        and a song which appears on several playlists is downloaded once.
+
+        :return bool result: Flag that indicates all URLs are processed successfully
+        """
+        print()
+        atexit.register(print)
+
+        """ Set log level """
+
+        if self.verbose:
+            logger.setLevel(logging.DEBUG)
+        else:
+            logger.setLevel(logging.INFO)
+
+        """ Print version """
+
+        logger.info(pkg_resources.require("music_dl")[0])
+
+        """ Validate parameters """
+
+        logger.info('Validating parameters...')
+
+        # Working directory is validated once for all URLs
+        if not is_path_exists_or_creatable(self.working_dir):
+            logger.error('Invalid directory. Please specify valid download directory. Input value is {}'.format(self.working_dir))
+            logger.fatal('Aborted.')
+            exit()
+
+        # Remove duplicated URLs
+        download_urls = []
+        cache_keys = set()
+        for download_url in self.download_urls:
+            cache_key = ExtractionCache.make_key(download_url, self.playlist_start, self.playlist_end)
+            if cache_key in cache_keys:
+                logger.warning('Duplicated URL is skipped: {}'.format(download_url))
+                continue
+            cache_keys.add(cache_key)
+            download_urls.append(download_url)
+
+        logger.info('Done.')
+
+        """ Download playlists """
+
+        logger.info('Downloading {} URLs with {} workers...'.format(len(download_urls), self.jobs))
+
+        transcoder = Transcoder(workers=self.transcode_jobs, nice=self.transcode_nice, ionice=self.transcode_ionice)
+        scheduler = DownloadScheduler(self.jobs, transcoder)
+        rate_limiter = RateLimiter(self.request_rate, self.limit_rate, max_concurrency=self.jobs)
+        metrics = MetricsRecorder()
+        tracer = TraceRecorder() if self.trace_file is not None else None
+        artwork_cache = None if self.options.get('no_artwork') else ArtworkCache(self.working_dir, target_size=self.artwork_size)
+        started_at = time.perf_counter()
+        try:
+            # Coordinators only wait for downloads, so as many playlists as workers are processed at once
+            with ThreadPoolExecutor(max_workers=max(1, min(self.jobs, len(download_urls)))) as executor:
+                results = list(executor.map(lambda download_url: self.__process(download_url, scheduler, rate_limiter, metrics, tracer, artwork_cache), download_urls))
+
+        finally:
+            scheduler.shutdown()
+            if self.metrics_dir is not None:
+                metrics.write(self.metrics_dir)
+            if self.trace_file is not None:
+                tracer.write(self.trace_file)
+        elapsed = time.perf_counter() - started_at
+
+        """ Print summary """
+
+        self.__print_summary(results, len(self.download_urls) - len(download_urls), elapsed)
+
+        """ Open download directory """
+
+        if self.open_dir and platform.system().lower() == 'darwin':
+            subprocess.check_output(['open', self.working_dir], stderr=subprocess.STDOUT)
+
+        return all(result['is_succeeded'] for result in results)
+
+    def __process(self, download_url, scheduler, rate_limiter, metrics, tracer, artwork_cache):
+        """
+        The function that processes a URL of the batch. Called from coordinator threads.
+
+        :param str download_url: URL to download
+        :param DownloadScheduler scheduler: Scheduler shared by all playlists
+        :param RateLimiter rate_limiter: Rate limiter shared by all playlists
+        :param MetricsRecorder metrics: Recorder of metrics shared by all playlists
+        :param TraceRecorder tracer: Recorder of spans shared by all playlists, or None
+        :param ArtworkCache artwork_cache: Artwork cache shared by all playlists
+        :rtype dict
+        :return: Result of the URL
+        """
+
+        mdl = MusicDL(
+            download_url=download_url,
+            working_dir=self.working_dir,
+            playlist_start=self.playlist_start,
+            playlist_end=self.playlist_end,
+            jobs=self.jobs,
+            scheduler=scheduler,
+            rate_limiter=rate_limiter,
+            metrics=metrics,
+            tracer=tracer,
+            artwork_cache=artwork_cache,
+            verbose=self.verbose,
+            **self.options
+        )
+
+        result = {'download_url': download_url, 'is_succeeded': False, 'message': None}
+        started_at = time.perf_counter()
+        try:
+            mdl.process()
+            result['is_succeeded'] = True
+
+        except (DirectoryException, PlaylistParameterException, PlaylistPreprocessException, PlaylistDownloadException) as e:
+            result['message'] = e.message
+
+        except Exception as e:
+            result['message'] = '{}:{}'.format(type(e), str(e))
+
+        if result['message'] is not None:
+            logger.error('Failed to download {}. {}'.format(download_url, result['message']))
+
+        result['elapsed'] = time.perf_counter() - started_at
+        result['downloaded_songs'] = mdl.playlist.downloaded_songs
+        result['linked_songs'] = mdl.playlist.linked_songs
+        result['copied_songs'] = mdl.playlist.copied_songs
+        result['transcoded_songs'] = mdl.playlist.transcoded_songs
+        result['downloaded_bytes'] = mdl.playlist.downloaded_bytes
+        return result
+
+    @staticmethod
+    def __print_summary(results, duplicated_total, elapsed):
+        """
+        The function that prints results of all URLs and aggregate throughput
+
+        :param list results: Results of URLs
+        :param int duplicated_total: Number of duplicated URLs skipped
+        :param float elapsed: Seconds taken to process all URLs
+        """
+
+        logger.info('Batch summary:')
+        for result in results:
+            logger.info('[{}][Songs:{}][Linked:{}][Copied:{}][Transcoded:{}][Size:{:.1f}MiB][Elapsed:{:.2f}] {}'.format(
+                'Succeeded' if result['is_succeeded'] else 'Failed',
+                result['downloaded_songs'], result['linked_songs'], result['copied_songs'], result['transcoded_songs'],
+                result['downloaded_bytes'] / 1024 / 1024, result['elapsed'],
+                result['download_url'],
+            ))
+
+        succeeded_total = len([result for result in results if result['is_succeeded']])
+        downloaded_songs = sum(result['downloaded_songs'] for result in results)
+        linked_songs = sum(result['linked_songs'] for result in results)
+        copied_songs = sum(result['copied_songs'] for result in results)
+        transcoded_songs = sum(result['transcoded_songs'] for result in results)
+        downloaded_bytes = sum(result['downloaded_bytes'] for result in results)
+
+        logger.info('URLs: {} succeeded, {} failed, {} duplicated.'.format(succeeded_total, len(results) - succeeded_total, duplicated_total))
+        logger.info('Songs: {} downloaded, {} linked from track store.'.format(downloaded_songs, linked_songs))
+        logger.info('Audio: {} copied without encoding, {} transcoded.'.format(copied_songs, transcoded_songs))
+        logger.info('Throughput: {:.1f} songs/min, {:.2f} MiB/s in {:.1f} seconds.'.format(
+            (downloaded_songs + linked_songs) * 60 / elapsed if elapsed > 0 else 0,
+            downloaded_bytes / 1024 / 1024 / elapsed if elapsed > 0 else 0,
+            elapsed,
+        ))
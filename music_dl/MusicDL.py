@@ -6,6 +6,7 @@ import logging
 import os
 import platform
 import subprocess
+from contextlib import contextmanager, ExitStack
 from urllib.parse import urlparse
 
 import colorama
@@ -13,12 +14,17 @@ import pkg_resources
 from tldextract import tldextract
 from youtube_dl import YoutubeDL
 
-from music_dl.core.error import PlaylistParameterException, PlaylistPreprocessException, DirectoryException
+from music_dl.core.artwork import ArtworkCache
+from music_dl.core.error import PlaylistParameterException, PlaylistPreprocessException, PlaylistDownloadException, DirectoryException
 from music_dl.core.metadata import MetadataEditor
+from music_dl.core.metrics import MetricsRecorder
+from music_dl.core.pipeline import Stage
 from music_dl.core.playlist import Playlist
+from music_dl.core.profile import PhaseProfiler
+from music_dl.core.trace import TraceRecorder
 from music_dl.core.youtube_dl import YDLHelper
 from music_dl.lib.dir import is_path_exists_or_creatable
-from music_dl.lib.log import logger
+from music_dl.lib.log import logger, log_buffer, LogSequencer
 
 
 class MusicDL(object):
@@ -31,6 +37,27 @@ class MusicDL(object):
                  audio_bitrate=198,
                  playlist_start=1,
                  playlist_end=0,
+                 jobs=1,
+                 stream=False,
+                 cache_ttl=3600,
+                 refresh=False,
+                 scheduler=None,
+                 transcode_jobs=0,
+                 transcode_nice=0,
+                 transcode_ionice=None,
+                 request_rate=0,
+                 limit_rate=0,
+                 rate_limiter=None,
+                 retry_failed=False,
+                 metrics_dir=None,
+                 metrics=None,
+                 profile=False,
+                 trace_file=None,
+                 tracer=None,
+                 artwork_size=600,
+                 artwork_cache=None,
+                 tag_padding=64 * 1024,
+                 tag_jobs=1,
                  no_artwork=False,
                  no_album_title=False,
                  no_album_artist=False,
@@ -38,6 +65,7 @@ class MusicDL(object):
                  no_composer=False,
                  no_compilation=False,
                  open_dir=False,
+                 pipeline=True,
                  verbose=False,
                  clear_cache=False,
                  test_id=None):
@@ -47,8 +75,18 @@ class MusicDL(object):
         self.working_dir = working_dir
         # Open directory configuration
         self.open_dir = open_dir
+        # Update metadata as soon as each song is downloaded
+        self.pipeline = pipeline
         # Verbose
         self.verbose = verbose
+        # Metrics of songs and phases, written to the directory after download if specified
+        self.metrics_dir = metrics_dir
+        self.metrics = metrics or MetricsRecorder()
+        # Profiler of CPU time and memory allocations of each phase. Nothing is profiled unless specified.
+        self.profiler = PhaseProfiler() if profile else None
+        # Spans of phases and songs, written to the file after download if specified
+        self.trace_file = trace_file
+        self.tracer = tracer or (TraceRecorder() if trace_file is not None else None)
         # Music Downloader
         self.playlist = Playlist(
             download_url=download_url,
@@ -57,6 +95,20 @@ class MusicDL(object):
             audio_bitrate=audio_bitrate,
             playlist_start=playlist_start,
             playlist_end=playlist_end,
+            jobs=jobs,
+            stream=stream,
+            cache_ttl=cache_ttl,
+            refresh=refresh,
+            scheduler=scheduler,
+            transcode_jobs=transcode_jobs,
+            transcode_nice=transcode_nice,
+            transcode_ionice=transcode_ionice,
+            request_rate=request_rate,
+            byte_rate=limit_rate,
+            rate_limiter=rate_limiter,
+            retry_failed=retry_failed,
+            metrics=self.metrics,
+            tracer=self.tracer,
             clear_cache=clear_cache,
             verbose=verbose,
             test_id=test_id,
@@ -69,7 +121,12 @@ class MusicDL(object):
             no_track_number=no_track_number,
             no_composer=no_composer,
             no_compilation=no_compilation,
-            verbose=verbose
+            verbose=verbose,
+            artwork_cache=None if no_artwork else artwork_cache or ArtworkCache(working_dir, target_size=artwork_size),
+            tag_padding=tag_padding,
+            tag_jobs=tag_jobs,
+            metrics=self.metrics,
+            tracer=self.tracer,
         )
         # Youtube Downloader
         self.ydl = YoutubeDL()
@@ -97,83 +154,168 @@ class MusicDL(object):
 
         logger.info(pkg_resources.require("music_dl")[0])
 
-        """ Validate parameters """
-
-        logger.info('Validating parameters...')
+        """ Download playlist """
 
         try:
-            # Validate download url
-            url_parsed = urlparse(self.download_url)
-            if not url_parsed.scheme.startswith('http'):
-                raise DirectoryException('Invalid URL. URL must start with http*. Input value is {}'.format(self.download_url))
-            tld_parsed = tldextract.extract(self.download_url)
-            if not (tld_parsed.domain in ['youtube', 'soundcloud']):
-                raise DirectoryException('Invalid URL. Music Downloader supports only YouTube and SoundCloud. Input value is {}'.format(self.download_url))
-            # Validate download directory
-            if not is_path_exists_or_creatable(self.working_dir):
-                raise DirectoryException('Invalid directory. Please specify valid download directory. Input value is {}'.format(self.working_dir))
-
-        except DirectoryException as e:
+            self.validate_dir()
+            download_dir = self.process()
+
+        except (DirectoryException, PlaylistParameterException) as e:
             logger.error(e.message)
             logger.fatal('Aborted.')
             exit()
 
-        # Validate playlist configuration
-        try:
-            self.playlist.validate()
-
-        except PlaylistParameterException as e:
+        except (PlaylistPreprocessException, PlaylistDownloadException) as e:
             logger.error(e.message)
+            logger.error(e.data)
             logger.fatal('Aborted.')
             exit()
 
+        finally:
+            # Metrics of aborted runs are written as well
+            if self.metrics_dir is not None:
+                self.metrics.write(self.metrics_dir)
+            if self.trace_file is not None:
+                self.tracer.write(self.trace_file)
+            if self.profiler is not None:
+                profile_dir = self.playlist.download_dir or self.working_dir
+                self.profiler.write(profile_dir)
+                logger.info('Profile of each phase is written to {}'.format(profile_dir))
+
+        """ Open download directory """
+
+        if self.open_dir and platform.system().lower() == 'darwin':
+            subprocess.check_output(['open', download_dir], stderr=subprocess.STDOUT)
+
+        return True
+
+    def validate_dir(self):
+        """
+        The function that validates working directory.
+        Called once for all URLs in batch mode.
+        """
+        if not is_path_exists_or_creatable(self.working_dir):
+            raise DirectoryException('Invalid directory. Please specify valid download directory. Input value is {}'.format(self.working_dir))
+
+    def process(self):
+        """
+        The function that retrieves the playlist, downloads songs, and updates metadata.
+        Errors are raised instead of aborting, so batch mode can continue with the next URL.
+
+        :rtype str
+        :return download_dir: Directory where songs are downloaded
+        """
+
+        """ Validate parameters """
+
+        logger.info('Validating parameters...')
+
+        # Validate download url
+        url_parsed = urlparse(self.download_url)
+        if not url_parsed.scheme.startswith('http'):
+            raise DirectoryException('Invalid URL. URL must start with http*. Input value is {}'.format(self.download_url))
+        tld_parsed = tldextract.extract(self.download_url)
+        if not (tld_parsed.domain in ['youtube', 'soundcloud']):
+            raise DirectoryException('Invalid URL. Music Downloader supports only YouTube and SoundCloud. Input value is {}'.format(self.download_url))
+
+        # Validate playlist configuration
+        self.playlist.validate()
+
         logger.info('Done.')
 
         """ Retrieve playlist """
 
-        download_dir = None
-        try:
+        with self.__phase('preprocess'):
             download_dir = self.playlist.preprocess(self.download_url, self.working_dir)
 
-        except PlaylistPreprocessException as e:
-            logger.error(e.message)
-            logger.error(e.data)
-            logger.fatal('Aborted.')
-            exit()
-
         """ Download playlist """
 
-        is_downloaded = False
+        # Metadata is updated by separate threads while the rest of songs are downloaded.
+        # Songs tagged at once hold their log messages, which are printed in the order the songs are queued.
+        tag_stage = None
+        processed_hook = None
+        if self.pipeline:
+            tag_jobs = max(1, self.metadata_editor.tag_jobs)
+            tag_log = LogSequencer() if tag_jobs > 1 else None
+            tag_stage = Stage('Metadata', handler=self.__update_metadata_entry, workers=tag_jobs).start()
+            processed_hook = lambda entry, track_number, process_index, process_total: tag_stage.put(
+                (entry, track_number, process_index, process_total, tag_log, tag_log.reserve() if tag_log is not None else None))
+
         try:
-            is_downloaded = self.playlist.download()
+            # Songs transcoded while pipelined are tagged by the same ffmpeg process
+            with self.__phase('download'):
+                is_downloaded = self.playlist.download(processed_hook=processed_hook, metadata_editor=self.metadata_editor if self.pipeline else None)
 
-        except PlaylistPreprocessException as e:
-            logger.error(e.message)
-            logger.error(e.data)
-            logger.fatal('Aborted.')
-            exit()
+        finally:
+            # Metadata phase of the pipeline is the time waiting for songs tagged after all songs are downloaded
+            if tag_stage is not None:
+                with self.__phase('metadata'):
+                    tag_stage.join()
 
         """ Update metadata """
 
-        if is_downloaded:
-            self.metadata_editor.update(
-                download_dir=self.playlist.download_dir,
-                pl_data=self.playlist.downloaded_playlist_data,
-                is_playlist=self.playlist.is_playlist,
-            )
+        if is_downloaded and not self.pipeline:
+            with self.__phase('metadata'):
+                self.metadata_editor.update(
+                    download_dir=self.playlist.download_dir,
+                    pl_data=self.playlist.downloaded_playlist_data,
+                    is_playlist=self.playlist.is_playlist,
+                    tagged_hook=self.playlist.set_tagged,
+                )
 
         """ Cleanup download directory """
 
-        self.playlist.cleanup()
+        with self.__phase('cleanup'):
+            self.playlist.cleanup()
 
         """ Print completion message """
 
         logger.info('All process has done.')
+        logger.info('Audio: {} copied without encoding, {} transcoded.'.format(self.playlist.copied_songs, self.playlist.transcoded_songs))
         logger.info('Now you can find downloaded songs at {}'.format(colorama.Fore.LIGHTCYAN_EX + download_dir))
 
-        """ Open download directory """
+        return download_dir
 
-        if self.open_dir and platform.system().lower() == 'darwin':
-            subprocess.check_output(['open', download_dir], stderr=subprocess.STDOUT)
+    @contextmanager
+    def __phase(self, name):
+        """
+        The function that records seconds taken by the block to metrics, and traces and profiles the block if enabled
 
-        return True
+        :param str name: Phase name
+        """
+        with ExitStack() as stack:
+            stack.enter_context(self.metrics.phase(name))
+            if self.tracer is not None:
+                stack.enter_context(self.tracer.span(name))
+            if self.profiler is not None:
+                stack.enter_context(self.profiler.phase(name))
+            yield
+
+    def __update_metadata_entry(self, item):
+        """
+        The function that updates metadata of a song queued on the metadata stage
+
+        :param tuple item: (entry, track_number, process_index, process_total, log sequencer or None, sequence number)
+        """
+        entry, track_number, process_index, process_total, tag_log, sequence = item
+        if tag_log is not None:
+            log_buffer.begin()
+        try:
+            is_tagged = self.metadata_editor.update_entry(
+                download_dir=self.playlist.download_dir,
+                entry=entry,
+                pl_data=self.playlist.playlist_data if self.playlist.is_playlist else entry,
+                is_playlist=self.playlist.is_playlist,
+                track_number=track_number,
+                process_index=process_index,
+                process_total=process_total,
+            )
+            # Song is finished when it is tagged, so it is tagged again next time if the run stops before
+            if is_tagged:
+                self.playlist.set_tagged(entry)
+        except Exception as e:
+            # Failure of a song does not stop other songs
+            logger.error('[Process:{}/{}][Track:{}] Error {}: {} Skipped.'.format(process_index, process_total, track_number, type(e), str(e)))
+        finally:
+            if tag_log is not None:
+                tag_log.release(sequence, log_buffer.end())
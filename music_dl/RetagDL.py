@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import atexit
+import logging
+import os
+
+import pkg_resources
+
+from music_dl.core.artwork import ArtworkCache
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.state import StateStore
+from music_dl.lib.log import logger
+
+
+class RetagDL(object):
+    """"""""""""""" Initializer """""""""""""""
+
+    def __init__(self,
+                 playlist_dir,
+                 audio_codec='m4a',
+                 artwork_size=600,
+                 tag_padding=64 * 1024,
+                 tag_jobs=1,
+                 no_artwork=False,
+                 no_album_title=False,
+                 no_album_artist=False,
+                 no_track_number=False,
+                 no_composer=False,
+                 no_compilation=False,
+                 verbose=False):
+        """
+        Initializer
+
+        Songs of a playlist downloaded previously are tagged again from the state saved in the working directory,
+        without retrieving the playlist or downloading songs. Only files whose tags differ from the flags are written.
+
+        :param str playlist_dir: Path to the playlist folder in working directory
+        :param str audio_codec: Audio codec of songs in the folder. Songs saved with another codec are found by their extension.
+        :param int artwork_size: Width and height that artwork should have at least
+        :param int tag_padding: Bytes of padding reserved after tags when tags do not fit in the file
+        :param int tag_jobs: Number of songs whose metadata is updated concurrently
+        :param bool no_artwork: Forbid adding artwork to audio metadata
+        :param bool no_album_title: Forbid adding album title to audio metadata
+        :param bool no_album_artist: Forbid adding album artist to audio metadata
+        :param bool no_track_number: Forbid adding track number to audio metadata
+        :param bool no_composer: Forbid adding composer to audio metadata
+        :param bool no_compilation: Forbid adding part of compilation flag to audio metadata
+        :param bool verbose: Print verbose message
+        """
+        # Playlist folder
+        self.playlist_dir = os.path.normpath(os.path.expanduser(playlist_dir))
+        # Working directory, which contains state of the playlist
+        self.working_dir = os.path.dirname(self.playlist_dir)
+        # Key of the playlist on state store
+        self.playlist_key = os.path.basename(self.playlist_dir)
+        # Verbose
+        self.verbose = verbose
+        # Metadata editor. Tags forbidden by flags are removed from songs tagged previously.
+        self.metadata_editor = MetadataEditor(
+            audio_codec=audio_codec,
+            no_artwork=no_artwork,
+            no_album_title=no_album_title,
+            no_album_artist=no_album_artist,
+            no_track_number=no_track_number,
+            no_composer=no_composer,
+            no_compilation=no_compilation,
+            verbose=verbose,
+            artwork_cache=None if no_artwork else ArtworkCache(self.working_dir, target_size=artwork_size),
+            tag_padding=tag_padding,
+            tag_jobs=tag_jobs,
+            prune=True,
+        )
+
+    """"""""""""""" Retag Music (Public) """""""""""""""
+
+    def retag(self):
+        """
+        The function that updates metadata of songs in the playlist folder
+
+        :return bool result: Flag that indicates songs are retagged
+        """
+        print()
+        atexit.register(print)
+
+        """ Set log level """
+
+        if self.verbose:
+            logger.setLevel(logging.DEBUG)
+        else:
+            logger.setLevel(logging.INFO)
+
+        """ Print version """
+
+        logger.info(pkg_resources.require("music_dl")[0])
+
+        """ Load playlist """
+
+        logger.info('Loading playlist state...')
+
+        state_file = os.path.join(self.working_dir, '.music_dl.sqlite3')
+        if not os.path.isdir(self.playlist_dir) or not os.path.isfile(state_file):
+            logger.error('Invalid directory. Please specify a playlist folder downloaded by music-dl. Input value is {}'.format(self.playlist_dir))
+            logger.fatal('Aborted.')
+            exit()
+
+        state_store = StateStore(self.working_dir)
+        pl_data = state_store.load_downloaded(self.playlist_key)
+        if pl_data is None or not pl_data['entries']:
+            logger.error('No downloaded songs are saved for {}.'.format(self.playlist_key))
+            logger.fatal('Aborted.')
+            exit()
+
+        logger.info('Done.')
+
+        """ Update metadata """
+
+        self.metadata_editor.update(
+            download_dir=self.playlist_dir,
+            pl_data=pl_data,
+            is_playlist=True,
+        )
+
+        logger.info('All process has done.')
+        return True
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+from music_dl.BatchDL import BatchDL
 from music_dl.MusicDL import MusicDL
+from music_dl.RetagDL import RetagDL
 from music_dl.core.args import parse_args
+from music_dl.lib.util import read_batch_file
 
 __version__ = '0.2.1'
 __license__ = 'MIT'
@@ -10,12 +13,70 @@ __author__ = 'Gumob'
 __author_email__ = 'hello@gumob.com'
 __url__ = 'http://github.com/gumob/music-dl'
 __copyright__ = 'Copyright (C) 2018 Gumob'
-__all__ = ['main', 'MusicDL']
+__all__ = ['main', 'MusicDL', 'BatchDL', 'RetagDL']
 
 
 def main():
     args = parse_args()
 
+    """ Execute retag """
+
+    if args.retag is not None:
+        rdl = RetagDL(
+            playlist_dir=args.retag,
+            audio_codec=args.codec,
+            artwork_size=int(args.artwork_size),
+            tag_padding=int(args.tag_padding),
+            tag_jobs=int(args.tag_jobs),
+            no_artwork=args.no_artwork,
+            no_album_title=args.no_album_title,
+            no_album_artist=args.no_album_artist,
+            no_track_number=args.no_track_number,
+            no_composer=args.no_composer,
+            no_compilation=args.no_compilation,
+            verbose=args.verbose,
+        )
+        rdl.retag()
+        return
+
+    """ Execute batch download """
+
+    if args.batch_file is not None:
+        bdl = BatchDL(
+            download_urls=read_batch_file(args.batch_file),
+            working_dir=args.dir,
+            playlist_start=int(args.playlist_start),
+            playlist_end=int(args.playlist_end),
+            jobs=int(args.jobs),
+            transcode_jobs=int(args.transcode_jobs),
+            transcode_nice=int(args.transcode_nice),
+            transcode_ionice=args.transcode_ionice,
+            request_rate=args.request_rate,
+            limit_rate=args.limit_rate,
+            retry_failed=args.retry_failed,
+            metrics_dir=args.metrics_dir,
+            trace_file=args.trace_file,
+            artwork_size=int(args.artwork_size),
+            open_dir=args.open_dir,
+            verbose=args.verbose,
+            audio_codec=args.codec,
+            audio_bitrate=args.bitrate,
+            stream=args.stream,
+            cache_ttl=int(args.cache_ttl),
+            refresh=args.refresh,
+            no_artwork=args.no_artwork,
+            tag_padding=int(args.tag_padding),
+            tag_jobs=int(args.tag_jobs),
+            no_album_title=args.no_album_title,
+            no_album_artist=args.no_album_artist,
+            no_track_number=args.no_track_number,
+            no_composer=args.no_composer,
+            no_compilation=args.no_compilation,
+            pipeline=not args.no_pipeline,
+        )
+        bdl.download()
+        return
+
     """ Execute download """
 
     mdl = MusicDL(
@@ -25,13 +86,30 @@ def main():
         audio_bitrate=args.bitrate,
         playlist_start=int(args.playlist_start),
         playlist_end=int(args.playlist_end),
+        jobs=int(args.jobs),
+        stream=args.stream,
+        transcode_jobs=int(args.transcode_jobs),
+        transcode_nice=int(args.transcode_nice),
+        transcode_ionice=args.transcode_ionice,
+        request_rate=args.request_rate,
+        limit_rate=args.limit_rate,
+        retry_failed=args.retry_failed,
+        metrics_dir=args.metrics_dir,
+        profile=args.profile,
+        trace_file=args.trace_file,
+        cache_ttl=int(args.cache_ttl),
+        refresh=args.refresh,
         no_artwork=args.no_artwork,
+        artwork_size=int(args.artwork_size),
+        tag_padding=int(args.tag_padding),
+        tag_jobs=int(args.tag_jobs),
         no_album_title=args.no_album_title,
         no_album_artist=args.no_album_artist,
         no_track_number=args.no_track_number,
         no_composer=args.no_composer,
         no_compilation=args.no_compilation,
         open_dir=args.open_dir,
+        pipeline=not args.no_pipeline,
         # clear_cache=args.clear_cache,
         verbose=args.verbose
     )
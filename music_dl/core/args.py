@@ -9,6 +9,9 @@ from gettext import gettext as _
 import clipboard
 import colorama
 import pkg_resources
+from youtube_dl.downloader.common import FileDownloader
+
+from music_dl.core.codec import get_codecs
 
 
 def parse_args():
@@ -113,18 +116,48 @@ Usage: %(prog)s --url http://youtube.com/watch?v=<video_id>&list=<playlist_id>
 
     parser.add_argument('-u', '--url', action='store', type=str, metavar='<str>',
                         help='URL to download. [Default: Clipboard Value]')
+    parser.add_argument('-a', '--batch-file', action='store', type=str, metavar='<str>',
+                        help='File containing URLs to download, one URL per line.\nURLs are downloaded by one process. \'-\' reads from standard input.')
+    parser.add_argument('--retag', action='store', type=str, metavar='<str>',
+                        help='Path to a playlist folder downloaded previously.\nMetadata of its songs is updated with the flags given, without downloading songs.')
     parser.add_argument('-d', '--dir', action='store', type=str, metavar='<str>', default=default_dir,
                         help='Path to working directory.')
-    parser.add_argument('-c', '--codec', action='store', type=str, metavar='<str> [m4a,mp3,flac]', default='m4a', choices=['m4a', 'mp3', 'flac'],
-                        help='Preferred audio codec.')
+    parser.add_argument('-c', '--codec', action='store', type=str, metavar='<str> [{}]'.format(','.join(get_codecs())), default='m4a', choices=get_codecs(),
+                        help='Preferred audio codec.\n\'best\' keeps the audio stream downloaded without encoding.')
     parser.add_argument('-b', '--bitrate', action='store', type=int, metavar='<int>', default=198,
                         help='Preferred audio bitrate.')
     parser.add_argument('-s', '--start', action='store', type=int, metavar='<int>', dest='playlist_start', default=1,
                         help='Index specifying playlist item to start at.\nDefault value is index of first song on playlist.')
     parser.add_argument('-e', '--end', action='store', type=int, metavar='<int>', dest='playlist_end', default=0,
                         help='Index specifying playlist item to end at.\nDefault value is index of last song on playlist.')
+    parser.add_argument('-j', '--jobs', action='store', type=int, metavar='<int>', default=1,
+                        help='Number of songs to download concurrently.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Start downloading songs while the playlist is being retrieved.')
+    parser.add_argument('--transcode-jobs', action='store', type=int, metavar='<int>', default=0,
+                        help='Number of ffmpeg processes transcoding songs while other songs are downloaded.\nSet 0 to use the number of CPU cores.')
+    parser.add_argument('--transcode-nice', action='store', type=int, metavar='<int>', default=0,
+                        help='Niceness added to ffmpeg processes.')
+    parser.add_argument('--transcode-ionice', action='store', type=str, metavar='<str> [realtime,best-effort,idle]', choices=['realtime', 'best-effort', 'idle'],
+                        help='I/O scheduling class of ffmpeg processes. Requires ionice command.')
+    parser.add_argument('--request-rate', action='store', type=float, metavar='<float>', default=0,
+                        help='Maximum number of requests per second sent to each site.\nSet 0 for no limit.')
+    parser.add_argument('--limit-rate', action='store', type=str, metavar='<str>', default='0',
+                        help='Maximum download rate in bytes per second from each site, such as 50K or 4.2M.\nSet 0 for no limit.')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Download songs failed previously right away, including songs quarantined because they are private, removed or geo-blocked.')
+    parser.add_argument('--cache-ttl', action='store', type=int, metavar='<int>', default=3600,
+                        help='Seconds while the retrieved playlist is reused.\nSet 0 to disable the cache.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Retrieve the playlist even if it is cached.')
     parser.add_argument('--no-artwork', action='store_true',
                         help='Forbid adding artwork to audio metadata.')
+    parser.add_argument('--artwork-size', action='store', type=int, metavar='<int>', default=600,
+                        help='Width and height that artwork should have at least.\nLarger artwork is downscaled if Pillow is installed.')
+    parser.add_argument('--tag-padding', action='store', type=int, metavar='<int>', default=64 * 1024,
+                        help='Bytes of padding reserved after metadata, so metadata is updated later without rewriting audio data.')
+    parser.add_argument('--tag-jobs', action='store', type=int, metavar='<int>', default=1,
+                        help='Number of songs whose metadata is updated concurrently, as soon as they are downloaded or after all songs are downloaded.\nLog messages of each song are printed together, in order of tracks with --no-pipeline and in order of download otherwise.')
     parser.add_argument('--no-track-number', action='store_true',
                         help='Forbid adding track number to audio metadata.')
     parser.add_argument('--no-album-title', action='store_true',
@@ -135,6 +168,14 @@ Usage: %(prog)s --url http://youtube.com/watch?v=<video_id>&list=<playlist_id>
                         help='Forbid adding composer to audio metadata.')
     parser.add_argument('--no-compilation', action='store_true',
                         help='Forbid adding part of compilation flag to audio metadata.')
+    parser.add_argument('--no-pipeline', action='store_true',
+                        help='Update metadata after all songs are downloaded, instead of as soon as each song is downloaded.')
+    parser.add_argument('--metrics-dir', action='store', type=str, metavar='<str>',
+                        help='Directory where metrics are written after download.\nMetrics of each song are appended to music_dl.jsonl, and metrics of the run replace music_dl.prom for node_exporter.')
+    parser.add_argument('--trace-file', action='store', type=str, metavar='<str>',
+                        help='Path to a Chrome trace event file written after download.\nSpans of each phase and song open in Perfetto or chrome://tracing.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile CPU time and memory allocations of each phase of a single URL. Not available with --batch-file or --retag.\nmusic_dl.profile.<phase>.pstats and music_dl.profile.alloc.txt are written to the download directory.')
     parser.add_argument('--open-dir', action='store_true',
                         help='Open download directory after all songs are downloaded.')
     # parser.add_argument('--clear-cache', action='store_true',
@@ -145,7 +186,13 @@ Usage: %(prog)s --url http://youtube.com/watch?v=<video_id>&list=<playlist_id>
                         help='Show this help message and exit.')
 
     parser_args = parser.parse_args()
-    parser_args.url = parser_args.url if parser_args.url is not None else clipboard.paste()
+    parser_args.limit_rate = FileDownloader.parse_bytes(parser_args.limit_rate)
+    if parser_args.limit_rate is None:
+        parser.error('invalid rate limit specified')
+    if parser_args.profile and (parser_args.batch_file is not None or parser_args.retag is not None):
+        parser.error('--profile can be used only with a single URL')
+    if parser_args.batch_file is None and parser_args.retag is None:
+        parser_args.url = parser_args.url if parser_args.url is not None else clipboard.paste()
     parser_args.dir = parser_args.dir if parser_args.dir is not None else default_dir
 
     return parser_args
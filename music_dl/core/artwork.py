@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+import uuid
+from collections import OrderedDict
+
+from music_dl.lib.log import logger
+
+try:
+    from PIL import Image
+except ImportError:
+    # Images are embedded as they are fetched without Pillow
+    Image = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artwork_urls (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artworks (
+    content_hash TEXT PRIMARY KEY,
+    mime_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artworks_accessed_at ON artworks (accessed_at);
+"""
+
+# Image formats which can be embedded in all audio formats supported
+EMBEDDABLE_MIME_TYPES = ['image/jpeg', 'image/png']
+
+
+class ArtworkCache(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, working_dir, target_size=600, max_size=128 * 1024 * 1024, memory_size=64, dirname='.artwork', filename='index.sqlite3'):
+        """
+        Initializer
+
+        Artwork is fetched only once for each URL and saved under the working directory by the hash of its content,
+        so the same cover used by songs of an album or a set is fetched, resized and saved once.
+        Recently used images are kept in memory, so they are not read from the disk for each song.
+
+        :param str working_dir: Path to root directory
+        :param int target_size: Width and height that artwork should have at least. Larger images are downscaled to this size.
+        :param int max_size: Maximum total bytes of images saved on the disk
+        :param int memory_size: Maximum number of images kept in memory
+        :param str dirname: Name of the cache directory
+        :param str filename: Filename of the database
+        """
+
+        self.cache_dir = os.path.join(working_dir, dirname)
+        self.database_file = os.path.join(self.cache_dir, filename)
+        self.target_size = target_size
+        self.max_size = max_size
+        self.memory_size = memory_size
+        self.memory_cache = OrderedDict()  # OrderedDict that maps content hash and (image data, mime type) in order of use
+        self.memory_urls = OrderedDict()  # OrderedDict that maps URL and content hash in order of use
+        self.url_locks = {}  # Dictionary that maps URL and lock held while the image is loaded or fetched
+        self.lock = threading.Lock()
+        self.__local = threading.local()
+
+    def __connection(self):
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            # Directory is created when artwork is used at first
+            os.makedirs(self.cache_dir, exist_ok=True)
+            connection = sqlite3.connect(self.database_file, timeout=30)
+            connection.executescript(SCHEMA)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+        return connection
+
+    """"""""""""""" Artwork """""""""""""""
+
+    def get(self, entry):
+        """
+        The function that returns artwork of a song
+
+        :param dict entry: Song information resolved by youtube-dl, which contains thumbnails
+        :rtype (bytes, str)
+        :return: (Image data, Mime type), or None if the song has no artwork available
+        """
+
+        url = self.select_url(entry.get('thumbnails') or [], entry.get('thumbnail'))
+        if url is None:
+            return None
+
+        # Image used recently
+        with self.lock:
+            content_hash = self.memory_urls.get(url)
+            if content_hash is not None and content_hash in self.memory_cache:
+                self.memory_urls.move_to_end(url)
+                self.memory_cache.move_to_end(content_hash)
+                return self.memory_cache[content_hash]
+
+            url_lock = self.url_locks.setdefault(url, threading.Lock())
+
+        # Image saved on the disk. Songs sharing the same cover wait for the image fetched once.
+        with url_lock:
+            try:
+                with self.lock:
+                    content_hash = self.memory_urls.get(url)
+                    if content_hash is not None and content_hash in self.memory_cache:
+                        return self.memory_cache[content_hash]
+
+                artwork = self.__load(url)
+                if artwork is None:
+                    artwork = self.__fetch(url)
+                if artwork is None:
+                    return None
+
+                content_hash, image_data, mime_type = artwork
+                with self.lock:
+                    # URLs are bounded by the same size as images, so they do not grow with songs of large playlists
+                    self.memory_urls[url] = content_hash
+                    self.memory_urls.move_to_end(url)
+                    while len(self.memory_urls) > self.memory_size:
+                        self.memory_urls.popitem(last=False)
+                    self.memory_cache[content_hash] = (image_data, mime_type)
+                    self.memory_cache.move_to_end(content_hash)
+                    while len(self.memory_cache) > self.memory_size:
+                        self.memory_cache.popitem(last=False)
+
+            finally:
+                # Lock is released whether the image is fetched or not, so locks of failed URLs are not left behind
+                with self.lock:
+                    self.url_locks.pop(url, None)
+        return image_data, mime_type
+
+    def select_url(self, thumbnails, default_url=None):
+        """
+        The function that selects the smallest thumbnail whose width and height are at least the target size.
+        If no thumbnail is large enough, the largest one is selected.
+        Thumbnails without size are ordered from worst to best by youtube-dl, so the best one is selected among them.
+
+        :param list thumbnails: Thumbnails of the song
+        :param str default_url: URL of the thumbnail used when the list is empty
+        :rtype str
+        :return: URL of the thumbnail, or None if not found
+        """
+
+        candidates = [thumbnail for thumbnail in thumbnails if thumbnail.get('url')]
+        if Image is None:
+            # Images other than JPEG and PNG can not be converted without Pillow
+            candidates = [thumbnail for thumbnail in candidates if not thumbnail['url'].split('?')[0].lower().endswith('.webp')] or candidates
+        if not candidates:
+            return default_url
+
+        sized = [thumbnail for thumbnail in candidates if thumbnail.get('width') and thumbnail.get('height')]
+        if not sized:
+            return candidates[-1]['url']
+
+        large_enough = [thumbnail for thumbnail in sized if min(thumbnail['width'], thumbnail['height']) >= self.target_size]
+        if large_enough:
+            return min(large_enough, key=lambda thumbnail: thumbnail['width'] * thumbnail['height'])['url']
+        return max(sized, key=lambda thumbnail: thumbnail['width'] * thumbnail['height'])['url']
+
+    """"""""""""""" Cache """""""""""""""
+
+    def __image_file(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], content_hash)
+
+    def __load(self, url):
+        connection = self.__connection()
+        row = connection.execute(
+            'SELECT artworks.content_hash, artworks.mime_type FROM artwork_urls JOIN artworks ON artwork_urls.content_hash = artworks.content_hash WHERE url = ?',
+            (url,)).fetchone()
+        if row is None:
+            return None
+
+        content_hash, mime_type = row
+        try:
+            with open(self.__image_file(content_hash), 'rb') as f:
+                image_data = f.read()
+        except OSError:
+            return None
+
+        with connection:
+            connection.execute('UPDATE artworks SET accessed_at = ? WHERE content_hash = ?', (time.time(), content_hash))
+        return content_hash, image_data, mime_type
+
+    def __fetch(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                image_data = response.read()
+        except Exception as e:
+            logger.warning('Could not fetch artwork {}. {}:{}'.format(url, type(e), str(e)))
+            return None
+
+        image_data, mime_type = self.normalize(image_data)
+        if mime_type is None:
+            logger.warning('Artwork {} is not embeddable without Pillow. Skipped.'.format(url))
+            return None
+
+        # Identical images fetched from different URLs are saved once
+        content_hash = hashlib.sha256(image_data).hexdigest()
+        image_file = self.__image_file(content_hash)
+        if not os.path.exists(image_file):
+            os.makedirs(os.path.dirname(image_file), exist_ok=True)
+            temp_file = '{}.{}.tmp'.format(image_file, uuid.uuid4().hex)
+            with open(temp_file, 'wb') as f:
+                f.write(image_data)
+            os.replace(temp_file, image_file)
+
+        with self.__connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO artworks (content_hash, mime_type, size, accessed_at) VALUES (?, ?, ?, ?)',
+                               (content_hash, mime_type, len(image_data), time.time()))
+            connection.execute('INSERT OR REPLACE INTO artwork_urls (url, content_hash) VALUES (?, ?)', (url, content_hash))
+            self.__evict(connection)
+
+        return content_hash, image_data, mime_type
+
+    def __evict(self, connection):
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM artworks').fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        evicted_hashes = []
+        for content_hash, size in connection.execute('SELECT content_hash, size FROM artworks ORDER BY accessed_at'):
+            if total <= self.max_size:
+                break
+            evicted_hashes.append(content_hash)
+            total -= size
+
+        for content_hash in evicted_hashes:
+            connection.execute('DELETE FROM artwork_urls WHERE content_hash = ?', (content_hash,))
+            connection.execute('DELETE FROM artworks WHERE content_hash = ?', (content_hash,))
+            try:
+                os.remove(self.__image_file(content_hash))
+            except OSError:
+                pass
+
+    """"""""""""""" Image """""""""""""""
+
+    def normalize(self, image_data):
+        """
+        The function that converts an image to be embedded into audio metadata.
+        Images larger than the target size are downscaled, and images other than JPEG and PNG are re-encoded to JPEG.
+        Without Pillow, JPEG and PNG images are returned as they are.
+
+        :param bytes image_data: Image data fetched
+        :rtype (bytes, str)
+        :return: (Image data, Mime type). Mime type is None if the image can not be embedded.
+        """
+
+        mime_type = self.guess_mime_type(image_data)
+        if Image is None:
+            return image_data, mime_type if mime_type in EMBEDDABLE_MIME_TYPES else None
+
+        try:
+            image = Image.open(io.BytesIO(image_data))
+            is_oversized = min(image.size) > self.target_size
+            if not is_oversized and mime_type in EMBEDDABLE_MIME_TYPES:
+                return image_data, mime_type
+
+            if is_oversized:
+                scale = self.target_size / min(image.size)
+                image = image.resize((round(image.size[0] * scale), round(image.size[1] * scale)), Image.LANCZOS)
+
+            output = io.BytesIO()
+            if mime_type == 'image/png':
+                image.save(output, format='PNG', optimize=True)
+            else:
+                image.convert('RGB').save(output, format='JPEG', quality=90, optimize=True)
+                mime_type = 'image/jpeg'
+            return output.getvalue(), mime_type
+
+        except Exception as e:
+            logger.debug('Could not convert artwork. {}:{}'.format(type(e), str(e)))
+            return image_data, mime_type if mime_type in EMBEDDABLE_MIME_TYPES else None
+
+    @staticmethod
+    def guess_mime_type(image_data):
+        """
+        :param bytes image_data: Image data
+        :rtype str
+        :return: Mime type guessed from the signature of the image, or None if unknown
+        """
+        if image_data.startswith(b'\xff\xd8\xff'):
+            return 'image/jpeg'
+        elif image_data.startswith(b'\x89PNG\r\n\x1a\n'):
+            return 'image/png'
+        elif image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+            return 'image/webp'
+        return None
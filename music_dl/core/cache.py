@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+from music_dl.lib.log import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    cache_key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extractions_accessed_at ON extractions (accessed_at);
+"""
+
+# Query parameters which do not change the result of the extraction
+IGNORED_QUERY_PARAMS = ['feature', 'si', 'pp', 'app', 'index', 't']
+
+
+class ExtractionCache(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, working_dir, ttl=3600, max_size=64 * 1024 * 1024, filename='.music_dl_cache.sqlite3'):
+        """
+        Initializer
+
+        Playlist data extracted without processing is cached in a SQLite database in the working directory.
+        Data older than the TTL is not returned, and the least recently used data is evicted when the cache exceeds the maximum size.
+
+        :param str working_dir: Path to root directory
+        :param int ttl: Seconds while cached data is valid. Zero disables the cache.
+        :param int max_size: Maximum total bytes of cached data
+        :param str filename: Filename of the database
+        """
+
+        self.database_file = os.path.join(working_dir, filename)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.__local = threading.local()
+
+        if self.enabled:
+            os.makedirs(working_dir, exist_ok=True)
+            self.__connection().executescript(SCHEMA)
+
+    def __connection(self):
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_file, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+        return connection
+
+    def close(self):
+        """
+        The function that closes the connection of the current thread
+        """
+        connection = getattr(self.__local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
+
+    """"""""""""""" Property """""""""""""""
+
+    @property
+    def enabled(self):
+        """
+        :rtype bool
+        :return: Flag that indicates the cache is used
+        """
+        return self.ttl > 0
+
+    """"""""""""""" Key """""""""""""""
+
+    @staticmethod
+    def make_key(download_url, playlist_start=1, playlist_end=0):
+        """
+        The function that creates a cache key from the URL and the range of the playlist.
+        Scheme and host are lower-cased, 'www.' and 'm.' prefixes are removed,
+        query parameters which do not change the extraction are dropped and the rest are sorted.
+
+        :param str download_url: URL to download
+        :param int playlist_start: Index specifying playlist item to start at
+        :param int playlist_end: Index specifying playlist item to end at
+        :rtype str
+        :return: Cache key
+        """
+        url_parsed = urlparse(download_url.strip())
+        host = url_parsed.netloc.lower()
+        for prefix in ['www.', 'm.']:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+        query = sorted((key, value) for key, value in parse_qsl(url_parsed.query) if key not in IGNORED_QUERY_PARAMS)
+        url = urlunparse((url_parsed.scheme.lower(), host, url_parsed.path.rstrip('/'), '', urlencode(query), ''))
+        return '{} [{}:{}]'.format(url, playlist_start, playlist_end if playlist_end > 0 else '')
+
+    """"""""""""""" Cache """""""""""""""
+
+    def get(self, cache_key):
+        """
+        The function that loads cached data
+
+        :param str cache_key: Cache key
+        :rtype dict
+        :return: Cached data, or None if the data is not cached or expired
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self.__connection() as connection:
+            row = connection.execute('SELECT data, created_at FROM extractions WHERE cache_key = ?', (cache_key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                connection.execute('DELETE FROM extractions WHERE cache_key = ?', (cache_key,))
+                return None
+            connection.execute('UPDATE extractions SET accessed_at = ? WHERE cache_key = ?', (now, cache_key))
+
+        return json.loads(row[0])
+
+    def put(self, cache_key, data):
+        """
+        The function that caches data and evicts the least recently used data exceeding the maximum size
+
+        :param str cache_key: Cache key
+        :param dict data: Data to cache, which must be serializable to JSON
+        """
+        if not self.enabled:
+            return
+
+        try:
+            serialized = json.dumps(data, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.debug('Could not cache {}: {}'.format(cache_key, e))
+            return
+
+        size = len(serialized.encode('utf-8'))
+        if size > self.max_size:
+            return
+
+        now = time.time()
+        with self.__connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO extractions (cache_key, data, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (cache_key, serialized, size, now, now))
+            self.__evict(connection)
+
+    def delete(self, cache_key):
+        """
+        The function that deletes cached data
+
+        :param str cache_key: Cache key
+        """
+        if not self.enabled:
+            return
+
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM extractions WHERE cache_key = ?', (cache_key,))
+
+    def __evict(self, connection):
+        # Expired data is never returned, so it is evicted first
+        connection.execute('DELETE FROM extractions WHERE created_at < ?', (time.time() - self.ttl,))
+
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM extractions').fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        evicted_keys = []
+        for cache_key, size in connection.execute('SELECT cache_key, size FROM extractions ORDER BY accessed_at'):
+            if total <= self.max_size:
+                break
+            evicted_keys.append((cache_key,))
+            total -= size
+        connection.executemany('DELETE FROM extractions WHERE cache_key = ?', evicted_keys)
@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import base64
+import os
+
+import mutagen
+from mutagen import mp4, id3, flac, oggopus, oggvorbis
+
+# Codec which keeps the audio stream downloaded without encoding
+BEST = 'best'
+
+# Handlers of audio formats keyed by codec name, in order of preference for the best codec
+HANDLERS = {}
+
+
+class CodecHandler(object):
+    """
+    Base class of audio formats written by music-dl.
+
+    A handler describes how ffmpeg writes the format and how mutagen reads and writes its tags.
+    Tags are addressed by common field names, whose values are:
+    track_number (int), artwork ((Image data, Mime type)), album, album_artist, composer (str) and compilation (bool).
+    """
+
+    codec = None  # Name of the codec specified by --codec
+    extension = None  # Extension of audio files
+    ytdl_codec = None  # Preferred codec passed to FFmpegExtractAudio of youtube-dl
+    encoder = None  # Encoder of ffmpeg
+    source_codecs = []  # Codecs of downloaded audio which are copied without encoding
+    format_filters = []  # youtube-dl format filters that select audio which is copied without encoding
+    format_options = []  # ffmpeg options added whether audio is copied or encoded
+    is_lossless = False  # Flag that indicates bitrate is not specified to the encoder
+    ffmpeg_artwork = True  # Flag that indicates ffmpeg embeds artwork as an attached picture
+
+    """"""""""""""" ffmpeg """""""""""""""
+
+    def is_source_codec(self, source_codec):
+        """
+        :param str source_codec: Audio codec of the downloaded file reported by the site, such as 'mp4a.40.2' or 'opus'
+        :rtype bool
+        :return: Flag that indicates audio is copied without encoding
+        """
+        return normalize_codec(source_codec) in self.source_codecs
+
+    def format_selector(self):
+        """
+        The function that creates a youtube-dl format which prefers audio already encoded in the codec,
+        so audio is copied without encoding. Otherwise the best audio is downloaded and encoded.
+
+        :rtype str
+        :return: Format passed to youtube-dl
+        """
+        return '/'.join(['bestaudio[{}]'.format(format_filter) for format_filter in self.format_filters] + ['bestaudio/best'])
+
+    def ffmpeg_options(self, audio_bitrate, source_codec=None, source_bitrate=None):
+        """
+        The function that creates ffmpeg options which convert audio the same way FFmpegExtractAudio of youtube-dl does.
+        Audio already encoded in the codec is copied without encoding.
+
+        :param int audio_bitrate: Preferred audio bitrate
+        :param str source_codec: Audio codec of the downloaded file
+        :param float source_bitrate: Audio bitrate of the downloaded file in kbps, if known
+        :rtype list
+        :return: ffmpeg options
+        """
+        if self.is_source_codec(source_codec):
+            return ['-acodec', 'copy'] + self.format_options
+
+        options = ['-acodec', self.encoder]
+        if not self.is_lossless:
+            options += ['-b:a', '{}k'.format(cap_bitrate(audio_bitrate, source_bitrate))]
+        return options + self.format_options
+
+    """"""""""""""" Tag """""""""""""""
+
+    def length(self, audio_file):
+        """
+        :param str audio_file: Path to audio file
+        :rtype float
+        :return: Length of audio in seconds, or None if unknown
+        """
+        try:
+            audio = mutagen.File(audio_file)
+        except Exception:
+            return None
+        return audio.info.length if audio is not None else None
+
+    def open(self, audio_file):
+        """
+        :param str audio_file: Path to audio file
+        :return: mutagen object whose tags are read and written by this handler
+        """
+        raise NotImplementedError
+
+    def get(self, audio, field):
+        """
+        :param audio: mutagen object returned by open
+        :param str field: Field name
+        :return: Current value of the field, a list if the field has several values, or None if not written
+        """
+        raise NotImplementedError
+
+    def put(self, audio, field, value):
+        """
+        :param audio: mutagen object returned by open
+        :param str field: Field name
+        :param value: Value of the field
+        """
+        raise NotImplementedError
+
+    def delete(self, audio, field):
+        """
+        :param audio: mutagen object returned by open
+        :param str field: Field name
+        """
+        raise NotImplementedError
+
+    def save(self, audio, padding):
+        """
+        :param audio: mutagen object returned by open
+        :param function padding: Function that decides padding left after tags
+        """
+        audio.save(padding=padding)
+
+
+class MP4Handler(CodecHandler):
+    codec = 'm4a'
+    extension = 'm4a'
+    ytdl_codec = 'm4a'
+    encoder = 'aac'
+    source_codecs = ['aac']
+    format_filters = ['acodec^=mp4a']
+    format_options = ['-bsf:a', 'aac_adtstoasc']
+
+    # For more info about mp4 tag is available at
+    # https://github.com/quodlibet/mutagen/blob/cf399dc58940fb1356f672809d763be9e2af0033/mutagen/mp4/__init__.py
+    # http://atomicparsley.sourceforge.net/mpeg-4files.html
+    KEYS = {
+        'track_number': 'trkn',
+        'artwork': 'covr',
+        'album': '\xa9alb',
+        'album_artist': 'aART',
+        'composer': '\xa9wrt',
+        'compilation': 'cpil',
+    }
+
+    def open(self, audio_file):
+        audio = mp4.MP4(audio_file)
+        if audio.tags is None:
+            audio.add_tags()
+        return audio
+
+    def get(self, audio, field):
+        value = audio.tags.get(self.KEYS[field])
+        if value is None:
+            return None
+        if field == 'compilation':
+            return bool(value)
+        if len(value) > 1:
+            return list(value)
+        if field == 'track_number':
+            return value[0][0]
+        if field == 'artwork':
+            return bytes(value[0]), 'image/png' if value[0].imageformat == mp4.MP4Cover.FORMAT_PNG else 'image/jpeg'
+        return value[0]
+
+    def put(self, audio, field, value):
+        if field == 'track_number':
+            value = [(value, 0)]
+        elif field == 'artwork':
+            image_data, image_mime_type = value
+            value = [mp4.MP4Cover(image_data, mp4.MP4Cover.FORMAT_PNG if image_mime_type == 'image/png' else mp4.MP4Cover.FORMAT_JPEG)]
+        elif field != 'compilation':
+            value = [value]
+        audio.tags[self.KEYS[field]] = value
+
+    def delete(self, audio, field):
+        audio.tags.pop(self.KEYS[field], None)
+
+
+class ID3Handler(CodecHandler):
+    # For more info about ID3v2 tag is available at
+    # https://github.com/quodlibet/mutagen/blob/4a5d7d17f1a611280cc52d229aa70b77ca3c55dd/mutagen/id3/_frames.py
+    # https://help.mp3tag.de/main_tags.html
+    KEYS = {
+        'track_number': 'TRCK',
+        'artwork': 'APIC',
+        'album': 'TALB',
+        'album_artist': 'TPE2',
+        'composer': 'TCOM',
+        'compilation': 'TCMP',
+    }
+
+    def open(self, audio_file):
+        try:
+            return id3.ID3(audio_file)
+        except id3.ID3NoHeaderError:
+            # Tag is created at the head of the file
+            audio = id3.ID3()
+            audio.filename = audio_file
+            return audio
+
+    def get(self, audio, field):
+        frames = audio.getall(self.KEYS[field])
+        if not frames:
+            return None
+        if field == 'artwork':
+            values = [(frame.data, frame.mime) for frame in frames]
+        else:
+            values = [str(text) for frame in frames for text in frame.text]
+        if len(values) > 1:
+            return values
+        if field == 'track_number':
+            # Total is not written, so '1/0' and '1' are the same track number
+            track_number = values[0].split('/')[0]
+            return int(track_number) if track_number.isdigit() else values[0]
+        if field == 'compilation':
+            return values[0] == '1'
+        return values[0]
+
+    def put(self, audio, field, value):
+        key = self.KEYS[field]
+        if field == 'artwork':
+            image_data, image_mime_type = value
+            frame = id3.APIC(encoding=3, mime=image_mime_type, type=3, desc='Cover', data=image_data)
+        elif field == 'compilation':
+            frame = id3.TCMP(encoding=3, text=['1' if value else '0'])
+        else:
+            frame = getattr(id3, key)(encoding=3, text=[str(value)])
+        audio.setall(key, [frame])
+
+    def delete(self, audio, field):
+        audio.delall(self.KEYS[field])
+
+
+class MP3Handler(ID3Handler):
+    codec = 'mp3'
+    extension = 'mp3'
+    ytdl_codec = 'mp3'
+    encoder = 'libmp3lame'
+    source_codecs = ['mp3']
+    format_filters = ['acodec=mp3']
+
+
+class AACHandler(ID3Handler):
+    codec = 'aac'
+    extension = 'aac'
+    ytdl_codec = 'aac'
+    encoder = 'aac'
+    source_codecs = ['aac']
+    format_filters = ['acodec^=mp4a']
+    # Raw AAC stream with ID3 tag at the head
+    format_options = ['-f', 'adts', '-write_id3v2', '1']
+    ffmpeg_artwork = False
+
+
+class VorbisCommentHandler(CodecHandler):
+    # https://github.com/quodlibet/mutagen/blob/a1db79ece62c4e86259f15825e360d1ce0986a22/mutagen/flac.py
+    # https://wiki.xiph.org/VorbisComment
+    KEYS = {
+        'track_number': 'tracknumber',
+        'album': 'album',
+        'album_artist': 'albumartist',
+        'composer': 'composer',
+        'compilation': 'compilation',
+    }
+
+    def get_pictures(self, audio):
+        raise NotImplementedError
+
+    def set_pictures(self, audio, pictures):
+        raise NotImplementedError
+
+    def get(self, audio, field):
+        if field == 'artwork':
+            values = [(picture.data, picture.mime) for picture in self.get_pictures(audio)]
+        else:
+            values = audio.tags.get(self.KEYS[field]) or []
+        if not values:
+            return None
+        if len(values) > 1:
+            return values
+        if field == 'track_number':
+            track_number = values[0].split('/')[0]
+            return int(track_number) if track_number.isdigit() else values[0]
+        if field == 'compilation':
+            return values[0] == '1'
+        return values[0]
+
+    def put(self, audio, field, value):
+        if field == 'artwork':
+            image_data, image_mime_type = value
+            picture = flac.Picture()
+            picture.type = 3
+            picture.mime = image_mime_type
+            picture.desc = 'front cover'
+            picture.data = image_data
+            self.set_pictures(audio, [picture])
+        elif field == 'compilation':
+            audio.tags[self.KEYS[field]] = ['1' if value else '0']
+        else:
+            audio.tags[self.KEYS[field]] = [str(value)]
+
+    def delete(self, audio, field):
+        if field == 'artwork':
+            self.set_pictures(audio, [])
+        elif self.KEYS[field] in audio.tags:
+            del audio.tags[self.KEYS[field]]
+
+
+class FLACHandler(VorbisCommentHandler):
+    codec = 'flac'
+    extension = 'flac'
+    ytdl_codec = 'flac'
+    encoder = 'flac'
+    source_codecs = ['flac']
+    format_filters = ['acodec=flac']
+    is_lossless = True
+
+    def open(self, audio_file):
+        audio = flac.FLAC(audio_file)
+        if audio.tags is None:
+            audio.add_tags()
+        return audio
+
+    def get_pictures(self, audio):
+        return audio.pictures
+
+    def set_pictures(self, audio, pictures):
+        audio.clear_pictures()
+        for picture in pictures:
+            audio.add_picture(picture)
+
+
+class OggHandler(VorbisCommentHandler):
+    # ffmpeg does not embed artwork into Ogg, so artwork is added by mutagen
+    ffmpeg_artwork = False
+    # Artwork is a base64-encoded FLAC picture block in Ogg
+    PICTURE_KEY = 'metadata_block_picture'
+
+    def get_pictures(self, audio):
+        pictures = []
+        for value in audio.tags.get(self.PICTURE_KEY) or []:
+            try:
+                pictures.append(flac.Picture(base64.b64decode(value)))
+            except (TypeError, ValueError, flac.error):
+                continue
+        return pictures
+
+    def set_pictures(self, audio, pictures):
+        if pictures:
+            audio.tags[self.PICTURE_KEY] = [base64.b64encode(picture.write()).decode('ascii') for picture in pictures]
+        elif self.PICTURE_KEY in audio.tags:
+            del audio.tags[self.PICTURE_KEY]
+
+
+class OpusHandler(OggHandler):
+    codec = 'opus'
+    extension = 'opus'
+    ytdl_codec = 'opus'
+    encoder = 'libopus'
+    source_codecs = ['opus']
+    format_filters = ['acodec=opus']
+
+    def open(self, audio_file):
+        return oggopus.OggOpus(audio_file)
+
+
+class VorbisHandler(OggHandler):
+    codec = 'ogg'
+    extension = 'ogg'
+    ytdl_codec = 'vorbis'
+    encoder = 'libvorbis'
+    source_codecs = ['vorbis']
+    format_filters = ['acodec=vorbis']
+
+    def open(self, audio_file):
+        return oggvorbis.OggVorbis(audio_file)
+
+
+""""""""""""""" Registry """""""""""""""
+
+
+def register_handler(handler):
+    """
+    The function that registers a handler of an audio format
+
+    :param CodecHandler handler: Handler of the audio format
+    :rtype CodecHandler
+    :return: Handler registered
+    """
+    HANDLERS[handler.codec] = handler
+    return handler
+
+
+def get_codecs():
+    """
+    :rtype list
+    :return: Names of codecs which can be specified by --codec
+    """
+    return list(HANDLERS) + [BEST]
+
+
+def get_extensions():
+    """
+    :rtype list
+    :return: Extensions of audio files which can be tagged
+    """
+    return [handler.extension for handler in HANDLERS.values()]
+
+
+def normalize_codec(source_codec):
+    """
+    :param str source_codec: Audio codec reported by the site, such as 'mp4a.40.2'
+    :rtype str
+    :return: Codec name in the form of source_codecs of handlers, such as 'aac'
+    """
+    source_codec = (source_codec or '').lower().split('.')[0]
+    return 'aac' if source_codec == 'mp4a' else source_codec
+
+
+def resolve_codec(audio_codec, source_codec=None):
+    """
+    The function that decides the codec of the audio file written.
+    The best codec keeps the downloaded audio stream, and falls back to mp3 as youtube-dl does.
+
+    :param str audio_codec: Preferred audio codec
+    :param str source_codec: Audio codec of the downloaded file
+    :rtype str
+    :return: Name of a registered codec
+    """
+    if audio_codec != BEST:
+        return audio_codec
+    for handler in HANDLERS.values():
+        if handler.is_source_codec(source_codec):
+            return handler.codec
+    return 'mp3'
+
+
+def get_handler(audio_codec, source_codec=None):
+    """
+    :param str audio_codec: Preferred audio codec
+    :param str source_codec: Audio codec of the downloaded file
+    :rtype CodecHandler
+    :return: Handler of the audio format written
+    """
+    return HANDLERS[resolve_codec(audio_codec, source_codec)]
+
+
+def find_handler(audio_file):
+    """
+    :param str audio_file: Path to audio file
+    :rtype CodecHandler
+    :return: Handler of the audio format, or None if the extension is not supported
+    """
+    extension = os.path.splitext(audio_file)[1][1:].lower()
+    for handler in HANDLERS.values():
+        if handler.extension == extension:
+            return handler
+    return None
+
+
+def get_ytdl_codec(audio_codec):
+    """
+    :param str audio_codec: Preferred audio codec
+    :rtype str
+    :return: Preferred codec passed to FFmpegExtractAudio of youtube-dl
+    """
+    if audio_codec == BEST:
+        return BEST
+    return HANDLERS[audio_codec].ytdl_codec
+
+
+def get_format(audio_codec):
+    """
+    :param str audio_codec: Preferred audio codec
+    :rtype str
+    :return: Format passed to youtube-dl, which prefers audio copied without encoding
+    """
+    if audio_codec == BEST:
+        return 'bestaudio/best'
+    return HANDLERS[audio_codec].format_selector()
+
+
+def cap_bitrate(audio_bitrate, source_bitrate=None):
+    """
+    The function that limits the bitrate of encoded audio to the bitrate of the downloaded audio,
+    because encoding at a higher bitrate does not improve quality but wastes CPU and disk.
+
+    :param int audio_bitrate: Preferred audio bitrate
+    :param float source_bitrate: Audio bitrate of the downloaded file in kbps, if known
+    :rtype int
+    :return: Audio bitrate passed to the encoder
+    """
+    if not source_bitrate or source_bitrate <= 0:
+        return audio_bitrate
+    return min(audio_bitrate, int(round(source_bitrate)))
+
+
+def get_extension(audio_codec, source_codec=None):
+    """
+    :param str audio_codec: Preferred audio codec
+    :param str source_codec: Audio codec of the downloaded file
+    :rtype str
+    :return: Extension of the audio file written
+    """
+    return get_handler(audio_codec, source_codec).extension
+
+
+# AAC is kept in m4a rather than raw AAC by the best codec
+register_handler(MP4Handler())
+register_handler(MP3Handler())
+register_handler(FLACHandler())
+register_handler(OpusHandler())
+register_handler(VorbisHandler())
+register_handler(AACHandler())
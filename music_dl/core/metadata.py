@@ -4,19 +4,21 @@
 import errno
 import mimetypes
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from mutagen import mp4, id3, flac, File
 from youtube_dl.utils import sanitize_filename
 
+from music_dl.core.artwork import EMBEDDABLE_MIME_TYPES
+from music_dl.core.codec import find_handler, get_extension, get_extensions
 from music_dl.core.error import InvalidMimeTypeException, InvalidDataException
-from music_dl.lib.log import logger
-from music_dl.lib.util import contains_at_least
+from music_dl.lib.log import logger, log_buffer
 
 
 class MetadataEditor(object):
     """"""""""""""" Initialization """""""""""""""
 
-    def __init__(self, audio_codec, no_artwork, no_album_title, no_album_artist, no_track_number, no_composer, no_compilation, verbose):
+    def __init__(self, audio_codec, no_artwork, no_album_title, no_album_artist, no_track_number, no_composer, no_compilation, verbose, artwork_cache=None, tag_padding=64 * 1024, tag_jobs=1, prune=False, metrics=None, tracer=None):
         """
         Initializer
 
@@ -28,6 +30,12 @@ class MetadataEditor(object):
         :param bool no_composer: Forbid adding composer to audio metadata
         :param bool no_compilation: Forbid adding part of compilation flag to audio metadata
         :param bool verbose: Print verbose message
+        :param ArtworkCache artwork_cache: Cache which provides artwork of songs. Artwork is not added if None.
+        :param int tag_padding: Bytes of padding reserved after tags when tags do not fit in the file. None uses the default policy of mutagen.
+        :param int tag_jobs: Number of songs whose metadata is updated concurrently
+        :param bool prune: Remove metadata forbidden by flags, such as composer with no_composer, from songs tagged previously
+        :param MetricsRecorder metrics: Recorder of seconds taken to tag and rename songs, or None
+        :param TraceRecorder tracer: Recorder of spans of tagging and renaming songs, or None
         """
 
         self.audio_codec = audio_codec
@@ -38,83 +46,237 @@ class MetadataEditor(object):
         self.no_composer = no_composer
         self.no_compilation = no_compilation
         self.verbose = verbose
+        self.artwork_cache = artwork_cache
+        self.tag_padding = tag_padding
+        self.tag_jobs = tag_jobs
+        self.prune = prune
+        self.metrics = metrics
+        self.tracer = tracer
 
     """"""""""""""" Update metadata """""""""""""""
 
-    def update(self, download_dir, pl_data, is_playlist):
+    def update(self, download_dir, pl_data, is_playlist, tagged_hook=None):
         """
         The function that update audio metadata.
 
         :param str download_dir: Download directory
         :param dict pl_data: Playlist data which contains downloaded song information
         :param bool is_playlist: Flag that indicates playlist contains multiple songs
+        :param function tagged_hook: Function called with the entry of each song tagged successfully
         """
 
         logger.info('Updating metadata...')
 
         if is_playlist:
             entries = pl_data.get('entries', [])
-            album_title = pl_data.get('title', 'Unknown Album')
-            album_artist = pl_data.get('uploader', None)
-            album_composer = pl_data.get('extractor_key')
 
-            process_index = 1
             process_total = len(entries)
-            for entry in entries:
-                try:
-                    # Determine filename from entry id
-                    song_id = entry['id']
-                    # song_index = self.playlist_data_map.get(song_id, -1)
-
-                    song_track_number = process_index
-                    song_title = sanitize_filename(entry.get('title', song_id))
-                    source_audio_file = os.path.join(download_dir, '{}.{}'.format(song_id, self.audio_codec))
-
-                    # Artwork
-                    image_file = None
-                    try:
-                        image_file = entry['thumbnails'][0]['filename']
-                    except:
-                        pass
-
-                    # Update tag
-                    self.__update_tag(
-                        download_dir=download_dir,
-                        song_title=song_title,
-                        audio_file=source_audio_file,
-                        image_file=image_file,
-                        album_title=album_title,
-                        album_artist=album_artist,
-                        album_composer=album_composer,
-                        track_number=song_track_number,
-                        process_index=process_index,
-                        process_total=process_total,
-                    )
-
-                except:
-                    message = 'Could not update metadata because there is no data found on the playlist. The video may be private or deleted. Audio data is not saved.'
-                    logger.error('[Process:{}/{}][Track:{}] {}'.format(process_index, process_total, 'N/A', message))
-
-                process_index += 1
+            arguments = [{
+                'download_dir': download_dir,
+                'entry': entry,
+                'pl_data': pl_data,
+                'is_playlist': is_playlist,
+                # Track number saved on the playlist is used, so songs are numbered the same as when they are tagged as soon as downloaded
+                'track_number': entry.get('track_number', process_index),
+                'process_index': process_index,
+                'process_total': process_total,
+            } for process_index, entry in enumerate(entries, 1)]
+
+            if self.tag_jobs > 1 and process_total > 1:
+                self.__update_concurrently(arguments, tagged_hook)
+            else:
+                for kwargs in arguments:
+                    if self.update_entry(**kwargs) and tagged_hook is not None:
+                        tagged_hook(kwargs['entry'])
+
+        else:
+            self.update_entry(
+                download_dir=download_dir,
+                entry=pl_data,
+                pl_data=pl_data,
+                is_playlist=is_playlist,
+            )
+
+        logger.info('Done.')
+
+    def __update_concurrently(self, arguments, tagged_hook=None):
+        """
+        The function that updates metadata of songs with a pool of workers.
+        Log messages of each song are held until the songs before it are done, so they are printed in order of tracks.
+
+        :param list arguments: Keyword arguments of update_entry for each song in order of tracks
+        :param function tagged_hook: Function called with the entry of each song tagged successfully
+        """
+
+        with ThreadPoolExecutor(max_workers=self.tag_jobs) as executor:
+            futures = [executor.submit(self.__update_entry_buffered, kwargs) for kwargs in arguments]
+            for kwargs, future in zip(arguments, futures):
+                is_updated, records = future.result()
+                for record in records:
+                    logger.handle(record)
+                if is_updated and tagged_hook is not None:
+                    tagged_hook(kwargs['entry'])
+
+    def __update_entry_buffered(self, kwargs):
+        """
+        The function that updates metadata of a song while holding its log messages. Called from worker threads.
+
+        :param dict kwargs: Keyword arguments of update_entry
+        :rtype (bool, list)
+        :return: (Flag that indicates the song is tagged, Log records of the song)
+        """
+
+        is_updated = False
+        log_buffer.begin()
+        try:
+            is_updated = self.update_entry(**kwargs)
+        except Exception as e:
+            # Failure of a song does not stop other songs
+            logger.error('[Process:{}/{}][Track:{}] Error {}: {} Skipped.'.format(kwargs['process_index'], kwargs['process_total'], kwargs['track_number'], type(e), str(e)))
+        finally:
+            records = log_buffer.end()
+        return is_updated, records
+
+    def update_entry(self, download_dir, entry, pl_data, is_playlist, track_number=-1, process_index=-1, process_total=-1):
+        """
+        The function that update audio metadata of a single song.
+        Called for each song as soon as it is downloaded when download and metadata update are pipelined.
+
+        :param str download_dir: Download directory
+        :param dict entry: Song information resolved by youtube-dl
+        :param dict pl_data: Playlist data which contains album information
+        :param bool is_playlist: Flag that indicates playlist contains multiple songs
+        :param int track_number: track number to be saved in metadata
+        :param int process_index: Current process index displayed in log message
+        :param int process_total: Total number of process displayed in log message
+        :rtype bool
+        :return: Flag that indicates the song is tagged
+        """
+
+        if is_playlist:
+            try:
+                # Determine filename from entry id
+                song_id = entry['id']
+
+                song_title = sanitize_filename(entry.get('title', song_id))
+                source_audio_file = os.path.join(download_dir, '{}.{}'.format(song_id, self.get_extension(entry)))
+                # Song renamed after its title by the previous update
+                titled_audio_file = self.get_audio_file(download_dir, entry)
+                if not os.path.exists(source_audio_file) and os.path.exists(titled_audio_file):
+                    source_audio_file = titled_audio_file
+                # Extension differs if the preferred codec is best, or if the folder was downloaded with another codec and is tagged again
+                if not os.path.exists(source_audio_file):
+                    source_audio_file = self.__find_audio_file(download_dir, [song_id, song_title]) or source_audio_file
+
+                # Update tag
+                return self.__update_tag(
+                    download_dir=download_dir,
+                    song_id=song_id,
+                    song_title=song_title,
+                    audio_file=source_audio_file,
+                    artwork=self.get_artwork(entry),
+                    album_title=pl_data.get('title', 'Unknown Album'),
+                    album_artist=pl_data.get('uploader', None),
+                    album_composer=pl_data.get('extractor_key'),
+                    track_number=track_number,
+                    process_index=process_index,
+                    process_total=process_total,
+                )
+
+            except:
+                message = 'Could not update metadata because there is no data found on the playlist. The video may be private or deleted. Audio data is not saved.'
+                logger.error('[Process:{}/{}][Track:{}] {}'.format(process_index, process_total, 'N/A', message))
+                return False
 
         else:
-            base_filename = sanitize_filename(pl_data.get('title', 'Unknown'))
-            audio_file = os.path.join(download_dir, '{}.{}'.format(base_filename, self.audio_codec))
+            base_filename = sanitize_filename(entry.get('title', 'Unknown'))
+            audio_file = os.path.join(download_dir, '{}.{}'.format(base_filename, self.get_extension(entry)))
             if os.path.exists(audio_file):
-                image_file = None
-                try:
-                    image_file = pl_data['thumbnails'][0]['filename']
-                except:
-                    pass
-                self.__update_tag(
+                return self.__update_tag(
                     download_dir=download_dir,
+                    song_id=base_filename,
                     audio_file=audio_file,
-                    image_file=image_file
+                    artwork=self.get_artwork(entry),
                 )
+            return False
 
-        logger.info('Done.')
+    """"""""""""""" Single pass """""""""""""""
 
-    def __update_tag(self, download_dir, audio_file, image_file,
+    def get_audio_file(self, download_dir, entry):
+        """
+        :param str download_dir: Download directory
+        :param dict entry: Song information resolved by youtube-dl
+        :rtype str
+        :return: Path to the audio file named after the song title
+        """
+        song_title = sanitize_filename(entry.get('title', entry.get('id', 'Unknown')))
+        return os.path.join(download_dir, '{}.{}'.format(song_title, self.get_extension(entry)))
+
+    def get_extension(self, entry):
+        """
+        :param dict entry: Song information resolved by youtube-dl
+        :rtype str
+        :return: Extension of the audio file, which depends on the downloaded audio codec if the preferred codec is best
+        """
+        return get_extension(self.audio_codec, entry.get('acodec'))
+
+    def __find_audio_file(self, download_dir, names):
+        """
+        :param str download_dir: Download directory
+        :param list names: Filenames of the song without extension
+        :rtype str
+        :return: Path to the audio file with any extension supported, or None if not found
+        """
+        for name in names:
+            for extension in get_extensions():
+                audio_file = os.path.join(download_dir, '{}.{}'.format(name, extension))
+                if os.path.exists(audio_file):
+                    return audio_file
+        return None
+
+    def get_metadata(self, pl_data, track_number=-1):
+        """
+        The function that returns metadata written by ffmpeg while a song is transcoded,
+        instead of rewriting the transcoded file by mutagen.
+
+        :param dict pl_data: Playlist data which contains album information
+        :param int track_number: track number to be saved in metadata
+        :rtype dict
+        :return: Metadata keyed by ffmpeg metadata names
+        """
+        metadata = {}
+        # Track number
+        if not self.no_track_number and track_number > 0:
+            metadata['track'] = track_number
+        # Album title
+        if not self.no_album_title:
+            metadata['album'] = pl_data.get('title', 'Unknown Album')
+        # Album artist
+        if not self.no_album_artist and pl_data.get('uploader') is not None:
+            metadata['album_artist'] = pl_data['uploader']
+        # Composer
+        if not self.no_composer and pl_data.get('extractor_key') is not None:
+            metadata['composer'] = pl_data['extractor_key']
+        # Part of compilation
+        if not self.no_compilation:
+            metadata['compilation'] = 1
+        return metadata
+
+    def get_artwork(self, entry):
+        """
+        The function that returns artwork of a song from the cache
+
+        :param dict entry: Song information resolved by youtube-dl
+        :rtype (bytes, str)
+        :return: (Image data, Mime type), or None if artwork is not added
+        """
+        if self.no_artwork or self.artwork_cache is None:
+            return None
+        return self.artwork_cache.get(entry)
+
+    """"""""""""""" Tag """""""""""""""
+
+    def __update_tag(self, download_dir, audio_file, artwork, song_id=None,
                      song_title=None, album_title=None, album_artist=None, album_composer=None,
                      track_number=-1, process_index=-1, process_total=-1):
         """
@@ -122,7 +284,8 @@ class MetadataEditor(object):
 
         :param str download_dir: Download directory
         :param str audio_file: Path to audio file
-        :param str image_file: Path to image file
+        :param tuple artwork: (Image data, Mime type) of artwork, or None
+        :param str song_id: Id of the song whose metrics are recorded. A single song is identified by its title.
         :param str song_title: Song title
         :param str album_title: Album title to be saved in metadata
         :param str album_artist: Album artist to be saved in metadata
@@ -130,13 +293,17 @@ class MetadataEditor(object):
         :param int track_number: track number to be saved in metadata
         :param int process_index: Current process index displayed in log message
         :param int process_total: Total number of process displayed in log message
+        :rtype bool
+        :return: Flag that indicates the song is tagged or already up to date
         """
 
         if audio_file is None:
             logger.warning('[Process:{}/{}][Track:{}] Could not update metadata because there is no data found on the playlist. The video may be private or deleted.'.format(process_index, process_total, track_number))
-            return
+            return False
 
-        if process_index > 0 and process_total > 0:
+        if process_index > 0:
+            # Total is unknown while the playlist is streamed
+            process_total = process_total if process_total > 0 else '?'
 
             if track_number > 0:
                 log_prefix = '[Process:{}/{}][Track:{}]'.format(process_index, process_total, track_number)
@@ -150,131 +317,59 @@ class MetadataEditor(object):
         audio_filename = os.path.basename(audio_file)
 
         try:
+            started_at = time.perf_counter()
+
             # Validate audio data
             if not os.path.isfile(audio_file):
                 raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), audio_file)
 
-            audio_mime_type = mimetypes.guess_type(audio_file)
-
-            if contains_at_least(audio_mime_type, ['audio/x-mp4', 'audio/x-m4a', 'audio/mp4a-latm']):
+            handler = find_handler(audio_file)
+            if handler is None:
+                raise InvalidMimeTypeException("Invalid audio format.", mimetypes.guess_type(audio_file))
+            artwork = None if self.no_artwork else self.__get_tag_image(artwork)
 
-                # For more info about mp4 tag is available at
-                # https://github.com/quodlibet/mutagen/blob/cf399dc58940fb1356f672809d763be9e2af0033/mutagen/mp4/__init__.py
-                # http://atomicparsley.sourceforge.net/mpeg-4files.html
-                mp4_data = mp4.MP4(audio_file)
-                # Track Number
-                if not self.no_track_number and track_number > 0:
-                    mp4_data['trkn'] = [(track_number, 0)]
-                # Cover image
-                if not self.no_artwork:
-                    image_data = self.__get_tag_image(image_file, audio_mime_type)
-                    if image_data:
-                        mp4_data['covr'] = [image_data]
-                # Album title
-                if not self.no_album_title and album_title is not None:
-                    mp4_data['\xa9alb'] = album_title
-                # Album artist
-                if not self.no_album_artist and album_artist is not None:
-                    mp4_data['aART'] = album_artist
-                # Composer
-                if not self.no_composer and album_composer is not None:
-                    mp4_data['\xa9wrt'] = album_composer
-                # Part of compilation
-                if not self.no_compilation:
-                    mp4_data['cpil'] = True
-                # Save
-                mp4_data.save()
-
-            elif contains_at_least(audio_mime_type, ['audio/x-mp3', 'audio/mpeg']):
-
-                # For more info about ID3v2 tag is available at
-                # https://github.com/quodlibet/mutagen/blob/4a5d7d17f1a611280cc52d229aa70b77ca3c55dd/mutagen/id3/_frames.py
-                # https://help.mp3tag.de/main_tags.html
-                mp3_data = id3.ID3(audio_file)
-                # Cover image
-                if not self.no_artwork:
-                    image_data = self.__get_tag_image(image_file, audio_mime_type)
-                    if image_data:
-                        mp3_data['APIC'] = image_data
+            # Tags are saved only when they differ from tags already written, so re-tagging is idempotent
+            audio = handler.open(audio_file)
+            is_changed = self.__merge_tags([
                 # Track number
-                if not self.no_track_number and track_number > 0:
-                    mp3_data.add(id3.TRCK(encoding=3, text=['{}/{}'.format(track_number, 0)]))
-                # Album title
-                if not self.no_album_title and album_title is not None:
-                    mp3_data["TALB"] = id3.TALB(encoding=0, text=album_title)
-                # Album artist
-                if not self.no_album_artist and album_artist is not None:
-                    mp3_data["TPE2"] = id3.TPE2(encoding=0, text=album_artist)
-                # Composer
-                if not self.no_composer and album_composer is not None:
-                    mp3_data["TCOM"] = id3.TCOM(encoding=0, text=album_composer)
-                # Part of compilation
-                if not self.no_compilation:
-                    mp3_data['TCMP'] = id3.TCMP(encoding=0, text=['1'])
-                # Save
-                mp3_data.save()
-
-            elif contains_at_least(audio_mime_type, ['audio/x-aac']):
-
-                # TODO: Add AAC support
-                pass
-                # image_data = __get_tag_image(image_file, audio_mime_type)
-                # aac_data = aac.AAC(audio_file)
-                # if not self.no_track_number:
-                #     if track_number > 0 and track_total > 0:
-                #         aac_data.add_tags(id3.TRCK(encoding=3, text=['{}/{}'.format(track_number, track_total)]))
-                #         # mp3_data['TRCK'] = id3.TRCK(encoding=3, text=[str(track_number)])
-                # if image_data:
-                #     mp3_data['APIC'] = image_data
-                #     aac_data.save()
-
-            elif contains_at_least(audio_mime_type, ['audio/x-flac']):
-
-                # https://github.com/quodlibet/mutagen/blob/a1db79ece62c4e86259f15825e360d1ce0986a22/mutagen/flac.py
-                # https://github.com/quodlibet/mutagen/blob/4a5d7d17f1a611280cc52d229aa70b77ca3c55dd/tests/test_flac.py
-
-                flac_data = flac.FLAC(audio_file)
-                # Artwork
-                if not self.no_artwork:
-                    image_data = self.__get_tag_image(image_file, audio_mime_type)
-                    if image_data:
-                        flac_data.add_picture(image_data)
-                # Save
-                flac_data.save()
-
-                flac_data = File(audio_file)
-                # Track number
-                if not self.no_track_number and track_number > 0:
-                    flac_data.tags['tracknumber'] = str(track_number)
+                ('track_number', not self.no_track_number, track_number if track_number > 0 else None),
+                # Cover image
+                ('artwork', not self.no_artwork, artwork),
                 # Album title
-                if not self.no_album_title and album_title is not None:
-                    flac_data.tags['album'] = album_title
+                ('album', not self.no_album_title, album_title),
                 # Album artist
-                if not self.no_album_artist and album_artist is not None:
-                    flac_data.tags['albumartist'] = album_artist
+                ('album_artist', not self.no_album_artist, album_artist),
                 # Composer
-                if not self.no_composer and album_composer is not None:
-                    flac_data.tags['composer'] = album_composer
+                ('composer', not self.no_composer, album_composer),
                 # Part of compilation
-                if not self.no_compilation:
-                    pass
-                # Save
-                flac_data.save()
-                # audio = File(audio_file, easy=True)
+                ('compilation', not self.no_compilation, True),
+            ], get=lambda field: handler.get(audio, field), put=lambda field, value: handler.put(audio, field, value), delete=lambda field: handler.delete(audio, field))
+            # Save
+            if is_changed:
+                handler.save(audio, padding=self.__padding)
+            tagged_at = time.perf_counter()
 
-            else:
-                raise InvalidMimeTypeException("Invalid audio format.", audio_mime_type)
+            # Rename filename from id to title
+            dest_audio_file = audio_file
+            if song_title is not None:
+                dest_audio_file = os.path.join(download_dir, '{}.{}'.format(song_title, handler.extension))
+                if dest_audio_file != audio_file:
+                    os.rename(audio_file, dest_audio_file)
 
-            # Remove artwork if succeeded
-            if os.path.exists(image_file):
-                os.remove(image_file)
+            renamed_at = time.perf_counter()
 
-            # Rename filename from id to title
-            dest_audio_file = os.path.join(download_dir, '{}.{}'.format(song_title, self.audio_codec))
-            os.rename(audio_file, dest_audio_file)
+            if self.metrics is not None and song_id is not None:
+                self.metrics.add(os.path.basename(download_dir), song_id, tag_seconds=tagged_at - started_at, rename_seconds=renamed_at - tagged_at)
+            if self.tracer is not None:
+                self.tracer.complete('tag', started_at, tagged_at, song_id=song_id, is_changed=is_changed)
+                self.tracer.complete('rename', tagged_at, renamed_at, song_id=song_id)
 
             dest_audio_filename = os.path.basename(dest_audio_file)
-            logger.info('{}[File:{}] Updated.'.format(log_prefix, dest_audio_filename))
+            if is_changed or dest_audio_file != audio_file:
+                logger.info('{}[File:{}] Updated.'.format(log_prefix, dest_audio_filename))
+            else:
+                logger.info('{}[File:{}] Up to date.'.format(log_prefix, dest_audio_filename))
+            return True
 
         except FileNotFoundError:
             message = 'File not found. Skipped.'
@@ -292,68 +387,65 @@ class MetadataEditor(object):
             message = 'Error {}: {} Skipped.'.format(type(e), str(e))
             logger.error('{}[File:{}] {}'.format(log_prefix, audio_filename, message))
 
-    def __get_tag_image(self, image_file, audio_mime_type):
-        """
-        The function that returns cover image.
+        return False
 
-        :param str image_file: Path to image file
-        :param list audio_mime_type: Mime-Types of image file
-        :return binary image_data: Binary data of image file
+    def __merge_tags(self, fields, get, put, delete):
         """
-        if not os.path.isfile(image_file):
-            return
-
-        # Create image
-        with open(image_file, 'rb') as f:
-            image_data = f.read()
-        if image_data is None:
-            raise InvalidDataException("Could not create image data.", image_file)
-
-        image_mime_type = mimetypes.guess_type(image_file)[0]
-
-        if contains_at_least(audio_mime_type, ['audio/x-mp4', 'audio/x-m4a', 'audio/mp4a-latm']):
-
-            if image_mime_type == "image/jpeg":
-                image_format = mp4.MP4Cover.FORMAT_JPEG
-            elif image_mime_type == "image/png":
-                image_format = mp4.MP4Cover.FORMAT_PNG
-            else:
-                raise InvalidMimeTypeException("Invalid image format.", image_mime_type)
-
-            return mp4.MP4Cover(image_data, image_format)
-
-        elif contains_at_least(audio_mime_type, ['audio/x-mp3', 'audio/mpeg']):
-
-            if not image_mime_type == "image/jpeg" and not image_mime_type == "image/png":
-                raise InvalidMimeTypeException("Invalid image format.", image_mime_type)
-
-            return id3.APIC(encoding=3, mime=image_mime_type, type=3, desc='Cover', data=image_data)
-
-        elif contains_at_least(audio_mime_type, ['audio/x-aac']):
+        The function that updates tags which differ from desired values.
+        Tags forbidden by flags are removed only if prune is enabled.
+
+        :param list fields: List of (key, is_allowed, value). Value is None if the tag is left as it is.
+        :param function get: Function that returns the current value of a key in the same form as the desired value, or None
+        :param function put: Function that writes a value of a key
+        :param function delete: Function that removes a key
+        :rtype bool
+        :return: Flag that indicates tags are changed
+        """
+        is_changed = False
+        for key, is_allowed, value in fields:
+            current_value = get(key)
+            if not is_allowed:
+                if self.prune and current_value is not None:
+                    delete(key)
+                    is_changed = True
+            elif value is not None and current_value != value:
+                put(key, value)
+                is_changed = True
+        return is_changed
+
+    def __padding(self, info):
+        """
+        The function that decides padding left after tags, called by mutagen on save.
+        Existing padding is kept as it is, so tags are rewritten in place without moving audio data.
+        If tags do not fit, the padding budget is reserved, so later updates fit in place.
 
-            # TODO: Add aac support
-            pass
-            # if not image_mime_type == "image/jpeg" and not image_mime_type == "image/png":
-            #     raise InvalidMimeTypeException("Invalid image format.", image_mime_type)
-            #
-            # picture = flac.Picture()
-            # picture.type = 3
-            # picture.desc = 'front cover'
-            # picture.data = image_data
-            #
-            # return picture
+        :param mutagen.PaddingInfo info: Padding left after saving and size of data following it
+        :rtype int
+        :return: Bytes of padding after saving
+        """
+        if self.tag_padding is None:
+            return info.get_default_padding()
+        if info.padding >= 0:
+            return info.padding
+        return max(0, self.tag_padding)
 
-        elif contains_at_least(audio_mime_type, ['audio/x-flac']):
+    def __get_tag_image(self, artwork):
+        """
+        The function that validates cover image.
 
-            if not image_mime_type == "image/jpeg" and not image_mime_type == "image/png":
-                raise InvalidMimeTypeException("Invalid image format.", image_mime_type)
+        :param tuple artwork: (Image data, Mime type) of artwork provided by the cache, or None
+        :rtype tuple
+        :return: (Image data, Mime type) of artwork embedded, or None
+        """
+        if artwork is None:
+            return
 
-            picture = flac.Picture()
-            picture.type = 3
-            picture.desc = 'front cover'
-            picture.data = image_data
+        # Image is shared by songs with the same cover, so it is not read from the disk for each song
+        image_data, image_mime_type = artwork
+        if not image_data:
+            raise InvalidDataException("Could not create image data.", image_mime_type)
 
-            return picture
+        if image_mime_type not in EMBEDDABLE_MIME_TYPES:
+            raise InvalidMimeTypeException("Invalid image format.", image_mime_type)
 
-        else:
-            raise InvalidMimeTypeException("Invalid audio format.", audio_mime_type)
+        return image_data, image_mime_type
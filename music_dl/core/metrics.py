@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Filename of the metrics of each song appended by every run
+TRACKS_FILENAME = 'music_dl.jsonl'
+# Filename of the metrics of the last run read by textfile collector of node_exporter
+PROMETHEUS_FILENAME = 'music_dl.prom'
+
+# Seconds summed for each song, in order of the lifecycle
+TRACK_SECONDS = ['download_seconds', 'transcode_seconds', 'tag_seconds', 'rename_seconds']
+
+
+class MetricsRecorder(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self):
+        """
+        Initializer
+
+        Metrics of each song and seconds of each phase are recorded in memory while songs are processed,
+        and written once by the owner of the recorder after all playlists are processed.
+        Playlists processed at once share a recorder, so the metrics cover the whole run.
+        """
+
+        self.run_id = uuid.uuid4().hex
+        self.started_at = time.time()
+        self.tracks = OrderedDict()  # OrderedDict that maps (playlist_key, song_id) and metrics of the song
+        self.phases = OrderedDict()  # OrderedDict that maps phase name and seconds
+        self.lock = threading.Lock()
+
+    """"""""""""""" Record """""""""""""""
+
+    def add(self, playlist_key, song_id, **values):
+        """
+        The function that adds values to metrics of a song, such as bytes and seconds
+
+        :param str playlist_key: Key of the playlist
+        :param str song_id: Entry id
+        :param values: Numbers added to the metrics
+        """
+        with self.lock:
+            track = self.__track(playlist_key, song_id)
+            for key, value in values.items():
+                track[key] = track.get(key, 0) + value
+
+    def set(self, playlist_key, song_id, **values):
+        """
+        The function that replaces values of metrics of a song, such as status
+
+        :param str playlist_key: Key of the playlist
+        :param str song_id: Entry id
+        :param values: Values set to the metrics
+        """
+        with self.lock:
+            self.__track(playlist_key, song_id).update(values)
+
+    def __track(self, playlist_key, song_id):
+        track = self.tracks.get((playlist_key, song_id))
+        if track is None:
+            track = {'playlist': playlist_key, 'id': song_id}
+            self.tracks[(playlist_key, song_id)] = track
+        return track
+
+    @contextmanager
+    def phase(self, name):
+        """
+        The function that adds seconds taken by the block to the phase
+
+        :param str name: Phase name, such as preprocess, merge, download, metadata and cleanup
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    """"""""""""""" Export """""""""""""""
+
+    def write(self, metrics_dir):
+        """
+        The function that appends metrics of each song as JSON lines, and replaces Prometheus metrics aggregated over the run
+
+        :param str metrics_dir: Directory where metrics are written
+        """
+        os.makedirs(metrics_dir, exist_ok=True)
+        finished_at = time.time()
+        with self.lock:
+            tracks = [dict(track) for track in self.tracks.values()]
+            phases = dict(self.phases)
+
+        with open(os.path.join(metrics_dir, TRACKS_FILENAME), 'a', encoding='utf-8') as f:
+            for track in tracks:
+                f.write(json.dumps(dict(self.__track_line(track), type='track', run_id=self.run_id), ensure_ascii=False) + '\n')
+            f.write(json.dumps({
+                'type': 'run', 'run_id': self.run_id, 'started_at': self.started_at, 'elapsed': finished_at - self.started_at,
+                'tracks': len(tracks), 'phases': phases,
+            }) + '\n')
+
+        # Textfile collector may read the file while it is written, so it is replaced at once
+        prometheus_file = os.path.join(metrics_dir, PROMETHEUS_FILENAME)
+        temp_file = '{}.{}.temp'.format(prometheus_file, os.getpid())
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(self.__prometheus(tracks, phases, finished_at))
+        os.replace(temp_file, prometheus_file)
+
+    @staticmethod
+    def __track_line(track):
+        line = {key: track.get(key, 0) for key in ['bytes'] + TRACK_SECONDS + ['retries']}
+        line.update(track)
+        line['throughput'] = line['bytes'] / line['download_seconds'] if line['download_seconds'] > 0 else None
+        line.setdefault('status', None)
+        return line
+
+    def __prometheus(self, tracks, phases, finished_at):
+        lines = []
+
+        def add(name, help_text, samples):
+            lines.append('# HELP music_dl_{} {}'.format(name, help_text))
+            lines.append('# TYPE music_dl_{} gauge'.format(name))
+            for labels, value in samples:
+                label_text = ','.join('{}="{}"'.format(key, str(label).replace('\\', '\\\\').replace('"', '\\"')) for key, label in labels)
+                lines.append('music_dl_{}{} {}'.format(name, '{' + label_text + '}' if label_text else '', value))
+
+        statuses = OrderedDict()
+        for track in tracks:
+            status = track.get('status') or 'unknown'
+            statuses[status] = statuses.get(status, 0) + 1
+        downloaded_bytes = sum(track.get('bytes', 0) for track in tracks)
+        download_seconds = sum(track.get('download_seconds', 0) for track in tracks)
+
+        add('tracks', 'Number of songs processed by the last run by final status.', [((('status', status),), count) for status, count in statuses.items()])
+        add('downloaded_bytes', 'Bytes downloaded by the last run.', [((), downloaded_bytes)])
+        for key in TRACK_SECONDS:
+            add(key, 'Seconds summed over songs of the last run.', [((), sum(track.get(key, 0) for track in tracks))])
+        add('throughput_bytes_per_second', 'Bytes downloaded per second of download time by the last run.', [((), downloaded_bytes / download_seconds if download_seconds > 0 else 0)])
+        add('retries', 'Number of failed attempts retried by the last run.', [((), sum(track.get('retries', 0) for track in tracks))])
+        add('phase_seconds', 'Seconds spent in each phase by the last run. Merge is part of preprocess.', [((('phase', name),), seconds) for name, seconds in phases.items()])
+        add('run_seconds', 'Seconds taken by the last run.', [((), finished_at - self.started_at)])
+        add('last_run_timestamp_seconds', 'Unix time the last run finished.', [((), finished_at)])
+        return '\n'.join(lines) + '\n'
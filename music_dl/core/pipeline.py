@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import queue
+import threading
+
+from music_dl.lib.log import logger
+
+_STOP = object()
+
+
+class Stage(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, name, handler, workers=1, maxsize=0):
+        """
+        Initializer
+
+        :param str name: Stage name displayed in log message
+        :param function handler: Function called with each item put into the stage
+        :param int workers: Number of worker threads
+        :param int maxsize: Maximum number of items waiting in the queue. Zero means unbounded.
+        """
+
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.threads = []
+
+    """"""""""""""" Control """""""""""""""
+
+    def start(self):
+        """
+        The function that starts worker threads
+
+        :rtype Stage
+        :return: Stage itself
+        """
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.__run, name='{}-{}'.format(self.name, index + 1), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def put(self, item):
+        """
+        The function that queues an item. Blocks while the queue is full.
+
+        :param item: Item passed to the handler
+        """
+        self.queue.put(item)
+
+    def join(self):
+        """
+        The function that waits until all queued items are processed and stops worker threads
+        """
+        for _ in self.threads:
+            self.queue.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def __run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                self.handler(item)
+            except Exception as e:
+                logger.error('[{}] {}:{}'.format(self.name, type(e), str(e)))
@@ -2,22 +2,32 @@
 # coding: utf-8
 
 import glob
-import json
 import os
+import threading
+import time
+from collections import deque
 from pprint import pformat
 
-from youtube_dl import YoutubeDL
 from youtube_dl.utils import sanitize_filename
 
+from music_dl.core.cache import ExtractionCache
+from music_dl.core.codec import find_handler, get_codecs, get_extension, get_handler
 from music_dl.core.error import PlaylistParameterException, PlaylistPreprocessException, PlaylistDownloadException
-from music_dl.core.youtube_dl import YDLQueueStatus, YDLHelper
+from music_dl.core.metrics import MetricsRecorder
+from music_dl.core.ratelimit import RateLimiter
+from music_dl.core.retry import RetryPolicy
+from music_dl.core.scheduler import DownloadScheduler
+from music_dl.core.state import StateStore
+from music_dl.core.store import TrackStore
+from music_dl.core.transcode import Transcoder
+from music_dl.core.youtube_dl import YDLQueueStatus, YDLHelper, YDLProcessedPostProcessor, YDLRateLimited
 from music_dl.lib.log import logger
 
 
 class Playlist(object):
     """"""""""""""" Initialization """""""""""""""
 
-    def __init__(self, download_url, working_dir, audio_codec='m4a', audio_bitrate=198, playlist_start=1, playlist_end=0, clear_cache=False, verbose=False, test_id=None):
+    def __init__(self, download_url, working_dir, audio_codec='m4a', audio_bitrate=198, playlist_start=1, playlist_end=0, jobs=1, stream=False, stream_window=64, cache_ttl=3600, refresh=False, scheduler=None, transcode_jobs=0, transcode_nice=0, transcode_ionice=None, request_rate=0, byte_rate=0, rate_limiter=None, retry_failed=False, metrics=None, tracer=None, clear_cache=False, verbose=False, test_id=None):
         """
         Initializer
 
@@ -25,7 +35,22 @@ class Playlist(object):
         :param int audio_bitrate: Preferred audio bitrate
         :param int playlist_start: Index specifying playlist item to start at
         :param int playlist_end: Index specifying playlist item to end at
-        :param bool clear_cache: Flag that indicates to delete json file before downloading
+        :param int jobs: Number of songs downloaded concurrently
+        :param bool stream: Download songs while the playlist is being retrieved
+        :param int stream_window: Maximum number of entries held in memory while the playlist is streamed
+        :param int cache_ttl: Seconds while the retrieved playlist is reused. Zero disables the cache.
+        :param bool refresh: Flag that indicates to retrieve the playlist even if it is cached
+        :param DownloadScheduler scheduler: Scheduler shared by playlists downloaded at once. If None, the playlist uses its own.
+        :param int transcode_jobs: Number of ffmpeg processes transcoding songs at once. Zero means the number of CPU cores.
+        :param int transcode_nice: Niceness added to ffmpeg processes
+        :param str transcode_ionice: I/O scheduling class of ffmpeg processes
+        :param float request_rate: Maximum number of requests per second sent to the site. Zero means unlimited.
+        :param float byte_rate: Maximum number of bytes per second downloaded from the site. Zero means unlimited.
+        :param RateLimiter rate_limiter: Rate limiter shared by playlists downloaded at once. If None, the playlist uses its own.
+        :param bool retry_failed: Flag that indicates to download songs failed previously right away, including quarantined songs
+        :param MetricsRecorder metrics: Recorder of metrics of songs shared by playlists processed at once. If None, the playlist uses its own.
+        :param TraceRecorder tracer: Recorder of spans of songs, or None
+        :param bool clear_cache: Flag that indicates to delete saved playlist state before downloading
         :param bool verbose: Print verbose message
         :param str test_id: Test case identifier
         """
@@ -37,26 +62,66 @@ class Playlist(object):
         self.audio_bitrate = audio_bitrate
         self.playlist_start = playlist_start
         self.playlist_end = playlist_end
+        self.jobs = jobs
+        self.stream = stream
+        self.stream_window = stream_window
+        self.cache_ttl = cache_ttl
+        self.refresh = refresh
+        self.scheduler = scheduler
+        self.transcode_jobs = transcode_jobs
+        self.transcode_nice = transcode_nice
+        self.transcode_ionice = transcode_ionice
+        self.rate_limiter = rate_limiter or RateLimiter(request_rate, byte_rate, max_concurrency=jobs)
+        self.retry_failed = retry_failed
+        self.retry_policy = RetryPolicy()
+        self.metrics = metrics or MetricsRecorder()
+        self.tracer = tracer
         self.clear_cache = clear_cache
         self.verbose = verbose
         self.test_id = test_id
 
         # Path
         self.download_dir = None
-        self.playlist_file = None  # Path to playlist file
-        self.downloaded_playlist_file = None  # Path to playlist file contains downloaded songs
+
+        # State
+        self.state_store = None  # Download state of all playlists in working directory
+        self.playlist_key = None  # Key of the playlist on state store
+        self.extraction_cache = None  # Playlist data retrieved recently
+        self.track_store = None  # Songs downloaded to any playlist in working directory
+        self.running_scheduler = None  # Scheduler downloading songs
+        self.transcoder = None  # Transcoder of the scheduler downloading songs
+        self.host_limiter = self.rate_limiter.get(download_url)  # Limiter of requests and bytes sent to the site
+        self.transcode_futures = []  # List of (entry_id, future) of songs being transcoded
+        self.failures = {}  # Dictionary that maps entry_id and failure of songs failed previously
+        self.failed_entries = []  # List of (entry, queue_index, queue_total) of songs failed by this run and not retried yet
+        self.cache_key = None  # Key of the playlist on extraction cache
+        self.is_playlist_cached = False  # Flag specifies playlist data is loaded from extraction cache
 
         # Playlist data
         self.playlist_data = None  # Playlist data
         self.downloaded_playlist_data = None  # Playlist data
         self.playlist_entry_total = 0  # Total count of entries on playlist
         self.playlist_data_map = {}  # OrderedDict that maps index and entry_id
+        self.streaming_entries = {}  # Dictionary that maps entry_id and entries in progress while the playlist is streamed
+        self.playlist_offset = 0  # Number of entries skipped before the range requested
+        self.is_playlist_sliced = False  # Flag specifies only the range requested is retrieved
         self.scheduled_queue_indices = []  # Queue indices to be downloaded
         self.is_playlist = False  # Flag specifies data is playlist
+        self.playlist_lock = threading.Lock()  # Lock that guards playlist data updated by download workers
+        self.processed_hook = None  # Function called when each song is post processed
+        self.metadata_editor = None  # Metadata editor which provides metadata written while songs are transcoded
+        self.processed_index = 0  # Number of songs post processed
+        self.processed_total = 0  # Number of songs to be post processed
+        self.downloaded_songs = 0  # Number of songs downloaded
+        self.linked_songs = 0  # Number of songs linked from track store
+        self.copied_songs = 0  # Number of songs whose audio is copied without encoding
+        self.transcoded_songs = 0  # Number of songs whose audio is encoded
+        self.downloaded_bytes = 0  # Number of bytes downloaded
+        self.trace_local = threading.local()  # Time each download worker finished downloading, traced until the song is post processed by youtube-dl
 
         # Youtube Downloader
-        self.ydl = YoutubeDL()
-        self.ydl_helper = YDLHelper()
+        self.ydl = YDLRateLimited(host_limiter=self.host_limiter)
+        self.ydl_helper = YDLHelper(tracer=self.tracer)
 
     """"""""""""""" Property """""""""""""""
 
@@ -81,9 +146,24 @@ class Playlist(object):
         if 0 < self.playlist_end < self.playlist_start:
             raise PlaylistParameterException('Invalid start and end index. End index must be greater than or equal to start index.')
 
+        # Validate cache TTL
+        if self.cache_ttl < 0:
+            raise PlaylistParameterException('Invalid cache TTL. Value must be greater than or equal to 0.')
+
+        # Validate number of jobs
+        if self.jobs <= 0:
+            raise PlaylistParameterException('Invalid number of jobs. Value must be greater than or equal to 1.')
+
+        # Validate transcode options
+        if self.transcode_jobs < 0:
+            raise PlaylistParameterException('Invalid number of transcode jobs. Value must be greater than or equal to 0.')
+
+        if not (self.transcode_ionice is None or self.transcode_ionice in ['realtime', 'best-effort', 'idle']):
+            raise PlaylistParameterException('I/O scheduling class must be realtime, best-effort, or idle.')
+
         # Validate audio codec
-        if not (self.audio_codec in ['m4a', 'mp3', 'flac']):
-            raise PlaylistParameterException('Supported audio format is m4a, mp3, and flac for now.')
+        if not (self.audio_codec in get_codecs()):
+            raise PlaylistParameterException('Supported audio format is {} for now.'.format(', '.join(get_codecs())))
 
         # Validate audio bit rate
         if self.audio_bitrate < 0:
@@ -98,29 +178,41 @@ class Playlist(object):
         """
 
         self.download_url = download_url
+        self.host_limiter = self.rate_limiter.get(download_url)
 
         """ Retrieve playlist """
 
         logger.info('Retrieving playlist...')
         logger.info('Download URL: {}'.format(self.download_url))
 
-        try:
-            ydl_opts = self.ydl_helper.get_preprocess_option(
-                download_url=self.download_url,
-                audio_codec=self.audio_codec,
-                audio_bitrate=self.audio_bitrate,
-                playlist_start=self.playlist_start,
-                playlist_end=self.playlist_end,
-                verbose=self.verbose,
-            )
-            logger.debug(pformat(ydl_opts))
-            self.ydl.__init__(params=ydl_opts)
-            # TODO: What is extra_info? Need investigation.
-            # self.playlist_data = self.ydl.extract_info(download_url, download=False, process=False, extra_info={})
-            self.playlist_data = self.ydl.extract_info(self.download_url, download=False, process=False)
-
-        except:
-            raise PlaylistPreprocessException('Could not retrieve playlist.', None)
+        # Playlist retrieved recently is loaded from cache unless refresh is requested
+        self.extraction_cache = ExtractionCache(working_dir, ttl=self.cache_ttl)
+        self.cache_key = ExtractionCache.make_key(self.download_url, self.playlist_start, self.playlist_end)
+        self.playlist_data = None if self.refresh else self.extraction_cache.get(self.cache_key)
+        self.is_playlist_cached = self.playlist_data is not None
+        if self.is_playlist_cached:
+            logger.info('Playlist is loaded from cache. Use --refresh to retrieve it again.')
+        else:
+            try:
+                ydl_opts = self.ydl_helper.get_preprocess_option(
+                    download_url=self.download_url,
+                    audio_codec=self.audio_codec,
+                    audio_bitrate=self.audio_bitrate,
+                    playlist_start=self.playlist_start,
+                    playlist_end=self.playlist_end,
+                    verbose=self.verbose,
+                )
+                logger.debug(pformat(ydl_opts))
+                self.ydl.__init__(params=ydl_opts, host_limiter=self.host_limiter)
+                extracted_at = time.perf_counter()
+                # TODO: What is extra_info? Need investigation.
+                # self.playlist_data = self.ydl.extract_info(download_url, download=False, process=False, extra_info={})
+                self.playlist_data = self.ydl.extract_info(self.download_url, download=False, process=False)
+                if self.tracer is not None:
+                    self.tracer.complete('extract', extracted_at, url=self.download_url)
+
+            except:
+                raise PlaylistPreprocessException('Could not retrieve playlist.', None)
 
         if self.playlist_data is None or self.ydl is None:
             raise PlaylistPreprocessException('Could not retrieve playlist.', None)
@@ -155,8 +247,7 @@ class Playlist(object):
         else:
             raise PlaylistPreprocessException('This playlist is not supported.', self.playlist_data)
 
-        self.playlist_file = os.path.join(self.download_dir, '.queued.json')
-        self.downloaded_playlist_file = os.path.join(self.download_dir, '.downloaded.json')
+        self.playlist_key = download_folder
 
         logger.debug(pformat(self.playlist_data))
         logger.info('Done.')
@@ -168,11 +259,20 @@ class Playlist(object):
         # Download directory
         os.makedirs(self.download_dir, exist_ok=True)
 
-        # Playlist
-        if self.clear_cache and os.path.exists(self.playlist_file):
-            os.remove(self.playlist_file)
-        if os.path.exists(self.downloaded_playlist_file):
-            os.remove(self.downloaded_playlist_file)
+        # Playlist state
+        self.state_store = StateStore(working_dir)
+        self.state_store.migrate(self.playlist_key, self.download_dir)
+        if self.clear_cache:
+            self.state_store.clear(self.playlist_key)
+
+        # Failed songs are not extracted again until they are eligible
+        if self.retry_failed:
+            self.state_store.clear_failure()
+        self.failures = self.state_store.load_failures()
+
+        # Songs shared by playlists
+        if self.is_playlist:
+            self.track_store = TrackStore(working_dir, self.audio_codec, self.audio_bitrate)
 
         logger.info('Done.')
 
@@ -180,47 +280,92 @@ class Playlist(object):
 
         logger.info('Processing playlist...')
 
-        if self.is_playlist:
-            # Convert generator object to list
+        # Retrieve only entries in the range requested
+        self.is_playlist_sliced = self.is_playlist and (self.playlist_start > 1 or self.playlist_end > 0)
+        if self.is_playlist_sliced:
+            self.playlist_offset = self.playlist_start - 1
+            # Cached playlist contains only the range requested
+            if not self.is_playlist_cached:
+                self.playlist_data['entries'] = self.ydl_helper.slice_entries(self.playlist_data['entries'], self.playlist_start, self.playlist_end)
+
+        if self.is_playlist and self.stream:
+            # Entries are merged and scheduled in download() as the generator yields them
+            logger.info('Playlist is processed while songs are downloaded.')
+            if not self.is_playlist_cached:
+                header = {key: value for key, value in self.playlist_data.items() if key != 'entries'}
+                self.playlist_data['entries'] = self.__cache_entries(header, self.playlist_data['entries'])
+
+        elif self.is_playlist:
+            # Convert generator object to list. Pages of the playlist are extracted while it is enumerated.
+            extracted_at = time.perf_counter()
             self.playlist_data['entries'] = list(self.playlist_data['entries'])
             self.playlist_entry_total = len(self.playlist_data['entries'])
+            if self.tracer is not None and not self.is_playlist_cached:
+                self.tracer.complete('extract', extracted_at, entries=self.playlist_entry_total)
+            if not self.is_playlist_cached:
+                self.extraction_cache.put(self.cache_key, self.playlist_data)
 
             # Merge playlist
-            merged_playlist_data, queue_indices = self.__merge_playlist(self.playlist_data)
-            with open(self.playlist_file, 'w') as f:
-                json.dump(merged_playlist_data, f, indent=4, ensure_ascii=False)
+            with self.metrics.phase('merge'):
+                merged_playlist_data, queue_indices = self.__merge_playlist(self.playlist_data)
             self.playlist_data = merged_playlist_data
             self.scheduled_queue_indices = queue_indices
 
+        elif not self.is_playlist_cached:
+            self.extraction_cache.put(self.cache_key, self.playlist_data)
+
         logger.debug(pformat(self.playlist_data))
         logger.info('Done.')
 
         return self.download_dir
 
+    def __cache_entries(self, header, entries):
+        """
+        The generator that yields entries of the playlist being streamed,
+        and caches the playlist after all entries are yielded
+
+        :param dict header: Playlist data without entries
+        :param entries: Iterable of entries not retrieved yet
+        """
+        cached_entries = []
+        for entry in entries:
+            # Entry is copied, because merge adds status to it
+            cached_entries.append(dict(entry) if entry is not None else None)
+            yield entry
+        self.extraction_cache.put(self.cache_key, dict(header, entries=cached_entries))
+
     """"""""""""""" Download """""""""""""""
 
-    def download(self):
+    def download(self, processed_hook=None, metadata_editor=None):
         """
         The function to download songs on the playlist
 
+        :param function processed_hook: Function called with (entry, track_number, process_index, process_total) as soon as each song is post processed
+        :param MetadataEditor metadata_editor: Metadata editor whose metadata and artwork are written while songs are transcoded.
+                                               Songs tagged this way are saved with their titles and not passed to processed_hook.
         :return str is_downloaded: Flag that indicates songs are downloaded
         """
 
+        self.processed_hook = processed_hook
+        self.metadata_editor = metadata_editor
+        self.processed_index = 0
+        self.processed_total = len(self.scheduled_queue_indices) if self.is_playlist else 1
+
         """ Generate youtube-dl option """
 
         logger.info('Generating youtube-dl option...')
 
         ydl_opts = None
-        if self.is_playlist and len(self.scheduled_queue_indices) > 0:
-            ydl_opts = self.ydl_helper.get_download_option(
-                download_dir=self.download_dir,
-                hook=self.__download_hook,
-                audio_codec=self.audio_codec,
-                audio_bitrate=self.audio_bitrate,
-                queue_indices=self.scheduled_queue_indices,
-                verbose=self.verbose
-            )
-            logger.debug(pformat(ydl_opts))
+        if self.is_playlist and self.stream:
+            # Each worker generates its own option in __download_entry
+            return self.__download_streaming()
+
+        elif self.is_playlist and len(self.scheduled_queue_indices) > 0:
+            # Each worker generates its own option in __download_entry.
+            # Playlist is downloaded by entry even with a single job, instead of a single extract_info call with playlist_items,
+            # so songs found on track store are not downloaded, failed songs are retried one by one,
+            # and playlist_items does not enumerate the playlist again.
+            return self.__download_concurrently()
 
         elif not self.is_playlist:
             ydl_opts = self.ydl_helper.get_download_option(
@@ -241,11 +386,9 @@ class Playlist(object):
 
             try:
                 # Download playlist
-                self.ydl.__init__(params=ydl_opts)
+                self.ydl.__init__(params=ydl_opts, host_limiter=self.host_limiter)
+                self.__add_post_processors(self.ydl)
                 self.downloaded_playlist_data = self.ydl.extract_info(self.download_url, download=True)
-                # Save playlist data
-                with open(self.downloaded_playlist_file, 'w') as f:
-                    json.dump(self.downloaded_playlist_data, f, indent=4, ensure_ascii=False)
 
             except Exception:
                 raise PlaylistDownloadException('Failed to download playlist.', None)
@@ -260,6 +403,653 @@ class Playlist(object):
             logger.warning('All songs on the playlist are already downloaded. There is nothing to process.')
             return False
 
+    def __download_concurrently(self):
+        """
+        The function that downloads scheduled songs with a pool of workers.
+        Each worker downloads one entry with its own YoutubeDL instance.
+
+        :return bool is_downloaded: Flag that indicates songs are downloaded
+        """
+
+        entries = self.__scheduled_entries()
+        queue_total = len(entries)
+
+        logger.info('Done.')
+        scheduler = self.__open_scheduler()
+        logger.info('Downloading songs with {} workers...'.format(scheduler.jobs))
+
+        try:
+            futures = [scheduler.submit(entry['id'], self.__download_entry, entry, queue_index, queue_total) for queue_index, entry in enumerate(entries, 1)]
+            downloaded_entries = [future.result() for future in futures]
+            retried_entries = self.__retry_failed(scheduler, self.__download_entry)
+            downloaded_entries = [self.__numbered_entry(entry, downloaded_entry if downloaded_entry is not None else retried_entries.get(entry['id']))
+                                  for entry, downloaded_entry in zip(entries, downloaded_entries)]
+            self.__wait_transcoded()
+
+        finally:
+            self.__close_scheduler(scheduler)
+
+        # Compose playlist data in the same form youtube-dl returns for a playlist
+        self.downloaded_playlist_data = {key: value for key, value in self.playlist_data.items() if key != 'entries'}
+        self.downloaded_playlist_data['entries'] = downloaded_entries
+
+        try:
+            # Save playlist data
+            self.state_store.save_downloaded(self.playlist_key, self.downloaded_playlist_data)
+
+        except Exception:
+            raise PlaylistDownloadException('Failed to download playlist.', None)
+
+        logger.info('Done.')
+        return True
+
+    def __download_streaming(self):
+        """
+        The function that downloads songs while the playlist is being retrieved.
+        Entries are merged with saved state and scheduled as the generator yields them,
+        and at most stream_window entries are held in memory.
+
+        :return bool is_downloaded: Flag that indicates songs are downloaded
+        """
+
+        scheduler = self.__open_scheduler()
+        logger.info('Done.')
+        logger.info('Downloading songs with {} workers while retrieving playlist...'.format(scheduler.jobs))
+
+        header = {key: value for key, value in self.playlist_data.items() if key != 'entries'}
+        has_base = self.state_store.has_playlist(self.playlist_key)
+        self.state_store.begin_stream(self.playlist_key)
+
+        # Entry data is kept only when metadata is updated after all songs are downloaded.
+        # Songs finish in any order, so they are keyed by position and sorted when all songs are done.
+        downloaded_entries = {} if self.processed_hook is None else None
+
+        staged_entries = []
+        pending_futures = deque()
+        position = self.playlist_offset
+        track_total = 0
+        queue_index = 0
+        is_completed = False
+
+        try:
+            try:
+                for head_entry in self.playlist_data['entries']:
+                    position += 1
+
+                    # Remove entry if invalid.
+                    if not self.__is_valid_entry(head_entry):
+                        self.__log_entry(logger.error, position - 1, 0, head_entry, 'The video is private or deleted. Removed from the playlist.')
+                        continue
+
+                    track_total += 1
+                    base_entry_status, base_track_number = self.state_store.get_entry(self.playlist_key, head_entry['id']) if has_base else (None, None)
+                    track_number = (base_track_number or position) if self.is_playlist_sliced else track_total
+
+                    if self.__merge_entry(position - 1, track_number, 0, head_entry, has_base, base_entry_status):
+                        queue_index += 1
+                        with self.playlist_lock:
+                            self.streaming_entries[head_entry['id']] = head_entry
+                        pending_futures.append(scheduler.submit(head_entry['id'], self.__download_streamed_entry, head_entry, queue_index, downloaded_entries))
+
+                    staged_entries.append((position - 1, head_entry))
+
+                    if len(staged_entries) >= self.stream_window:
+                        self.state_store.append_stream(self.playlist_key, staged_entries)
+                        staged_entries = []
+
+                    # Wait for the oldest download, so entries in memory are bounded by the window
+                    while len(pending_futures) >= self.stream_window:
+                        pending_futures.popleft().result()
+
+                is_completed = True
+
+            except Exception as e:
+                logger.error('Could not retrieve the rest of playlist. {}:{}'.format(type(e), str(e)))
+
+            finally:
+                if staged_entries:
+                    self.state_store.append_stream(self.playlist_key, staged_entries)
+                for future in pending_futures:
+                    future.result()
+                self.__retry_failed(scheduler, lambda entry, queue_index, queue_total: self.__retry_streamed_entry(entry, queue_index, downloaded_entries))
+                self.__wait_transcoded()
+
+        finally:
+            self.__close_scheduler(scheduler)
+
+        if is_completed and self.is_playlist_sliced:
+            # Entries out of range retrieved are kept as they are
+            self.state_store.finish_stream(self.playlist_key, header, self.playlist_offset, position)
+        elif is_completed:
+            self.state_store.finish_stream(self.playlist_key, header)
+            self.playlist_entry_total = position
+        else:
+            self.state_store.discard_stream(self.playlist_key)
+
+        self.downloaded_playlist_data = dict(header, entries=[downloaded_entries[index] for index in sorted(downloaded_entries or {})])
+
+        if queue_index == 0:
+            logger.warning('All songs on the playlist are already downloaded. There is nothing to process.')
+            return False
+
+        logger.info('Done.')
+        return True
+
+    def __open_scheduler(self):
+        """
+        :rtype DownloadScheduler
+        :return: Scheduler shared by playlists, or a scheduler used only by this playlist
+        """
+        if self.scheduler is not None:
+            scheduler = self.scheduler
+        else:
+            transcoder = Transcoder(workers=self.transcode_jobs, nice=self.transcode_nice, ionice=self.transcode_ionice)
+            scheduler = DownloadScheduler(self.jobs, transcoder)
+        self.running_scheduler = scheduler
+        self.transcoder = scheduler.transcoder
+        self.transcode_futures = []
+        return scheduler
+
+    def __close_scheduler(self, scheduler):
+        """
+        The function that stops workers of the scheduler if it is used only by this playlist
+
+        :param DownloadScheduler scheduler: Scheduler returned by __open_scheduler
+        """
+        if scheduler is not self.scheduler:
+            scheduler.shutdown()
+
+    def __download_streamed_entry(self, entry, queue_index, downloaded_entries):
+        """
+        The function that downloads an entry of the playlist being streamed. Called from worker threads.
+
+        :param dict entry: Entry of the playlist
+        :param int queue_index: Current queue index displayed in log message
+        :param dict downloaded_entries: Dictionary that maps position on the playlist and entry data resolved by youtube-dl, or None if not needed
+        """
+
+        downloaded_entry = self.__download_entry(entry, queue_index, 0)
+        if downloaded_entry is not None:
+            self.state_store.save_downloaded(self.playlist_key, {'entries': [downloaded_entry]})
+
+        with self.playlist_lock:
+            self.streaming_entries.pop(entry['id'], None)
+            # Failed songs are not tagged. They are added when they are downloaded by retry.
+            if downloaded_entries is not None and downloaded_entry is not None:
+                downloaded_entries[entry['playlist_index']] = self.__numbered_entry(entry, downloaded_entry)
+
+    def __retry_streamed_entry(self, entry, queue_index, downloaded_entries):
+        """
+        The function that downloads an entry of the playlist streamed again after it failed. Called from worker threads.
+
+        :param dict entry: Entry of the playlist
+        :param int queue_index: Current queue index displayed in log message
+        :param dict downloaded_entries: Dictionary that maps position on the playlist and entry data resolved by youtube-dl, or None if not needed
+        """
+        with self.playlist_lock:
+            self.streaming_entries[entry['id']] = entry
+        self.__download_streamed_entry(entry, queue_index, downloaded_entries)
+
+    def __download_entry(self, entry, queue_index, queue_total):
+        """
+        The function that downloads a single entry of the playlist. Called from worker threads.
+
+        :param dict entry: Entry of the playlist
+        :param int queue_index: Current queue index displayed in log message
+        :param int queue_total: Total number of queue displayed in log message
+
+        :rtype dict
+        :return: Entry data resolved by youtube-dl, or None if failed
+        """
+
+        # Song downloaded to another playlist, or transcoded by the previous run, is linked from track store
+        stored_info = self.track_store.load(entry['id'])
+        if stored_info is not None:
+            return self.__link_stored_entry(entry, stored_info, queue_index, queue_total)
+
+        # Song downloaded by the previous run is transcoded without downloading it again
+        if entry.get('status') == YDLQueueStatus.downloaded.value and self.transcoder is not None:
+            downloaded_info = self.__load_downloaded_entry(entry, queue_index, queue_total)
+            if downloaded_info is not None:
+                self.__transcode_hook(downloaded_info)
+                return downloaded_info
+
+        try:
+            # Workers wait while the site is throttling, so fewer songs are downloaded at once
+            queued_at = time.perf_counter()
+            with self.host_limiter.slot():
+                if self.tracer is not None:
+                    self.tracer.complete('wait', queued_at, song_id=entry['id'])
+
+                ydl_helper = YDLHelper(tracer=self.tracer)
+                ydl_opts = ydl_helper.get_download_option(
+                    download_dir=self.download_dir,
+                    hook=self.__download_hook,
+                    audio_codec=self.audio_codec,
+                    audio_bitrate=self.audio_bitrate,
+                    queue_index=queue_index,
+                    queue_total=queue_total,
+                    postprocess=self.transcoder is None,
+                    verbose=self.verbose
+                )
+                ydl = YDLRateLimited(params=ydl_opts, host_limiter=self.host_limiter)
+                self.__add_post_processors(ydl)
+                # Copy entry because youtube-dl modifies url of the entry
+                downloaded_info = ydl.process_ie_result(dict(entry), download=True)
+
+            # Errors are reported instead of raised, because ignoreerrors is set
+            if ydl.download_error is None and downloaded_info is not None:
+                self.__clear_failure(entry['id'])
+                return downloaded_info
+            error, message = ydl.download_error or (None, 'Could not download the song.')
+
+        except Exception as e:
+            logger.error('[Process:{}/{}][ID:{}] {}:{}'.format(
+                queue_index, queue_total,
+                entry.get('id', 'N/A'),
+                type(e), str(e),
+            ))
+            error, message = e, str(e)
+
+        self.__record_failure(entry, error, message, queue_index, queue_total)
+        return None
+
+    def __record_failure(self, entry, error, message, queue_index, queue_total):
+        """
+        The function that records a failure of a song, with the time it is eligible to download again
+
+        :param dict entry: Entry of the playlist
+        :param BaseException error: Exception raised by the failure, or None if unknown
+        :param str message: Error message reported by youtube-dl
+        :param int queue_index: Current queue index displayed in log message
+        :param int queue_total: Total number of queue displayed in log message
+        """
+        with self.playlist_lock:
+            failure = self.retry_policy.fail(self.failures.get(entry['id']), error, message)
+            self.failures[entry['id']] = failure
+            self.failed_entries.append((entry, queue_index, queue_total))
+        self.state_store.save_failure(entry['id'], failure)
+        self.metrics.add(self.playlist_key, entry['id'], retries=1)
+        self.__set_status(entry['id'], YDLQueueStatus.quarantined if failure['is_permanent'] else YDLQueueStatus.failed)
+
+        logger.warning('[Process:{}/{}][ID:{}] {}'.format(
+            queue_index, queue_total if queue_total > 0 else '?', entry['id'],
+            'Quarantined. {}: {}'.format(failure['error'], failure['message']) if failure['is_permanent'] else
+            'Failed {} times with {}. Retried after {:.1f} seconds.'.format(failure['attempts'], failure['error'], failure['retry_at'] - time.time()),
+        ))
+
+    def __clear_failure(self, song_id):
+        """
+        The function that deletes the failure of a song downloaded successfully
+
+        :param str song_id: Entry id
+        """
+        with self.playlist_lock:
+            failure = self.failures.pop(song_id, None)
+        if failure is not None:
+            self.state_store.clear_failure(song_id)
+
+    def __retry_failed(self, scheduler, function):
+        """
+        The function that downloads songs failed transiently by this run again, after the delay of each song.
+        Songs still failing after the retries of the policy, or whose next attempt is later than its retry wait, are left to the next run.
+
+        :param DownloadScheduler scheduler: Scheduler downloading songs
+        :param function function: Function called with (entry, queue_index, queue_total) to download a song
+        :rtype dict
+        :return: Dictionary that maps entry_id and the result of the function for songs downloaded by retries
+        """
+
+        retried_results = {}
+        for _ in range(self.retry_policy.retries):
+            with self.playlist_lock:
+                now = time.time()
+                retry_entries = [item for item in self.failed_entries if self.retry_policy.is_retried_soon(self.failures.get(item[0]['id']), now)]
+                self.failed_entries = []
+            if len(retry_entries) == 0:
+                return retried_results
+
+            # Songs failed at once are retried together after the latest of their delays
+            delay = max(self.failures[entry['id']]['retry_at'] for entry, queue_index, queue_total in retry_entries) - now
+            logger.info('Retrying {} failed songs in {:.1f} seconds...'.format(len(retry_entries), max(0.0, delay)))
+            if delay > 0:
+                time.sleep(delay)
+
+            futures = [(entry['id'], scheduler.submit(entry['id'], function, entry, queue_index, queue_total)) for entry, queue_index, queue_total in retry_entries]
+            for entry_id, future in futures:
+                result = future.result()
+                if result is not None:
+                    retried_results[entry_id] = result
+
+        with self.playlist_lock:
+            self.failed_entries = []
+        return retried_results
+
+    def __load_downloaded_entry(self, entry, queue_index, queue_total):
+        """
+        The function that loads a song downloaded by the previous run but not transcoded
+
+        :param dict entry: Entry of the playlist
+        :param int queue_index: Current queue index displayed in log message
+        :param int queue_total: Total number of queue displayed in log message
+
+        :rtype dict
+        :return: Entry data resolved by youtube-dl, or None if the downloaded file is missing or truncated
+        """
+
+        # Total is unknown while the playlist is streamed
+        queue_total = queue_total if queue_total > 0 else '?'
+
+        downloaded_info = self.state_store.load_info(self.playlist_key, entry['id'])
+        if downloaded_info is None or not self.__is_download_complete(downloaded_info):
+            return None
+
+        logger.info('[Process:{}/{}][ID:{}] Resumed from the audio downloaded previously.'.format(queue_index, queue_total, entry['id']))
+        self.metrics.set(self.playlist_key, entry['id'], source='resumed')
+        return downloaded_info
+
+    def __link_stored_entry(self, entry, stored_info, queue_index, queue_total):
+        """
+        The function that links a song found on track store into the download directory instead of downloading it
+
+        :param dict entry: Entry of the playlist
+        :param dict stored_info: Song information saved on track store
+        :param int queue_index: Current queue index displayed in log message
+        :param int queue_total: Total number of queue displayed in log message
+
+        :rtype dict
+        :return: Song information saved on track store, or None if failed
+        """
+
+        # Total is unknown while the playlist is streamed
+        queue_total = queue_total if queue_total > 0 else '?'
+
+        try:
+            extension = stored_info.get('ext') or get_extension(self.audio_codec, stored_info.get('acodec'))
+            self.track_store.link(entry['id'], os.path.join(self.download_dir, '{}.{}'.format(entry['id'], extension)))
+
+        except OSError as e:
+            logger.error('[Process:{}/{}][ID:{}] {}:{}'.format(queue_index, queue_total, entry['id'], type(e), str(e)))
+            return None
+
+        with self.playlist_lock:
+            self.linked_songs += 1
+        self.metrics.set(self.playlist_key, entry['id'], source='linked')
+        # Stored song is transcoded already, and finished after it is tagged in this folder
+        self.__set_status(entry['id'], YDLQueueStatus.transcoded)
+
+        song_title = entry.get('title', None)
+        song_title = '[title:{}]'.format(song_title) if song_title else ''
+        logger.info('[Process:{}/{}][ID:{}]{} {}'.format(queue_index, queue_total, entry['id'], song_title, 'Linked from track store.'))
+
+        if self.processed_hook is not None:
+            self.__processed_hook(stored_info)
+
+        return stored_info
+
+    def __add_post_processors(self, ydl):
+        """
+        The function that appends post processors to the end of the chain.
+        Songs copied or transcoded are counted, songs of a playlist are moved into track store, then processed songs are notified.
+        If songs are transcoded by Transcoder, both are done after the song is transcoded.
+
+        :param YoutubeDL ydl: YoutubeDL instance used to download songs
+        """
+        if self.is_playlist and self.transcoder is not None:
+            ydl.add_post_processor(YDLProcessedPostProcessor(self.__transcode_hook))
+            return
+        ydl.add_post_processor(YDLProcessedPostProcessor(self.__converted_hook))
+        if self.is_playlist:
+            ydl.add_post_processor(YDLProcessedPostProcessor(self.__stored_hook))
+        if self.processed_hook is not None:
+            ydl.add_post_processor(YDLProcessedPostProcessor(self.__processed_hook))
+
+    def __transcode_hook(self, data):
+        """
+        The function that get called when a song of the playlist is downloaded.
+        The song is handed off to Transcoder, so the download worker can download the next song.
+        Metadata and artwork are written by the same ffmpeg process if metadata editor is given.
+        Formats whose artwork can not be embedded by ffmpeg, and songs whose artwork the installed ffmpeg failed to embed,
+        are passed to processed hook, so artwork is added by mutagen.
+
+        :param dict data: Entry data resolved by youtube-dl
+        """
+        data = dict(data)
+        if not self.__is_download_complete(data):
+            # Truncated file is removed, otherwise youtube-dl regards it as downloaded next time
+            if os.path.isfile(data.get('filepath') or ''):
+                os.remove(data['filepath'])
+            self.__set_status(data['id'], YDLQueueStatus.failed)
+            raise PlaylistDownloadException('Downloaded file is truncated.', data.get('filepath'))
+
+        # Song is transcoded from the downloaded file if the run stops before it is transcoded
+        self.state_store.save_downloaded(self.playlist_key, {'entries': [data]})
+        self.__set_status(data['id'], YDLQueueStatus.downloaded)
+
+        handler = get_handler(self.audio_codec, data.get('acodec'))
+        metadata = self.transcoder.source_metadata(data)
+        target_file = None
+        artwork = None
+        track_number = None
+        if self.metadata_editor is not None:
+            track_number = self.__track_number(data)
+            metadata.update(self.metadata_editor.get_metadata(self.playlist_data, track_number))
+            target_file = self.metadata_editor.get_audio_file(self.download_dir, data)
+            if handler.ffmpeg_artwork:
+                artwork = self.metadata_editor.get_artwork(data)
+        is_tagged = track_number is not None and (handler.ffmpeg_artwork or self.metadata_editor.no_artwork)
+
+        future = self.transcoder.submit(
+            source_file=data['filepath'],
+            audio_codec=self.audio_codec,
+            audio_bitrate=self.audio_bitrate,
+            source_codec=data.get('acodec'),
+            callback=lambda target_file, elapsed, is_artwork_dropped: self.__transcoded_hook(
+                data, target_file, track_number if is_tagged and not is_artwork_dropped else None, elapsed),
+            target_file=target_file,
+            metadata=metadata,
+            artwork=artwork,
+            source_bitrate=data.get('abr'),
+        )
+        with self.playlist_lock:
+            self.transcode_futures.append((data['id'], future))
+        # The same song requested by other playlists waits until it is added to track store
+        self.running_scheduler.extend(data['id'], future)
+
+    def __transcoded_hook(self, data, target_file, track_number=None, elapsed=None):
+        """
+        The function that get called by Transcoder when a song of the playlist is transcoded.
+
+        :param dict data: Entry data resolved by youtube-dl
+        :param str target_file: Path to the transcoded file
+        :param int track_number: Track number written while the song is transcoded, or None if the song is tagged by processed hook
+        :param float elapsed: Seconds taken by ffmpeg
+        """
+        if elapsed is not None:
+            self.metrics.add(self.playlist_key, data['id'], transcode_seconds=elapsed)
+            if self.tracer is not None:
+                self.tracer.complete('transcode', time.perf_counter() - elapsed, song_id=data['id'], target=os.path.basename(target_file))
+        if not self.__is_transcode_complete(data, target_file):
+            os.remove(target_file)
+            raise PlaylistDownloadException('Transcoded file is shorter than the song.', target_file)
+
+        data['filepath'] = target_file
+        data['ext'] = os.path.splitext(target_file)[1][1:]
+        self.__converted_hook(data)
+        self.__stored_hook(data)
+        self.__set_status(data['id'], YDLQueueStatus.transcoded)
+        if track_number is not None:
+            self.set_tagged(data)
+            self.__tagged_hook(data, track_number)
+        elif self.processed_hook is not None:
+            self.__processed_hook(data)
+
+    def set_tagged(self, data):
+        """
+        The function that marks a song of the playlist as finished after it is tagged
+
+        :param dict data: Entry data resolved by youtube-dl
+        """
+        if self.is_playlist and data is not None and 'id' in data:
+            self.__set_status(data['id'], YDLQueueStatus.finished)
+
+    def __set_status(self, song_id, status):
+        """
+        The function that updates status of an entry in memory and on state store.
+        Workers may update entries at once, so the entry is updated under the lock.
+
+        :param str song_id: Entry id
+        :param YDLQueueStatus status: New status of the entry
+        """
+        with self.playlist_lock:
+            entry_found = self.__find_entry(song_id)
+            if entry_found is not None:
+                entry_found['status'] = status.value
+        self.state_store.set_status(self.playlist_key, song_id, status.value)
+        self.metrics.set(self.playlist_key, song_id, status=status.value)
+
+    @staticmethod
+    def __is_download_complete(data):
+        """
+        :param dict data: Entry data resolved by youtube-dl, which contains path to the downloaded file
+        :rtype bool
+        :return: Flag that indicates the downloaded file exists and has the size reported by the site, if known
+        """
+        downloaded_file = data.get('filepath')
+        if downloaded_file is None or not os.path.isfile(downloaded_file):
+            return False
+        file_size = os.path.getsize(downloaded_file)
+        return file_size > 0 and (not data.get('filesize') or file_size >= data['filesize'])
+
+    @staticmethod
+    def __is_transcode_complete(data, target_file):
+        """
+        :param dict data: Entry data resolved by youtube-dl
+        :param str target_file: Path to the transcoded file
+        :rtype bool
+        :return: Flag that indicates the transcoded file is as long as the song, if both lengths are known
+        """
+        handler = find_handler(target_file)
+        length = handler.length(target_file) if handler is not None else None
+        duration = data.get('duration')
+        if not length or not duration:
+            return True
+        # Duration of the site is rounded to seconds
+        return length >= duration - max(2.0, duration * 0.01)
+
+    def __wait_transcoded(self):
+        """
+        The function that waits until all songs of the playlist are transcoded.
+        Songs failed to transcode are marked as failed, so they are downloaded again next time.
+        """
+        with self.playlist_lock:
+            transcode_futures = self.transcode_futures
+            self.transcode_futures = []
+
+        for entry_id, future in transcode_futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error('[ID:{}] Could not transcode the song. {}:{}'.format(entry_id, type(e), str(e)))
+                self.state_store.set_status(self.playlist_key, entry_id, YDLQueueStatus.failed.value)
+
+    def __converted_hook(self, data):
+        """
+        The function that get called when audio of a song is converted to the preferred codec by youtube-dl or Transcoder.
+
+        :param dict data: Entry data resolved by youtube-dl
+        """
+        # Songs post processed by youtube-dl are converted by the worker which downloaded them
+        postprocess_started_at = getattr(self.trace_local, 'downloaded_at', None)
+        if postprocess_started_at is not None:
+            self.trace_local.downloaded_at = None
+            self.tracer.complete('postprocess', postprocess_started_at, song_id=data.get('id'), target=os.path.basename(data.get('filepath') or ''))
+
+        is_copied = get_handler(self.audio_codec, data.get('acodec')).is_source_codec(data.get('acodec'))
+        with self.playlist_lock:
+            if is_copied:
+                self.copied_songs += 1
+            else:
+                self.transcoded_songs += 1
+
+    def __stored_hook(self, data):
+        """
+        The function that get called when a song of the playlist is downloaded and post processed.
+
+        :param dict data: Entry data resolved by youtube-dl
+        """
+        try:
+            self.track_store.add(data)
+        except Exception as e:
+            # Song is left in the download directory as it is
+            logger.warning('[ID:{}] Could not add the song to track store. {}:{}'.format(data.get('id', 'N/A'), type(e), str(e)))
+
+    def __processed_hook(self, data):
+        """
+        The function that get called when a song is downloaded and post processed.
+
+        :param dict data: Entry data resolved by youtube-dl
+        """
+
+        with self.playlist_lock:
+            self.processed_index += 1
+            process_index = self.processed_index
+
+        self.processed_hook(data, self.__track_number(data), process_index, self.processed_total)
+
+    def __tagged_hook(self, data, track_number):
+        """
+        The function that get called when a song is transcoded with its metadata in a single pass.
+
+        :param dict data: Entry data resolved by youtube-dl
+        :param int track_number: Track number written to the song
+        """
+
+        with self.playlist_lock:
+            self.processed_index += 1
+            process_index = self.processed_index
+
+        # Total is unknown while the playlist is streamed
+        process_total = self.processed_total if self.processed_total > 0 else '?'
+        track = '[Track:{}]'.format(track_number) if track_number > 0 else ''
+        logger.info('[Process:{}/{}]{}[File:{}] Updated.'.format(process_index, process_total, track, os.path.basename(data['filepath'])))
+
+    def __track_number(self, data):
+        """
+        :param dict data: Entry data resolved by youtube-dl
+        :rtype int
+        :return: Track number of the song on the playlist, or -1 if unknown
+        """
+        if self.is_playlist:
+            entry_found = self.__find_entry(data.get('id'))
+            if entry_found is not None:
+                return entry_found.get('track_number', -1)
+        return -1
+
+    @staticmethod
+    def __numbered_entry(entry, downloaded_entry):
+        """
+        :param dict entry: Entry of the playlist
+        :param dict downloaded_entry: Entry data resolved by youtube-dl, or None if failed
+        :rtype dict
+        :return: Entry data with the track number of the entry on the playlist, or None if failed
+        """
+        if downloaded_entry is not None:
+            downloaded_entry['track_number'] = entry['track_number']
+        return downloaded_entry
+
+    def __scheduled_entries(self):
+        """
+        The function that returns entries to be downloaded in order of the playlist
+
+        :rtype list
+        :return: Entries which are in range requested, not finished yet, and eligible if they failed previously
+        """
+        now = time.time()
+        return [entry for entry in self.playlist_data['entries']
+                if self.__is_queue_in_range(entry['playlist_index'] - 1) and entry.get('status', YDLQueueStatus.ready.value) != YDLQueueStatus.finished.value
+                and self.retry_policy.is_due(self.failures.get(entry['id']), now)]
+
     def __download_hook(self, data, queue_index=0, queue_total=0):
         """
         The function that get called on download progress, with a dictionary with the entries.
@@ -274,36 +1064,38 @@ class Playlist(object):
         """
 
         try:
+            downloaded_bytes = data.get('total_bytes') or data.get('downloaded_bytes') or 0
+            with self.playlist_lock:
+                self.downloaded_songs += 1
+                self.downloaded_bytes += downloaded_bytes
+
             # Filename
             song_filename = os.path.basename(data['filename'])
             elapsed = "{0:.2f}".format(data.get('elapsed', -1))
 
-            if queue_index > 0 and queue_total > 0:
+            # Songs of a playlist are named after their ids, and a single song is named after its title
+            self.metrics.add(self.playlist_key, os.path.splitext(song_filename)[0], bytes=downloaded_bytes, download_seconds=data.get('elapsed') or 0)
+            self.metrics.set(self.playlist_key, os.path.splitext(song_filename)[0], source='downloaded')
+            if self.tracer is not None:
+                finished_at = time.perf_counter()
+                self.tracer.complete('download', finished_at - (data.get('elapsed') or 0), finished_at, song_id=os.path.splitext(song_filename)[0], bytes=downloaded_bytes)
+                if not (self.is_playlist and self.transcoder is not None):
+                    self.trace_local.downloaded_at = finished_at
+
+            if queue_index > 0:
+                # Total is unknown while the playlist is streamed
+                queue_total = queue_total if queue_total > 0 else '?'
 
                 try:
-                    # Get index from id-index map
                     song_id, song_ext = os.path.splitext(song_filename)
-                    song_index = self.playlist_data_map.get(song_id, -1)
-                    entry_found = None
-                    if song_index >= 0:
-                        # YouTube user playlist or SoundCloud playlist
-                        entry_found = self.playlist_data['entries'][song_index]
-
-                    else:
-                        # YouTube auto-generated playlist
-                        for entry in self.playlist_data['entries']:
-                            if entry['id'] == song_id:
-                                entry_found = entry
-                                break
+                    entry_found = self.__find_entry(song_id)
 
                     if entry_found:
-                        # Finish queue
-                        entry_found['status'] = YDLQueueStatus.finished.value
-                        with open(self.playlist_file, 'w') as f:
-                            json.dump(self.playlist_data, f, indent=4, ensure_ascii=False)
+                        # Song is finished after it is transcoded and tagged
+                        self.__set_status(song_id, YDLQueueStatus.downloaded)
 
                         # Print song info
-                        song_title = self.playlist_data['entries'][song_index].get('title', None)
+                        song_title = entry_found.get('title', None)
                         song_title = '[title:{}]'.format(song_title) if song_title else ''
                         elapsed = '[Elapsed:{}]'.format(elapsed) if float(elapsed) >= 0 else ''
                         logger.info('[Process:{}/{}][ID:{}]{}[Size:{}]{} {}'.format(
@@ -314,13 +1106,11 @@ class Playlist(object):
 
                     else:
                         # Print warning
-                        song_title = self.playlist_data['entries'][song_index].get('title', None)
-                        song_title = '[title:{}]'.format(song_title) if song_title else ''
                         elapsed = '[Elapsed:{}]'.format(elapsed) if float(elapsed) >= 0 else ''
                         logger.warning(
                             '[Process:{}/{}][ID:{}]{}[Size:{}]{} {}'.format(
                                 queue_index, queue_total,
-                                song_id, song_title, data['_total_bytes_str'], elapsed,
+                                song_id, '', data['_total_bytes_str'], elapsed,
                                 'The downloaded song is different from the song on the playlist initially requested. This is caused by YouTube auto-generated playlist.'
                             ))
 
@@ -341,9 +1131,36 @@ class Playlist(object):
         except Exception as e:
             logger.error('[Process:{}/{}] {}:{}'.format(queue_index, queue_total, type(e), str(e)))
 
+    def __find_entry(self, song_id):
+        """
+        The function that finds an entry of the playlist by id
+
+        :param str song_id: Entry id
+        :rtype dict
+        :return: Entry, or None if not found
+        """
+
+        # Playlist being streamed keeps only entries in progress
+        entry_found = self.streaming_entries.get(song_id)
+        if entry_found is not None or not isinstance(self.playlist_data.get('entries'), list):
+            return entry_found
+
+        # YouTube user playlist or SoundCloud playlist
+        song_index = self.playlist_data_map.get(song_id, -1)
+        if song_index >= 0:
+            return self.playlist_data['entries'][song_index]
+
+        # YouTube auto-generated playlist
+        for entry in self.playlist_data['entries']:
+            if entry['id'] == song_id:
+                return entry
+
+        return None
+
     def __merge_playlist(self, pl_data):
         """
-        The function that merges remote (head_playlist) and local playlist (base_playlist) and generate scheduled queue indices
+        The function that merges remote (head_playlist) and local playlist (base_playlist) and generate scheduled queue indices.
+        Status of the local playlist is looked up by entry id, so merging takes linear time.
 
         :param dict pl_data: Playlist data contains downloaded songs
 
@@ -352,173 +1169,156 @@ class Playlist(object):
         """
 
         head_playlist_data = pl_data  # Playlist data downloaded from url
-        base_playlist_data = None  # Playlist data previously saved on download directory
+        head_entries = head_playlist_data['entries']
 
-        """ Load playlist previously saved """
+        """ Load statuses of playlist previously saved """
 
-        if os.path.exists(self.playlist_file):
-            with open(self.playlist_file) as f:
-                # base_playlist_data = json.load(f, object_pairs_hook=OrderedDict)
-                base_playlist_data = json.load(f)
+        if self.is_playlist_sliced:
+            # Only the range requested is retrieved, so statuses are looked up entry by entry
+            has_base = self.state_store.has_playlist(self.playlist_key)
+            base_queue_status = None
+        else:
+            # Dictionary that maps entry_id and statuses of base entries
+            base_queue_status = self.state_store.load_queue_status(self.playlist_key)
+            has_base = base_queue_status is not None
 
         """ Merge Playlist """
 
         candidate_queue_indices = []
-        candidate_queue_index = 1
+        merged_entries = []
+        self.playlist_data_map = {}
 
-        # Playlist
-        if base_playlist_data:
-            # Copy list to avoid index shifting when elements are removed while iterating.
-            # https://stackoverflow.com/questions/1207406/how-to-remove-items-from-a-list-while-iterating
-            head_index = 0
-            head_entries = head_playlist_data['entries'][:]
-            for head_entry in head_entries:
-                # Delete entry if invalid.
-                if head_entry is None or head_entry.get('title', 'N/A').lower() in ['[private video]', '[deleted video]']:
-                    song_title = head_entry.get('title', None)
-                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-                    logger.error('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                        head_index + 1, len(head_playlist_data['entries']),
-                        head_entry.get('id', 'N/A'), song_title,
-                        'The video is private or deleted. Removed from the playlist.'
-                    ))
-                    del head_playlist_data['entries'][head_index]
-                    candidate_queue_index += 1
+        # Total is unknown if only the range requested is retrieved
+        head_total = 0 if self.is_playlist_sliced else len(head_entries)
 
-                else:
-                    # Copy list to avoid index shifting when elements are removed while iterating.
-                    # https://stackoverflow.com/questions/1207406/how-to-remove-items-from-a-list-while-iterating
-                    base_index = 0
-                    base_entries = base_playlist_data['entries'][:]
-                    for base_entry in base_entries:
-
-                        # Delete entry if invalid.
-                        if base_entry is None or base_entry.get('title', 'N/A').lower() in ['[private video]', '[deleted video]']:
-                            song_title = base_entry.get('title', None)
-                            song_title = '[title:{}]'.format(song_title) if song_title else ''
-                            logger.error('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                                head_index + 1, len(head_playlist_data['entries']),
-                                base_entry.get('id', 'N/A'), song_title,
-                                'The video is private or deleted. Removed from the playlist.',
-                            ))
-                            del base_playlist_data['entries'][base_index]
-
-                        else:
-                            # If same entry is found, update status
-                            if head_entry['id'] == base_entry['id']:
-
-                                # Merge base status into head status
-                                base_entry_status = base_entry.get('status', YDLQueueStatus.ready.value)
-                                head_playlist_data['entries'][head_index]['status'] = base_entry_status
-
-                                # Queue index is out of range requested
-                                if not self.__is_queue_in_range(head_index):
-                                    song_title = base_entry.get('title', None)
-                                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-                                    logger.debug('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                                        head_index + 1, len(head_playlist_data['entries']),
-                                        base_entry.get('id', 'N/A'), song_title,
-                                        'This queue is out of range requested. Skipped.',
-                                    ))
-
-                                # Song is already downloaded
-                                elif base_entry_status == YDLQueueStatus.finished.value:
-                                    song_title = base_entry.get('title', None)
-                                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-                                    logger.warning('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                                        head_index + 1, len(head_playlist_data['entries']),
-                                        base_entry.get('id', 'N/A'), song_title,
-                                        'This queue is already finished. Skipped.',
-                                    ))
-
-                                # Song is not downloaded yet
-                                else:
-                                    song_title = base_entry.get('title', None)
-                                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-                                    logger.info('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                                        head_index + 1, len(head_playlist_data['entries']),
-                                        base_entry.get('id', 'N/A'), song_title,
-                                        'This queue is not finished yet. Added to scheduled queues.',
-                                    ))
-
-                                # Delete entry to make iteration faster
-                                del base_playlist_data['entries'][base_index]
-                                break
-
-                            base_index += 1
-
-                    # Update track number
-                    head_entry['track_number'] = head_index + 1
-
-                    # Add queue
-                    is_not_finished = head_entry.get('status', YDLQueueStatus.ready.value) != YDLQueueStatus.finished.value
-                    if self.__is_queue_in_range(head_index) and is_not_finished:
-                        candidate_queue_indices.append(candidate_queue_index)
-
-                    # Add element to dictionary that maps index and entry_id
-                    self.playlist_data_map[head_entry['id']] = head_index
-
-                    candidate_queue_index += 1
-                    head_index += 1
+        # Queue index is the position on the remote playlist, including invalid entries
+        for candidate_queue_index, head_entry in enumerate(head_entries, self.playlist_offset + 1):
+            position = candidate_queue_index - 1
 
-        # Single song
-        else:
-            # Copy list to avoid index shifting when elements are removed while iterating.
-            # https://stackoverflow.com/questions/1207406/how-to-remove-items-from-a-list-while-iterating
-            head_index = 0
-            head_entries = head_playlist_data['entries'][:]
-            for head_entry in head_entries:
-                # Delete entry if invalid.
-                if head_entry is None or head_entry.get('title', 'N/A').lower() in ['[private video]', '[deleted video]']:
-                    song_title = head_entry.get('title', None)
-                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-                    logger.error('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                        head_index + 1, len(head_playlist_data['entries']),
-                        head_entry.get('id', 'N/A'), song_title,
-                        'The video is private or deleted. Removed from the playlist.'
-                    ))
-                    del head_playlist_data['entries'][head_index]
-                    candidate_queue_index += 1
+            # Remove entry if invalid.
+            if not self.__is_valid_entry(head_entry):
+                self.__log_entry(logger.error, position, head_total, head_entry, 'The video is private or deleted. Removed from the playlist.')
+                continue
 
-                else:
-                    song_title = head_entry.get('title', None)
-                    song_title = '[title:{}]'.format(song_title) if song_title else ''
-
-                    # Add queue
-                    if self.__is_queue_in_range(head_index):
-                        candidate_queue_indices.append(candidate_queue_index)
-                        logger.info('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                            head_index + 1, len(head_playlist_data['entries']),
-                            head_entry.get('id', 'N/A'), song_title,
-                            'This queue is not finished yet. Added to scheduled queues.'
-                        ))
-                    else:
-                        logger.debug('[Playlist:{}/{}][ID:{}]{} {}'.format(
-                            head_index + 1, len(head_playlist_data['entries']),
-                            head_entry.get('id', 'N/A'), song_title,
-                            'This queue is out of range requested. Skipped.'
-                        ))
+            # If same entry is found, merge base status into head status
+            base_entry_status = None
+            base_track_number = None
+            if base_queue_status is not None:
+                base_statuses = base_queue_status.get(head_entry['id'])
+                if base_statuses:
+                    base_entry_status = base_statuses.popleft()
+            elif has_base:
+                base_entry_status, base_track_number = self.state_store.get_entry(self.playlist_key, head_entry['id'])
+
+            # Private or deleted entries are not counted by track numbers. Entries before the range retrieved are unknown,
+            # so a range keeps track numbers saved by the whole playlist enumerated previously, and numbers new entries by position.
+            track_number = (base_track_number or position + 1) if self.is_playlist_sliced else len(merged_entries) + 1
 
-                    # Update value
-                    head_entry['status'] = YDLQueueStatus.ready.value
+            # Add queue
+            if self.__merge_entry(position, track_number, head_total, head_entry, has_base, base_entry_status):
+                candidate_queue_indices.append(candidate_queue_index)
 
-                    # Update track number
-                    head_entry['track_number'] = head_index + 1
+            # Add element to dictionary that maps index and entry_id
+            self.playlist_data_map[head_entry['id']] = len(merged_entries)
 
-                    # Add element to dictionary that maps index and entry_id
-                    self.playlist_data_map[head_entry['id']] = head_index
+            merged_entries.append(head_entry)
 
-                    candidate_queue_index += 1
-                    head_index += 1
+        head_playlist_data['entries'] = merged_entries
 
-        # Save playlist
-        with open(self.playlist_file, 'w') as file:
-            json.dump(head_playlist_data, file, indent=4, ensure_ascii=False)
+        # Save playlist. Entries out of range retrieved are kept as they are.
+        if self.is_playlist_sliced:
+            self.state_store.save_playlist(self.playlist_key, head_playlist_data, self.playlist_offset, self.playlist_offset + len(head_entries))
+        else:
+            self.state_store.save_playlist(self.playlist_key, head_playlist_data)
 
         self.playlist_data = head_playlist_data
 
         return head_playlist_data, candidate_queue_indices
 
+    def __merge_entry(self, position, track_number, head_total, head_entry, has_base, base_entry_status):
+        """
+        The function that merges status of the local playlist into an entry of the remote playlist
+
+        :param int position: Index of the entry on the remote playlist, counting private or deleted entries
+        :param int track_number: Track number of the entry
+        :param int head_total: Total number of entries displayed in log message. Zero if unknown.
+        :param dict head_entry: Entry of the remote playlist
+        :param bool has_base: Flag that indicates the playlist was saved previously
+        :param str base_entry_status: Status of the same entry on the local playlist, or None if not found
+
+        :rtype bool
+        :return: Flag that indicates the entry is scheduled to download
+        """
+
+        # Failure is shared by all playlists, so a song quarantined on another playlist is skipped as well
+        failure = self.failures.get(head_entry['id'])
+
+        # Playlist
+        if has_base:
+            if base_entry_status is not None:
+                head_entry['status'] = base_entry_status
+
+                # Queue index is out of range requested
+                if not self.__is_queue_in_range(position):
+                    self.__log_entry(logger.debug, position, head_total, head_entry, 'This queue is out of range requested. Skipped.')
+
+                # Song is already downloaded
+                elif base_entry_status == YDLQueueStatus.finished.value:
+                    self.__log_entry(logger.warning, position, head_total, head_entry, 'This queue is already finished. Skipped.')
+
+                # Song failed previously and is not eligible yet
+                elif not self.retry_policy.is_due(failure):
+                    self.__log_entry(logger.warning, position, head_total, head_entry, self.__failure_message(failure))
+
+                # Song stopped by the previous run after it is downloaded or transcoded
+                elif base_entry_status in [YDLQueueStatus.downloaded.value, YDLQueueStatus.transcoded.value]:
+                    self.__log_entry(logger.info, position, head_total, head_entry, 'This queue is {} but not finished yet. Resumed from the next stage.'.format(base_entry_status))
+
+                # Song is not downloaded yet
+                else:
+                    self.__log_entry(logger.info, position, head_total, head_entry, 'This queue is not finished yet. Added to scheduled queues.')
+
+        # Single song
+        else:
+            if self.__is_queue_in_range(position) and not self.retry_policy.is_due(failure):
+                self.__log_entry(logger.warning, position, head_total, head_entry, self.__failure_message(failure))
+            elif self.__is_queue_in_range(position):
+                self.__log_entry(logger.info, position, head_total, head_entry, 'This queue is not finished yet. Added to scheduled queues.')
+            else:
+                self.__log_entry(logger.debug, position, head_total, head_entry, 'This queue is out of range requested. Skipped.')
+
+            # Update value
+            head_entry['status'] = YDLQueueStatus.ready.value
+
+        # Update track number, and position on the remote playlist which the range requested is compared with
+        head_entry['track_number'] = track_number
+        head_entry['playlist_index'] = position + 1
+
+        is_not_finished = head_entry.get('status', YDLQueueStatus.ready.value) != YDLQueueStatus.finished.value
+        return self.__is_queue_in_range(position) and is_not_finished and self.retry_policy.is_due(failure)
+
+    @staticmethod
+    def __failure_message(failure):
+        if failure['is_permanent']:
+            return 'This queue is quarantined. {}: {}. Skipped. Use --retry-failed to download it again.'.format(failure['error'], failure['message'].rstrip('.'))
+        return 'This queue failed {} times with {}. Retried after {}. Skipped.'.format(
+            failure['attempts'], failure['error'], time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(failure['retry_at'])))
+
+    @staticmethod
+    def __is_valid_entry(entry):
+        return entry is not None and entry.get('title', 'N/A').lower() not in ['[private video]', '[deleted video]']
+
+    @staticmethod
+    def __log_entry(log, index, total, entry, message):
+        entry = entry or {}
+        song_title = entry.get('title', None)
+        song_title = '[title:{}]'.format(song_title) if song_title else ''
+        log('[Playlist:{}/{}][ID:{}]{} {}'.format(
+            index + 1, total if total > 0 else '?',
+            entry.get('id', 'N/A'), song_title,
+            message,
+        ))
+
     def __is_queue_in_range(self, index):
         is_greater_than_start = self.playlist_end <= 0 and self.playlist_start <= index + 1
         is_between_start_and_end = self.playlist_start <= index + 1 <= self.playlist_end
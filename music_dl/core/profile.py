@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Prefix of the files written into the download directory
+PROFILE_PREFIX = 'music_dl.profile'
+
+# cProfile of Python 3.12 and later is built on sys.monitoring, which allows only one profiler active at once
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+
+class PhaseProfiler(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, top=30, frames=1):
+        """
+        Initializer
+
+        Each phase is profiled by cProfile and traced by tracemalloc while it runs.
+        Threads started during a phase, such as download workers and ffmpeg watchers, are profiled as well,
+        and their statistics are merged into the phase.
+        Python 3.12 and later allow only one active profiler, so there only the profiler of the thread running the phase is enabled.
+
+        :param int top: Number of lines with the largest allocations written to the report of each phase
+        :param int frames: Number of frames stored for each allocation by tracemalloc
+        """
+
+        self.top = top
+        self.frames = frames
+        self.stats = OrderedDict()  # OrderedDict that maps phase name and pstats.Stats
+        self.allocations = OrderedDict()  # OrderedDict that maps phase name and (peak bytes, statistics of allocations)
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+
+    """"""""""""""" Profile """""""""""""""
+
+    @contextmanager
+    def phase(self, name):
+        """
+        The function that profiles CPU time and memory allocations of the block
+
+        :param str name: Phase name, such as preprocess, download, metadata and cleanup
+        """
+        is_tracing = tracemalloc.is_tracing()
+        if not is_tracing:
+            tracemalloc.start(self.frames)
+        # Peak is measured from the start of tracing on Python older than 3.9
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        started_snapshot = tracemalloc.take_snapshot()
+
+        self.thread_profiles = []
+        if PER_THREAD_PROFILERS:
+            threading.setprofile(self.__profile_thread)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            if PER_THREAD_PROFILERS:
+                threading.setprofile(None)
+
+            peak = tracemalloc.get_traced_memory()[1]
+            statistics = tracemalloc.take_snapshot().compare_to(started_snapshot, 'lineno')
+            if not is_tracing:
+                tracemalloc.stop()
+
+            stats = pstats.Stats(profile)
+            with self.lock:
+                thread_profiles = self.thread_profiles
+                self.thread_profiles = []
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            if name in self.stats:
+                stats.add(self.stats[name])
+            self.stats[name] = stats
+            self.allocations[name] = (peak, statistics)
+
+    def __profile_thread(self, frame, event, arg):
+        """
+        The function called by the first event of threads started during a phase, which replaces itself with a profiler of the thread
+        """
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append(profile)
+        profile.enable()
+
+    """"""""""""""" Export """""""""""""""
+
+    def write(self, profile_dir):
+        """
+        The function that writes statistics of each phase as .pstats files, and allocations of all phases as a text report
+
+        :param str profile_dir: Directory where reports are written
+        :rtype list
+        :return: Paths of files written
+        """
+        os.makedirs(profile_dir, exist_ok=True)
+        paths = []
+
+        for name, stats in self.stats.items():
+            path = os.path.join(profile_dir, '{}.{}.pstats'.format(PROFILE_PREFIX, name))
+            stats.dump_stats(path)
+            paths.append(path)
+
+        path = os.path.join(profile_dir, '{}.alloc.txt'.format(PROFILE_PREFIX))
+        with open(path, 'w', encoding='utf-8') as f:
+            for name, (peak, statistics) in self.allocations.items():
+                f.write('[Phase:{}] Peak {:.1f} KiB, {:+.1f} KiB retained\n'.format(name, peak / 1024, sum(stat.size_diff for stat in statistics) / 1024))
+                for stat in statistics[:self.top]:
+                    f.write('  {}\n'.format(stat))
+                f.write('\n')
+        paths.append(path)
+
+        return paths
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+import time
+from contextlib import contextmanager
+
+from tldextract import tldextract
+
+from music_dl.lib.log import logger
+
+# HTTP status codes sent by sites which throttle requests
+THROTTLED_STATUS_CODES = (429, 403)
+
+
+class TokenBucket(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, rate=0, capacity=None):
+        """
+        Initializer
+
+        Tokens are added at the rate up to the capacity, and each request or byte takes a token.
+        Tokens taken beyond the bucket are owed, so a large chunk of bytes waits as long as it would take to refill them.
+
+        :param float rate: Tokens added per second. Zero or None means unlimited.
+        :param float capacity: Maximum number of tokens taken at once without waiting. Defaults to the tokens added in a second.
+        """
+
+        self.rate = rate or 0
+        self.capacity = capacity if capacity is not None else max(1.0, float(self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    """"""""""""""" Control """""""""""""""
+
+    def acquire(self, tokens=1):
+        """
+        The function that takes tokens. Blocks until the tokens are refilled, or until the bucket is resumed.
+
+        :param float tokens: Number of tokens taken
+        """
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                self.tokens -= tokens
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+
+        # Other threads take tokens while this thread sleeps, and they wait for the tokens owed by this thread
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        The function that stops handing out tokens for a while, such as when the site asks to retry after seconds
+
+        :param float seconds: Seconds while tokens are not handed out
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, max_limit=1, min_limit=1, decrease_factor=0.5, cooldown=5.0):
+        """
+        Initializer
+
+        Number of songs downloaded at once is controlled by additive increase and multiplicative decrease.
+        The limit is increased by one after as many successful downloads as the limit, and halved when the site throttles.
+        Throttled responses of downloads started before the decrease do not decrease the limit again until the cooldown passes.
+
+        :param int max_limit: Maximum number of songs downloaded at once. The limit starts at it.
+        :param int min_limit: Minimum number of songs downloaded at once
+        :param float decrease_factor: Factor multiplied to the limit when the site throttles
+        :param float cooldown: Seconds while the limit is not decreased again
+        """
+
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.decreased_at = None
+        self.condition = threading.Condition()
+
+    """"""""""""""" Control """""""""""""""
+
+    def acquire(self):
+        """
+        The function that takes a slot. Blocks while as many songs as the limit are downloaded.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        """
+        The function that returns a slot taken by acquire
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def increase(self):
+        """
+        The function that increases the limit additively after a successful download
+
+        :rtype bool
+        :return: Flag that indicates the integral limit is changed
+        """
+        with self.condition:
+            limit = int(self.limit)
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+            return int(self.limit) != limit
+
+    def decrease(self):
+        """
+        The function that decreases the limit multiplicatively when the site throttles
+
+        :rtype bool
+        :return: Flag that indicates the limit is decreased. False while cooling down.
+        """
+        with self.condition:
+            now = time.monotonic()
+            if self.decreased_at is not None and now - self.decreased_at < self.cooldown:
+                return False
+            self.decreased_at = now
+            self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+            return True
+
+
+class HostLimiter(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, host, request_rate=0, byte_rate=0, max_concurrency=1, slow_ratio=0.25, min_sample_bytes=1024 * 1024, cooldown=5.0):
+        """
+        Initializer
+
+        :param str host: Host name displayed in log message
+        :param float request_rate: Maximum number of requests per second. Zero means unlimited.
+        :param float byte_rate: Maximum number of bytes downloaded per second. Zero means unlimited.
+        :param int max_concurrency: Maximum number of songs downloaded at once
+        :param float slow_ratio: Throughput below this ratio of the average throughput is regarded as throttled
+        :param int min_sample_bytes: Downloads smaller than this are too short to measure throughput
+        :param float cooldown: Seconds while concurrency is not decreased again
+        """
+
+        self.host = host
+        self.requests = TokenBucket(request_rate)
+        # Bytes of a second may arrive in a burst, so the bucket holds them without waiting
+        self.bytes = TokenBucket(byte_rate)
+        self.concurrency = AdaptiveConcurrency(max_limit=max_concurrency, cooldown=cooldown)
+        self.slow_ratio = slow_ratio
+        self.min_sample_bytes = min_sample_bytes
+        self.throughput = None  # Moving average of bytes per second of downloads
+        self.lock = threading.Lock()
+
+    """"""""""""""" Control """""""""""""""
+
+    @contextmanager
+    def slot(self):
+        """
+        The function that holds a slot of concurrency while a song is downloaded
+        """
+        self.concurrency.acquire()
+        try:
+            yield self
+        finally:
+            self.concurrency.release()
+
+    def request(self):
+        """
+        The function that waits until a request can be sent to the host
+        """
+        self.requests.acquire()
+
+    def consume(self, byte_count):
+        """
+        The function that waits until bytes received from the host fit in the byte rate
+
+        :param int byte_count: Number of bytes received since the last call
+        """
+        if byte_count > 0:
+            self.bytes.acquire(byte_count)
+
+    def throttled(self, status=None, retry_after=None):
+        """
+        The function that reports the host refused a request because of too many requests
+
+        :param int status: HTTP status code of the response
+        :param float retry_after: Seconds the host asked to wait before the next request, if any
+        """
+        if retry_after is not None and retry_after > 0:
+            self.requests.pause(min(retry_after, 60.0))
+        if self.concurrency.decrease():
+            logger.warning('[Host:{}] Throttled{}. Concurrency is reduced to {}.'.format(
+                self.host, ' with HTTP {}'.format(status) if status is not None else '', int(self.concurrency.limit)))
+
+    def downloaded(self, byte_count, elapsed):
+        """
+        The function that reports a song is downloaded, and adjusts concurrency with its throughput
+
+        :param int byte_count: Number of bytes downloaded
+        :param float elapsed: Seconds taken to download
+        """
+        if byte_count < self.min_sample_bytes or not elapsed or elapsed <= 0:
+            return
+
+        throughput = byte_count / elapsed
+        with self.lock:
+            is_slow = self.throughput is not None and throughput < self.throughput * self.slow_ratio
+            self.throughput = throughput if self.throughput is None else self.throughput * 0.8 + throughput * 0.2
+
+        if is_slow:
+            logger.debug('[Host:{}] Throughput dropped to {:.1f}KiB/s.'.format(self.host, throughput / 1024))
+            self.throttled()
+        elif self.concurrency.increase():
+            logger.debug('[Host:{}] Concurrency is increased to {}.'.format(self.host, int(self.concurrency.limit)))
+
+
+class RateLimiter(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, request_rate=0, byte_rate=0, max_concurrency=1, **options):
+        """
+        Initializer
+
+        Requests and bytes are limited for each site, so playlists of a site downloaded at once share its limits.
+        Sites are classified by domain the same way MusicDL validates URLs, such as youtube and soundcloud.
+
+        :param float request_rate: Maximum number of requests per second sent to each site. Zero means unlimited.
+        :param float byte_rate: Maximum number of bytes per second downloaded from each site. Zero means unlimited.
+        :param int max_concurrency: Maximum number of songs downloaded at once from each site
+        :param options: Other options passed to HostLimiter
+        """
+
+        self.request_rate = request_rate
+        self.byte_rate = byte_rate
+        self.max_concurrency = max_concurrency
+        self.options = options
+        self.hosts = {}  # Dictionary that maps host and its limiter
+        self.lock = threading.Lock()
+
+    """"""""""""""" Host """""""""""""""
+
+    def get(self, url):
+        """
+        The function that returns the limiter of the site the URL belongs to
+
+        :param str url: URL of the site
+        :rtype HostLimiter
+        :return: Limiter of the site
+        """
+        host = self.host_key(url)
+        with self.lock:
+            host_limiter = self.hosts.get(host)
+            if host_limiter is None:
+                host_limiter = HostLimiter(host, self.request_rate, self.byte_rate, self.max_concurrency, **self.options)
+                self.hosts[host] = host_limiter
+            return host_limiter
+
+    @staticmethod
+    def host_key(url):
+        """
+        :param str url: URL of the site
+        :rtype str
+        :return: Domain of the URL without subdomain and suffix, such as youtube
+        """
+        tld_parsed = tldextract.extract(url or '')
+        return tld_parsed.domain or url
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import random
+import time
+from urllib.error import HTTPError
+
+from youtube_dl.utils import GeoRestrictedError
+
+# Messages of songs which are never downloaded however many times they are retried
+PERMANENT_MESSAGES = (
+    'private video',
+    'video unavailable',
+    'this video is unavailable',
+    'this video has been removed',
+    'is no longer available',
+    'account associated with this video has been terminated',
+    'copyright',
+    'not available in your country',
+    'blocked it in your country',
+    'sign in to confirm your age',
+    'members-only',
+    'http error 404',
+    'http error 410',
+)
+
+# HTTP status codes of songs which are never downloaded
+PERMANENT_STATUS_CODES = (404, 410)
+
+
+class RetryPolicy(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, retries=3, base_delay=2.0, max_delay=6 * 3600.0, retry_wait=60.0, quarantine_ttl=30 * 24 * 3600.0):
+        """
+        Initializer
+
+        Songs failed transiently are retried after a delay doubled for each attempt, with jitter so songs failed at once are not retried at once.
+        Songs failed permanently, such as private, removed or geo-blocked videos, are quarantined,
+        so they are not extracted again until the quarantine expires.
+
+        :param int retries: Number of times songs failed transiently are retried by the same run
+        :param float base_delay: Seconds waited before the first retry
+        :param float max_delay: Maximum seconds waited before a retry
+        :param float retry_wait: Songs whose next attempt is within these seconds are retried by the same run. The rest are retried by the next run.
+        :param float quarantine_ttl: Seconds while songs failed permanently are not downloaded
+        """
+
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_wait = retry_wait
+        self.quarantine_ttl = quarantine_ttl
+
+    """"""""""""""" Failure """""""""""""""
+
+    def fail(self, failure, error, message=None):
+        """
+        The function that records another failure of a song
+
+        :param dict failure: Failure of the song recorded previously, or None
+        :param BaseException error: Exception raised by the failure, or None if unknown
+        :param str message: Error message reported by youtube-dl
+        :rtype dict
+        :return: Failure which contains error class, message, attempt count and next eligible time
+        """
+        attempts = (failure or {}).get('attempts', 0) + 1
+        is_permanent = self.is_permanent(error, message)
+        delay = self.quarantine_ttl if is_permanent else self.delay(attempts)
+        return {
+            'error': type(error).__name__ if error is not None else 'DownloadError',
+            'message': message or str(error),
+            'attempts': attempts,
+            'retry_at': time.time() + delay,
+            'is_permanent': is_permanent,
+        }
+
+    def delay(self, attempts):
+        """
+        :param int attempts: Number of attempts failed
+        :rtype float
+        :return: Seconds waited before the next attempt, between half and all of the exponential delay
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** min(attempts - 1, 32))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def is_due(self, failure, now=None):
+        """
+        :param dict failure: Failure of the song, or None
+        :param float now: Current time. Defaults to the time called.
+        :rtype bool
+        :return: Flag that indicates the song can be downloaded
+        """
+        return failure is None or failure['retry_at'] <= (now or time.time())
+
+    def is_retried_soon(self, failure, now=None):
+        """
+        :param dict failure: Failure of the song, or None
+        :param float now: Current time. Defaults to the time called.
+        :rtype bool
+        :return: Flag that indicates the song failed transiently and is retried by the same run
+        """
+        return failure is not None and not failure['is_permanent'] and failure['retry_at'] - (now or time.time()) <= self.retry_wait
+
+    @staticmethod
+    def is_permanent(error, message=None):
+        """
+        :param BaseException error: Exception raised by the failure, or None if unknown
+        :param str message: Error message reported by youtube-dl
+        :rtype bool
+        :return: Flag that indicates the song is never downloaded however many times it is retried
+        """
+        if isinstance(error, GeoRestrictedError):
+            return True
+        if isinstance(error, HTTPError):
+            return error.code in PERMANENT_STATUS_CODES
+        text = (message or str(error or '')).lower()
+        return any(permanent_message in text for permanent_message in PERMANENT_MESSAGES)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class DownloadScheduler(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, jobs=1, transcoder=None):
+        """
+        Initializer
+
+        Songs of all playlists are downloaded by one pool of workers.
+        A song which is being downloaded for a playlist is not downloaded again for another playlist at the same time.
+        It is scheduled after the running download, so it is linked from track store.
+
+        :param int jobs: Number of songs downloaded concurrently
+        :param Transcoder transcoder: Transcoder which converts downloaded audio separately from download workers, or None to convert by each worker
+        """
+
+        self.jobs = jobs
+        self.executor = ThreadPoolExecutor(max_workers=jobs)
+        self.transcoder = transcoder.start() if transcoder is not None else None
+        self.running_futures = {}  # Dictionary that maps source id and the future of the running download
+        self.lock = threading.Lock()
+
+    """"""""""""""" Control """""""""""""""
+
+    def submit(self, source_id, function, *args):
+        """
+        The function that schedules a download of a song
+
+        :param str source_id: Id of the song on the site
+        :param function function: Function that downloads the song
+        :param args: Arguments passed to the function
+        :rtype Future
+        :return: Future of the result of the function
+        """
+
+        with self.lock:
+            running_future = self.running_futures.get(source_id)
+            if running_future is None:
+                future = self.executor.submit(function, *args)
+                self.running_futures[source_id] = future
+                future.add_done_callback(lambda done_future: self.__release(source_id, done_future))
+                return future
+
+        # Waiting in a worker could block every worker, so the download is submitted when the running one is done
+        deferred_future = Future()
+        running_future.add_done_callback(lambda done_future: self.__submit_deferred(source_id, deferred_future, function, args))
+        return deferred_future
+
+    def extend(self, source_id, future):
+        """
+        The function that keeps a song regarded as being downloaded until the future is done,
+        such as while the downloaded song is transcoded and added to track store
+
+        :param str source_id: Id of the song on the site
+        :param Future future: Future of the rest of the work on the song
+        """
+        with self.lock:
+            self.running_futures[source_id] = future
+        future.add_done_callback(lambda done_future: self.__release(source_id, done_future))
+
+    def shutdown(self, wait=True):
+        """
+        The function that stops workers after all scheduled downloads and transcodes are done
+
+        :param bool wait: Wait until all scheduled downloads are done
+        """
+        self.executor.shutdown(wait=wait)
+        if self.transcoder is not None:
+            self.transcoder.join()
+
+    def __release(self, source_id, future):
+        with self.lock:
+            if self.running_futures.get(source_id) is future:
+                del self.running_futures[source_id]
+
+    def __submit_deferred(self, source_id, deferred_future, function, args):
+        # Work on the song may be extended after the download, and another deferred download may have started first
+        with self.lock:
+            running_future = self.running_futures.get(source_id)
+            if running_future is None or running_future.done():
+                if not deferred_future.set_running_or_notify_cancel():
+                    return
+                self.running_futures[source_id] = deferred_future
+                running_future = None
+        if running_future is not None:
+            running_future.add_done_callback(lambda done_future: self.__submit_deferred(source_id, deferred_future, function, args))
+            return
+        deferred_future.add_done_callback(lambda done_future: self.__release(source_id, done_future))
+
+        def run():
+            try:
+                deferred_future.set_result(function(*args))
+            except BaseException as e:
+                deferred_future.set_exception(e)
+
+        try:
+            self.executor.submit(run)
+        except RuntimeError as e:
+            # Scheduler is shut down
+            deferred_future.set_exception(e)
@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from music_dl.core.youtube_dl import YDLQueueStatus
+from music_dl.lib.log import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    playlist_key TEXT PRIMARY KEY,
+    playlist_id TEXT,
+    title TEXT,
+    extractor TEXT,
+    data TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS playlists_playlist_id ON playlists (playlist_id);
+CREATE TABLE IF NOT EXISTS entries (
+    playlist_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    entry_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    track_number INTEGER,
+    title TEXT,
+    data TEXT,
+    info TEXT,
+    updated_at REAL,
+    PRIMARY KEY (playlist_key, position)
+);
+CREATE INDEX IF NOT EXISTS entries_entry_id ON entries (entry_id);
+CREATE INDEX IF NOT EXISTS entries_playlist_key_entry_id ON entries (playlist_key, entry_id);
+CREATE TABLE IF NOT EXISTS failures (
+    entry_id TEXT PRIMARY KEY,
+    error TEXT,
+    message TEXT,
+    attempts INTEGER NOT NULL,
+    retry_at REAL NOT NULL,
+    is_permanent INTEGER NOT NULL,
+    updated_at REAL
+);
+"""
+
+# Suffix of the key under which entries of a playlist being streamed are staged
+STAGING_SUFFIX = '#staging'
+
+
+class StateStore(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, working_dir, filename='.music_dl.sqlite3'):
+        """
+        Initializer
+
+        Download state of all playlists in the working directory is kept in a single SQLite database.
+        Each thread uses its own connection, and the database runs in WAL mode so several writers can share it.
+
+        :param str working_dir: Path to root directory
+        :param str filename: Filename of the database
+        """
+
+        self.database_file = os.path.join(working_dir, filename)
+        self.__local = threading.local()
+
+        os.makedirs(working_dir, exist_ok=True)
+        self.__connection().executescript(SCHEMA)
+
+    def __connection(self):
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_file, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+        return connection
+
+    def close(self):
+        """
+        The function that closes the connection of the current thread
+        """
+        connection = getattr(self.__local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.__local.connection = None
+
+    """"""""""""""" Playlist """""""""""""""
+
+    def load_playlist(self, playlist_key):
+        """
+        The function that loads playlist data saved previously
+
+        :param str playlist_key: Key of the playlist, which is the name of the download directory
+        :rtype dict
+        :return: Playlist data, or None if the playlist is not saved
+        """
+
+        connection = self.__connection()
+        row = connection.execute('SELECT data FROM playlists WHERE playlist_key = ?', (playlist_key,)).fetchone()
+        if row is None:
+            return None
+
+        pl_data = json.loads(row[0])
+        pl_data['entries'] = []
+        for position, status, track_number, data in connection.execute(
+                'SELECT position, status, track_number, data FROM entries WHERE playlist_key = ? ORDER BY position', (playlist_key,)):
+            entry = json.loads(data)
+            entry['status'] = status
+            entry['track_number'] = track_number
+            entry['playlist_index'] = position + 1
+            pl_data['entries'].append(entry)
+        return pl_data
+
+    def load_queue_status(self, playlist_key):
+        """
+        The function that loads statuses of the playlist indexed by entry id
+
+        :param str playlist_key: Key of the playlist
+        :rtype dict
+        :return: Dictionary that maps entry_id and deque of statuses in order of the playlist, or None if the playlist is not saved
+        """
+
+        connection = self.__connection()
+        if not self.has_playlist(playlist_key):
+            return None
+
+        queue_status = {}
+        for entry_id, status in connection.execute(
+                'SELECT entry_id, status FROM entries WHERE playlist_key = ? ORDER BY position', (playlist_key,)):
+            # The same video may appear more than once on the playlist
+            queue_status.setdefault(entry_id, deque()).append(status)
+        return queue_status
+
+    def save_playlist(self, playlist_key, pl_data, start_position=None, end_position=None):
+        """
+        The function that replaces the saved playlist with the given playlist data.
+        Entries are saved at their position on the remote playlist, which counts private or deleted entries.
+
+        :param str playlist_key: Key of the playlist
+        :param dict pl_data: Playlist data
+        :param int start_position: Position of the first entry retrieved. If specified, only entries in the range retrieved are replaced.
+        :param int end_position: Position after the last entry retrieved
+        """
+
+        header = {key: value for key, value in pl_data.items() if key != 'entries'}
+        now = time.time()
+        rows = []
+        for index, entry in enumerate(pl_data.get('entries', [])):
+            if entry is None or 'id' not in entry:
+                continue
+            position = entry.get('playlist_index', entry.get('track_number', index + 1)) - 1
+            rows.append((
+                playlist_key, position, entry['id'],
+                entry.get('status', YDLQueueStatus.ready.value), entry.get('track_number'), entry.get('title'),
+                json.dumps(entry, ensure_ascii=False), now,
+            ))
+
+        with self.__connection() as connection:
+            # Entry data resolved by youtube-dl is kept, so songs not finished by the previous run are resumed from it
+            infos = dict(connection.execute('SELECT entry_id, info FROM entries WHERE playlist_key = ? AND info IS NOT NULL', (playlist_key,)).fetchall())
+            connection.execute(
+                'INSERT OR REPLACE INTO playlists (playlist_key, playlist_id, title, extractor, data, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (playlist_key, header.get('id'), header.get('title'), header.get('extractor'), json.dumps(header, ensure_ascii=False), now))
+            self.__delete_entries(connection, playlist_key, start_position, end_position)
+            connection.executemany(
+                'INSERT INTO entries (playlist_key, position, entry_id, status, track_number, title, data, info, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [row[:-1] + (infos.get(row[2]), row[-1]) for row in rows])
+
+    def get_status(self, playlist_key, entry_id):
+        """
+        The function that loads status of an entry
+
+        :param str playlist_key: Key of the playlist
+        :param str entry_id: Entry id
+        :rtype str
+        :return: Status of the first entry with the id, or None if not found
+        """
+        row = self.__connection().execute(
+            'SELECT status FROM entries WHERE playlist_key = ? AND entry_id = ? ORDER BY position LIMIT 1', (playlist_key, entry_id)).fetchone()
+        return row[0] if row else None
+
+    def get_entry(self, playlist_key, entry_id):
+        """
+        The function that loads status and track number of an entry
+
+        :param str playlist_key: Key of the playlist
+        :param str entry_id: Entry id
+        :rtype tuple
+        :return: (status, track number) of the first entry with the id, or (None, None) if not found
+        """
+        row = self.__connection().execute(
+            'SELECT status, track_number FROM entries WHERE playlist_key = ? AND entry_id = ? ORDER BY position LIMIT 1', (playlist_key, entry_id)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def has_playlist(self, playlist_key):
+        """
+        :param str playlist_key: Key of the playlist
+        :rtype bool
+        :return: Flag that indicates the playlist is saved
+        """
+        return self.__connection().execute('SELECT 1 FROM playlists WHERE playlist_key = ?', (playlist_key,)).fetchone() is not None
+
+    def clear(self, playlist_key):
+        """
+        The function that deletes the saved playlist
+
+        :param str playlist_key: Key of the playlist
+        """
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM entries WHERE playlist_key = ?', (playlist_key,))
+            connection.execute('DELETE FROM playlists WHERE playlist_key = ?', (playlist_key,))
+
+    """"""""""""""" Streaming """""""""""""""
+
+    def begin_stream(self, playlist_key):
+        """
+        The function that prepares to save entries of a playlist while it is enumerated.
+        Entries are staged under another key, so statuses saved previously can be looked up until the enumeration completes.
+
+        :param str playlist_key: Key of the playlist
+        """
+        with self.__connection() as connection:
+            connection.execute('DELETE FROM entries WHERE playlist_key = ?', (playlist_key + STAGING_SUFFIX,))
+
+    def append_stream(self, playlist_key, entries):
+        """
+        The function that stages entries of a playlist being enumerated
+
+        :param str playlist_key: Key of the playlist
+        :param list entries: List of (position, entry)
+        """
+        now = time.time()
+        rows = [(
+            playlist_key + STAGING_SUFFIX, position, entry['id'],
+            entry.get('status', YDLQueueStatus.ready.value), entry.get('track_number'), entry.get('title'),
+            json.dumps(entry, ensure_ascii=False), playlist_key, entry['id'], now,
+        ) for position, entry in entries]
+        with self.__connection() as connection:
+            # Entry data resolved by youtube-dl is carried over from the saved playlist
+            connection.executemany(
+                'INSERT OR REPLACE INTO entries (playlist_key, position, entry_id, status, track_number, title, data, info, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT info FROM entries WHERE playlist_key = ? AND entry_id = ? AND info IS NOT NULL LIMIT 1), ?)',
+                rows)
+
+    def finish_stream(self, playlist_key, header, start_position=None, end_position=None):
+        """
+        The function that replaces the saved playlist with the staged entries
+
+        :param str playlist_key: Key of the playlist
+        :param dict header: Playlist data without entries
+        :param int start_position: Position of the first entry retrieved. If specified, only entries in the range retrieved are replaced.
+        :param int end_position: Position after the last entry retrieved
+        """
+        with self.__connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO playlists (playlist_key, playlist_id, title, extractor, data, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (playlist_key, header.get('id'), header.get('title'), header.get('extractor'), json.dumps(header, ensure_ascii=False), time.time()))
+            self.__delete_entries(connection, playlist_key, start_position, end_position)
+            connection.execute('UPDATE entries SET playlist_key = ? WHERE playlist_key = ?', (playlist_key, playlist_key + STAGING_SUFFIX))
+
+    @staticmethod
+    def __delete_entries(connection, playlist_key, start_position=None, end_position=None):
+        if start_position is None:
+            connection.execute('DELETE FROM entries WHERE playlist_key = ?', (playlist_key,))
+        else:
+            connection.execute('DELETE FROM entries WHERE playlist_key = ? AND position >= ? AND position < ?', (playlist_key, start_position, end_position))
+
+    def discard_stream(self, playlist_key):
+        """
+        The function that deletes staged entries when the enumeration did not complete
+
+        :param str playlist_key: Key of the playlist
+        """
+        self.begin_stream(playlist_key)
+
+    """"""""""""""" Entry """""""""""""""
+
+    def set_status(self, playlist_key, entry_id, status):
+        """
+        The function that updates status of an entry
+
+        :param str playlist_key: Key of the playlist
+        :param str entry_id: Entry id
+        :param str status: New status of the entry
+        """
+        # Staged entry is updated as well, so the status survives whether or not the enumeration completes
+        with self.__connection() as connection:
+            connection.execute(
+                'UPDATE entries SET status = ?, updated_at = ? WHERE playlist_key IN (?, ?) AND entry_id = ?',
+                (status, time.time(), playlist_key, playlist_key + STAGING_SUFFIX, entry_id))
+
+    def save_downloaded(self, playlist_key, pl_data):
+        """
+        The function that saves entry data resolved by youtube-dl for downloaded entries of the playlist
+
+        :param str playlist_key: Key of the playlist
+        :param dict pl_data: Playlist data returned by youtube-dl
+        """
+        now = time.time()
+        rows = [(json.dumps(entry, ensure_ascii=False), now, playlist_key, playlist_key + STAGING_SUFFIX, entry['id'])
+                for entry in pl_data.get('entries', []) if entry is not None and 'id' in entry]
+        with self.__connection() as connection:
+            connection.executemany('UPDATE entries SET info = ?, updated_at = ? WHERE playlist_key IN (?, ?) AND entry_id = ?', rows)
+
+    def load_info(self, playlist_key, entry_id):
+        """
+        The function that loads entry data resolved by youtube-dl for an entry of the playlist
+
+        :param str playlist_key: Key of the playlist
+        :param str entry_id: Entry id
+        :rtype dict
+        :return: Entry data, or None if not saved
+        """
+        row = self.__connection().execute(
+            'SELECT info FROM entries WHERE playlist_key IN (?, ?) AND entry_id = ? AND info IS NOT NULL LIMIT 1',
+            (playlist_key, playlist_key + STAGING_SUFFIX, entry_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_downloaded(self, playlist_key):
+        """
+        The function that loads playlist data which contains entry data resolved by youtube-dl
+
+        :param str playlist_key: Key of the playlist
+        :rtype dict
+        :return: Playlist data, or None if the playlist is not saved
+        """
+
+        connection = self.__connection()
+        row = connection.execute('SELECT data FROM playlists WHERE playlist_key = ?', (playlist_key,)).fetchone()
+        if row is None:
+            return None
+
+        pl_data = json.loads(row[0])
+        pl_data['entries'] = []
+        for track_number, info in connection.execute(
+                'SELECT track_number, info FROM entries WHERE playlist_key = ? AND info IS NOT NULL ORDER BY position', (playlist_key,)):
+            entry = json.loads(info)
+            entry['track_number'] = track_number
+            pl_data['entries'].append(entry)
+        return pl_data
+
+    def find_entries(self, entry_id):
+        """
+        The function that finds an entry across all playlists
+
+        :param str entry_id: Entry id
+        :rtype list
+        :return: List of (playlist_key, position, status)
+        """
+        return self.__connection().execute(
+            'SELECT playlist_key, position, status FROM entries WHERE entry_id = ? ORDER BY playlist_key, position', (entry_id,)).fetchall()
+
+    """"""""""""""" Failure """""""""""""""
+
+    def load_failures(self):
+        """
+        The function that loads failures of songs. Failures are shared by all playlists, because a song fails the same way on any playlist.
+
+        :rtype dict
+        :return: Dictionary that maps entry_id and failure
+        """
+        return {entry_id: {'error': error, 'message': message, 'attempts': attempts, 'retry_at': retry_at, 'is_permanent': bool(is_permanent)}
+                for entry_id, error, message, attempts, retry_at, is_permanent in self.__connection().execute(
+                    'SELECT entry_id, error, message, attempts, retry_at, is_permanent FROM failures')}
+
+    def save_failure(self, entry_id, failure):
+        """
+        The function that saves a failure of a song
+
+        :param str entry_id: Entry id
+        :param dict failure: Failure created by RetryPolicy
+        """
+        with self.__connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO failures (entry_id, error, message, attempts, retry_at, is_permanent, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (entry_id, failure['error'], failure['message'], failure['attempts'], failure['retry_at'], int(failure['is_permanent']), time.time()))
+
+    def clear_failure(self, entry_id=None):
+        """
+        The function that deletes a failure of a song when it is downloaded
+
+        :param str entry_id: Entry id. If None, failures of all songs are deleted.
+        """
+        with self.__connection() as connection:
+            if entry_id is None:
+                connection.execute('DELETE FROM failures')
+            else:
+                connection.execute('DELETE FROM failures WHERE entry_id = ?', (entry_id,))
+
+    """"""""""""""" Migration """""""""""""""
+
+    def migrate(self, playlist_key, download_dir):
+        """
+        The function that imports playlist state saved as JSON files by older versions.
+        Imported files are renamed with '.migrated' suffix.
+
+        :param str playlist_key: Key of the playlist
+        :param str download_dir: Download directory which may contain JSON files
+        """
+
+        playlist_file = os.path.join(download_dir, '.queued.json')
+        downloaded_file = os.path.join(download_dir, '.downloaded.json')
+
+        if os.path.exists(playlist_file):
+            with open(playlist_file) as f:
+                pl_data = json.load(f)
+            if self.load_queue_status(playlist_key) is None:
+                self.save_playlist(playlist_key, pl_data)
+                logger.info('Imported playlist state from {}'.format(playlist_file))
+            os.replace(playlist_file, playlist_file + '.migrated')
+
+        # Entry data resolved by youtube-dl is kept in the database now
+        if os.path.exists(downloaded_file):
+            os.remove(downloaded_file)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import platform
+import shutil
+import subprocess
+import uuid
+
+from youtube_dl.utils import sanitize_filename
+
+from music_dl.lib.log import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+# ioctl request that clones a file on Linux filesystems supporting reflinks, such as Btrfs and XFS
+FICLONE = 0x40049409
+
+
+class TrackStore(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, working_dir, audio_codec='m4a', audio_bitrate=198, dirname='.tracks'):
+        """
+        Initializer
+
+        Audio files are stored once under the working directory, keyed by source id, codec and bitrate.
+        Playlist folders contain reflinks or copies of the stored files, so the same song is never downloaded twice.
+
+        :param str working_dir: Path to root directory
+        :param str audio_codec: Audio codec of stored files
+        :param int audio_bitrate: Audio bitrate of stored files
+        :param str dirname: Name of the store directory
+        """
+
+        self.audio_codec = audio_codec
+        self.store_dir = os.path.join(working_dir, dirname, audio_codec, str(audio_bitrate))
+
+        os.makedirs(self.store_dir, exist_ok=True)
+
+    """"""""""""""" Path """""""""""""""
+
+    def audio_file(self, source_id, extension=None):
+        """
+        :param str source_id: Id of the song on the site
+        :param str extension: Extension of the audio file. Defaults to the audio codec, which differs if the codec is best.
+        :rtype str
+        :return: Path to the stored audio file
+        """
+        return os.path.join(self.store_dir, '{}.{}'.format(sanitize_filename(source_id), extension or self.audio_codec))
+
+    def info_file(self, source_id):
+        """
+        :param str source_id: Id of the song on the site
+        :rtype str
+        :return: Path to the stored song information
+        """
+        return os.path.join(self.store_dir, '{}.info.json'.format(sanitize_filename(source_id)))
+
+    """"""""""""""" Store """""""""""""""
+
+    def load(self, source_id):
+        """
+        The function that loads information of a stored song
+
+        :param str source_id: Id of the song on the site
+        :rtype dict
+        :return: Song information resolved by youtube-dl, or None if the song is not stored
+        """
+
+        try:
+            with open(self.info_file(source_id), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.isfile(self.audio_file(source_id, info.get('ext'))):
+            return None
+        return info
+
+    def add(self, info):
+        """
+        The function that adds a downloaded song into the store.
+        The downloaded file stays in the playlist folder, and the store keeps a reflink or a copy of it,
+        so metadata written into the playlist folder never changes the stored file.
+        Artwork is not stored, because it is fetched from the thumbnail URLs by ArtworkCache.
+
+        :param dict info: Song information resolved by youtube-dl, which contains path to the audio file
+        """
+
+        source_id = info['id']
+        downloaded_file = info.get('filepath')
+        if downloaded_file is None or not os.path.isfile(downloaded_file):
+            return
+
+        stored_info = dict(info)
+        stored_info.pop('filepath', None)
+
+        # Audio data. Information is written last, so a song without information is never regarded as stored.
+        self.__clone(downloaded_file, self.audio_file(source_id, self.__extension(downloaded_file)))
+        self.__write_json(self.info_file(source_id), stored_info)
+
+    def link(self, source_id, target_file):
+        """
+        The function that creates the audio file in a playlist folder from the stored file.
+        Metadata is written into each playlist folder in place, so the folder gets a reflink where the filesystem supports it, and a copy otherwise.
+        Hardlinks are not used, because tags written through a hardlink would change the stored file.
+
+        :param str source_id: Id of the song on the site
+        :param str target_file: Path to the audio file in a playlist folder
+        """
+        self.__clone(self.audio_file(source_id, self.__extension(target_file)), target_file)
+
+    def __clone(self, source_file, target_file):
+        # Temporary file is renamed at last, so neither the store nor a playlist folder contains an incomplete file
+        temp_file = '{}.{}.tmp'.format(target_file, uuid.uuid4().hex)
+        try:
+            if not self.__reflink(source_file, temp_file):
+                shutil.copyfile(source_file, temp_file)
+            os.replace(temp_file, target_file)
+
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    @staticmethod
+    def __extension(audio_file):
+        return os.path.splitext(audio_file)[1][1:] or None
+
+    @staticmethod
+    def __reflink(source_file, target_file):
+        try:
+            if platform.system().lower() == 'darwin':
+                subprocess.check_output(['cp', '-c', source_file, target_file], stderr=subprocess.STDOUT)
+            elif fcntl is None:
+                return False
+            else:
+                with open(source_file, 'rb') as source, open(target_file, 'wb') as target:
+                    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return True
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.debug('Could not create reflink {}: {}'.format(target_file, e))
+            if os.path.exists(target_file):
+                os.remove(target_file)
+            return False
+
+    @staticmethod
+    def __write_json(file, data):
+        temp_file = '{}.{}.tmp'.format(file, uuid.uuid4().hex)
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_file, file)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TraceRecorder(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self):
+        """
+        Initializer
+
+        Spans of each song, such as resolve, download, transcode, tag and rename, are recorded on the thread which ran them,
+        so workers waiting for each other are seen side by side.
+        Spans are written as Chrome trace event format, which opens in Perfetto and chrome://tracing.
+        """
+
+        self.started_at = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = []  # List of (tid, thread name) in order of the first span
+        self.lock = threading.Lock()
+        self.__local = threading.local()
+
+    """"""""""""""" Record """""""""""""""
+
+    @contextmanager
+    def span(self, name, song_id=None, **args):
+        """
+        The function that records the block as a span
+
+        :param str name: Span name, such as extract, download, transcode, tag, rename and cleanup
+        :param str song_id: Entry id of the song, or None if the span is not of a song
+        :param args: Values displayed with the span
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, started_at, song_id=song_id, **args)
+
+    def complete(self, name, started_at, ended_at=None, song_id=None, **args):
+        """
+        The function that records a span measured by the caller
+
+        :param str name: Span name
+        :param float started_at: Value of time.perf_counter when the span started
+        :param float ended_at: Value of time.perf_counter when the span ended. Defaults to the time called.
+        :param str song_id: Entry id of the song, or None if the span is not of a song
+        :param args: Values displayed with the span
+        """
+        ended_at = ended_at if ended_at is not None else time.perf_counter()
+        if song_id is not None:
+            args['id'] = song_id
+        event = {
+            'name': name,
+            'cat': 'song' if song_id is not None else 'run',
+            'ph': 'X',
+            'ts': (started_at - self.started_at) * 1e6,
+            'dur': max(0.0, ended_at - started_at) * 1e6,
+            'pid': self.pid,
+            'args': args,
+        }
+
+        with self.lock:
+            # Track is kept in thread local storage, because idents of finished threads are reused by new threads
+            tid = getattr(self.__local, 'tid', None)
+            if tid is None:
+                tid = self.__local.tid = len(self.threads) + 1
+                self.threads.append((tid, threading.current_thread().name))
+            event['tid'] = tid
+            self.events.append(event)
+
+    """"""""""""""" Export """""""""""""""
+
+    def write(self, trace_file):
+        """
+        The function that writes spans recorded as a Chrome trace event file
+
+        :param str trace_file: Path to the trace file
+        """
+        trace_dir = os.path.dirname(os.path.abspath(trace_file))
+        os.makedirs(trace_dir, exist_ok=True)
+
+        with self.lock:
+            events = list(self.events)
+            threads = list(self.threads)
+
+        # Metadata events name the process and a track of each thread
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'music_dl'}}]
+        metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}} for tid, name in threads]
+        metadata += [{'name': 'thread_sort_index', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'sort_index': tid}} for tid, _ in threads]
+
+        with open(trace_file, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + sorted(events, key=lambda event: event['ts']), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
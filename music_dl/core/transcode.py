@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from concurrent.futures import Future
+
+from music_dl.core.codec import get_handler
+from music_dl.core.pipeline import Stage
+from music_dl.lib.log import logger
+
+# Extension of artwork passed to ffmpeg
+ARTWORK_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+}
+
+# Scheduling class of ionice
+IONICE_CLASSES = {
+    'realtime': '1',
+    'best-effort': '2',
+    'idle': '3',
+}
+
+
+class Transcoder(object):
+    """"""""""""""" Initialization """""""""""""""
+
+    def __init__(self, workers=None, maxsize=None, nice=0, ionice=None):
+        """
+        Initializer
+
+        Downloaded audio is transcoded by ffmpeg processes separately from download workers,
+        so the network is used while audio is encoded and CPU is used while songs are downloaded.
+        Metadata and artwork are written by the same ffmpeg process, so audio is read and written once for each song.
+        Download workers block when the queue is full, so downloaded files do not pile up.
+
+        :param int workers: Number of ffmpeg processes running at once. Defaults to the number of CPU cores.
+        :param int maxsize: Maximum number of downloaded files waiting to be transcoded. Defaults to twice the number of workers.
+        :param int nice: Niceness added to ffmpeg processes
+        :param str ionice: I/O scheduling class of ffmpeg processes. One of realtime, best-effort and idle.
+        """
+
+        self.workers = workers if workers is not None and workers > 0 else (os.cpu_count() or 1)
+        self.maxsize = maxsize if maxsize is not None and maxsize > 0 else self.workers * 2
+        self.nice = nice
+        self.ionice = ionice
+        self.stage = Stage('Transcode', handler=self.__transcode, workers=self.workers, maxsize=self.maxsize)
+
+    """"""""""""""" Control """""""""""""""
+
+    def start(self):
+        """
+        The function that starts worker threads, each of which runs one ffmpeg process at a time
+
+        :rtype Transcoder
+        :return: Transcoder itself
+        """
+        self.stage.start()
+        return self
+
+    def submit(self, source_file, audio_codec, audio_bitrate, source_codec=None, callback=None, target_file=None, metadata=None, artwork=None, source_bitrate=None):
+        """
+        The function that queues a downloaded file to be transcoded. Blocks while the queue is full.
+
+        :param str source_file: Path to the downloaded file
+        :param str audio_codec: Preferred audio codec
+        :param int audio_bitrate: Preferred audio bitrate
+        :param str source_codec: Audio codec of the downloaded file reported by the site, if known
+        :param function callback: Function called with (path to the transcoded file, seconds taken by ffmpeg, flag that indicates artwork was not embedded)
+                                  before the future is resolved
+        :param str target_file: Path to the transcoded file. Defaults to the downloaded file with the extension of the codec.
+        :param dict metadata: Metadata written to the transcoded file
+        :param tuple artwork: (Image data, Mime type) of artwork embedded into the transcoded file, or None
+        :param float source_bitrate: Audio bitrate of the downloaded file in kbps, if known. Audio is not encoded above it.
+        :rtype Future
+        :return: Future of the path to the transcoded file
+        """
+        future = Future()
+        self.stage.put((source_file, audio_codec, audio_bitrate, source_codec, source_bitrate, callback, target_file, metadata, artwork, future))
+        return future
+
+    def join(self):
+        """
+        The function that waits until all queued files are transcoded and stops worker threads
+        """
+        self.stage.join()
+
+    """"""""""""""" Transcode """""""""""""""
+
+    def __transcode(self, item):
+        source_file, audio_codec, audio_bitrate, source_codec, source_bitrate, callback, target_file, metadata, artwork, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            extension = get_handler(audio_codec, source_codec).extension
+            source_name = os.path.splitext(source_file)[0]
+            target_file = target_file or '{}.{}'.format(source_name, extension)
+            temp_file = '{}.{}.temp.{}'.format(source_name, uuid.uuid4().hex, extension)
+            artwork_file = None
+            is_artwork_dropped = False
+            started_at = time.perf_counter()
+            try:
+                if artwork is not None and artwork[1] in ARTWORK_EXTENSIONS:
+                    artwork_file = '{}.{}.{}'.format(source_name, uuid.uuid4().hex, ARTWORK_EXTENSIONS[artwork[1]])
+                    with open(artwork_file, 'wb') as f:
+                        f.write(artwork[0])
+
+                options = self.codec_options(audio_codec, audio_bitrate, source_codec, source_bitrate)
+                for key, value in (metadata or {}).items():
+                    options += ['-metadata', '{}={}'.format(key, value)]
+
+                try:
+                    self.__run_ffmpeg(self.input_options(source_file, artwork_file) + options + [temp_file])
+                except RuntimeError as e:
+                    if artwork_file is None:
+                        raise
+                    # ffmpeg older than 4.4 can not embed artwork into m4a. Artwork is added by the callback instead.
+                    logger.debug('Could not transcode {} with artwork. Retrying without artwork. {}'.format(os.path.basename(target_file), str(e)))
+                    self.__run_ffmpeg(self.input_options(source_file) + options + [temp_file])
+                    is_artwork_dropped = True
+                # Transcoded file appears with its final name only when it is complete
+                os.replace(temp_file, target_file)
+            finally:
+                for file in [temp_file, artwork_file]:
+                    if file is not None and os.path.exists(file):
+                        os.remove(file)
+
+            if source_file != target_file:
+                os.remove(source_file)
+            elapsed = time.perf_counter() - started_at
+
+            if callback is not None:
+                callback(target_file, elapsed, is_artwork_dropped)
+            future.set_result(target_file)
+
+        except BaseException as e:
+            future.set_exception(e)
+
+    def __run_ffmpeg(self, args):
+        command = ['ffmpeg', '-y', '-loglevel', 'error'] + args
+        if self.ionice is not None and shutil.which('ionice') is not None:
+            command = ['ionice', '-c', IONICE_CLASSES[self.ionice]] + command
+
+        preexec_fn = None
+        if self.nice > 0 and hasattr(os, 'nice'):
+            preexec_fn = lambda: os.nice(self.nice)
+
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=preexec_fn)
+        if process.returncode != 0:
+            raise RuntimeError('ffmpeg exited with {}: {}'.format(process.returncode, process.stderr.decode('utf-8', 'replace').strip()))
+
+    @staticmethod
+    def input_options(source_file, artwork_file=None):
+        """
+        The function that creates ffmpeg options which read audio of the downloaded file and artwork embedded as a cover
+
+        :param str source_file: Path to the downloaded file
+        :param str artwork_file: Path to the artwork, or None
+        :rtype list
+        :return: ffmpeg options
+        """
+        if artwork_file is None:
+            return ['-i', source_file, '-map', '0:a']
+        return ['-i', source_file, '-i', artwork_file, '-map', '0:a', '-map', '1:v', '-c:v', 'copy', '-disposition:v', 'attached_pic']
+
+    @staticmethod
+    def source_metadata(info):
+        """
+        The function that creates metadata from song information the same way FFmpegMetadata of youtube-dl does
+
+        :param dict info: Song information resolved by youtube-dl
+        :rtype dict
+        :return: Metadata written by ffmpeg
+        """
+
+        metadata = {}
+
+        def add(metadata_keys, info_keys):
+            for info_key in info_keys:
+                if info.get(info_key) is not None:
+                    for metadata_key in metadata_keys:
+                        metadata[metadata_key] = info[info_key]
+                    break
+
+        add(['title'], ['track', 'title'])
+        add(['date'], ['upload_date'])
+        add(['description', 'comment'], ['description'])
+        add(['purl'], ['webpage_url'])
+        add(['track'], ['track_number'])
+        add(['artist'], ['artist', 'creator', 'uploader', 'uploader_id'])
+        add(['genre'], ['genre'])
+        add(['album'], ['album'])
+        add(['album_artist'], ['album_artist'])
+        add(['disc'], ['disc_number'])
+        return metadata
+
+    @staticmethod
+    def codec_options(audio_codec, audio_bitrate, source_codec=None, source_bitrate=None):
+        """
+        The function that creates ffmpeg options which convert audio the same way FFmpegExtractAudio of youtube-dl does.
+        Audio already encoded in the preferred codec is copied without encoding, and the best codec always copies audio.
+        Encoded audio does not exceed the bitrate of the downloaded audio.
+
+        :param str audio_codec: Preferred audio codec
+        :param int audio_bitrate: Preferred audio bitrate
+        :param str source_codec: Audio codec of the downloaded file, such as 'mp4a.40.2' or 'opus'
+        :param float source_bitrate: Audio bitrate of the downloaded file in kbps, if known
+        :rtype list
+        :return: ffmpeg options
+        """
+        return get_handler(audio_codec, source_codec).ffmpeg_options(audio_bitrate, source_codec, source_bitrate)
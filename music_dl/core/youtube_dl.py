@@ -1,19 +1,36 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import itertools
 import os
 import re
+import sys
+import time
 from enum import Enum
+from urllib.error import HTTPError
 from urllib.parse import urlparse
 
 import colorama
 from tldextract import tldextract
+from youtube_dl import YoutubeDL
+from youtube_dl.postprocessor.common import PostProcessor
+from youtube_dl.utils import PagedList
+
+from music_dl.core.codec import get_format, get_ytdl_codec
+from music_dl.core.ratelimit import THROTTLED_STATUS_CODES
 
 
 class YDLHelper(object):
     """"""""""""""" Initializer """""""""""""""
 
-    def __init__(self):
+    def __init__(self, tracer=None):
+        """
+        Initializer
+
+        :param TraceRecorder tracer: Recorder of spans of each song, or None
+        """
+        self.tracer = tracer
+
         self.__preprocess_queue_index = 0
         self.__preprocess_queue_total = 0
 
@@ -21,6 +38,7 @@ class YDLHelper(object):
         self.__download_queue_index = 0
         self.__download_queue_total = 0
         self.__download_queue_indices = None
+        self.__resolve_started_at = None
 
     """"""""""""""" Preprocess """""""""""""""
 
@@ -49,8 +67,8 @@ class YDLHelper(object):
             self.__preprocess_queue_index = playlist_end - playlist_start
 
         ydl_opts = {
-            'format': 'bestaudio/best',  # Video format code. See https://github.com/rg3/youtube-dl/blob/master/youtube_dl/options.py for more information
-            'writethumbnail': True,  # Write the thumbnail image to a file
+            'format': get_format(audio_codec),  # Audio already in the preferred codec is copied without encoding. See https://github.com/rg3/youtube-dl/blob/master/youtube_dl/options.py for more information
+            'writethumbnail': False,  # Artwork is fetched by ArtworkCache only when it is added to metadata
             'ignoreerrors': True,  # Do not stop on download errors.
             'nooverwrites': True,  # Prevent overwriting files.
             'forceurl': True,  # Force printing final URL.
@@ -63,7 +81,7 @@ class YDLHelper(object):
                 },
                 {
                     'key': 'FFmpegExtractAudio',
-                    'preferredcodec': audio_codec,
+                    'preferredcodec': get_ytdl_codec(audio_codec),
                     'preferredquality': str(audio_bitrate),
                 }
             ],
@@ -73,21 +91,46 @@ class YDLHelper(object):
         tld_parsed = tldextract.extract(download_url)
         if tld_parsed.domain == 'youtube':
             url_parsed = urlparse(download_url)
-            if ('watch?' in url_parsed and 'v=' in url_parsed and 'list=' in url_parsed) or ('playlist?' in url_parsed and 'list=' in url_parsed):
+            is_watch = url_parsed.path.startswith('/watch') and 'v=' in url_parsed.query
+            is_playlist = url_parsed.path.startswith('/playlist')
+            if (is_watch or is_playlist) and 'list=' in url_parsed.query:
                 ydl_opts['playliststart'] = playlist_start
-                ydl_opts['playlistend'] = playlist_end
+                ydl_opts['playlistend'] = playlist_end if playlist_end > 0 else None
 
         elif tld_parsed.domain == 'soundcloud':
             is_match = re.match(r"^(http(s)?://)([\w\.]+)?soundcloud\.com/(.*)/sets/(.*)", download_url)
             if is_match:
                 ydl_opts['playliststart'] = playlist_start
-                ydl_opts['playlistend'] = playlist_end
+                ydl_opts['playlistend'] = playlist_end if playlist_end > 0 else None
 
         return ydl_opts
 
+    @staticmethod
+    def slice_entries(entries, playlist_start=1, playlist_end=0):
+        """
+        The function that returns entries in the range requested without enumerating the rest of the playlist.
+        Paged playlists fetch only the pages covering the range. Lazy generators stop at the end of the range,
+        but entries before the start have to be walked, because their pages are chained by continuation tokens.
+
+        :param entries: Entries of the playlist extracted without processing. List, PagedList or iterable.
+        :param int playlist_start: Playlist item to start at
+        :param int playlist_end: Playlist item to end at. Zero means the last item.
+
+        :return: Iterable of entries in the range
+        """
+        start = playlist_start - 1
+        end = playlist_end if playlist_end > 0 else None
+
+        if isinstance(entries, list):
+            return entries[start:end]
+        elif isinstance(entries, PagedList):
+            return entries.getslice(start, end)
+        else:
+            return itertools.islice(entries, start, end)
+
     """"""""""""""" Download """""""""""""""
 
-    def get_download_option(self, download_dir, hook, audio_codec='m4a', audio_bitrate=198, queue_indices=None, verbose=True):
+    def get_download_option(self, download_dir, hook, audio_codec='m4a', audio_bitrate=198, queue_indices=None, queue_index=0, queue_total=0, postprocess=True, verbose=True):
         """
         The function that creates youtube-dl options.
         More info is available at https://github.com/rg3/youtube-dl/blob/master/youtube_dl/YoutubeDL.py
@@ -95,29 +138,41 @@ class YDLHelper(object):
         :param str download_dir: Directory to download songs
         :param function hook: Download hook that called when download is finished
         :param list queue_indices: Indices to download
+        :param int queue_index: Queue index of a single playlist entry downloaded by this option
+        :param int queue_total: Total number of queue displayed in log message
         :param str audio_codec: Preferred audio codec
         :param int audio_bitrate: Preferred audio bitrate
+        :param bool postprocess: Add metadata and convert audio by youtube-dl. False if Transcoder does both in a single pass.
         :param bool verbose: Print verbose message
 
         :rtype dict
         :return ydl_opts: Options for youtube-dl
         """
         self.__download_callback = hook
+        # Songs are resolved from the time the option is used until their download starts
+        self.__resolve_started_at = time.perf_counter()
 
         if queue_indices is not None:
             self.__download_queue_indices = queue_indices
             self.__download_queue_index = 1
             self.__download_queue_total = len(queue_indices)
 
+        elif queue_index > 0:
+            # Option is used by a worker which downloads one entry of the playlist
+            self.__download_queue_index = queue_index
+            self.__download_queue_total = queue_total
+
         ydl_opts = {
             # 'outtmpl': Template for output names. See https://github.com/rg3/youtube-dl/blob/master/README.md#output-template for more information
             # 'outtmpl': os.path.join(download_dir, '[%(playlist_index)s-{}] %(title)s.%(ext)s'.format(len(__download_queue_indices))),
             # 'outtmpl': os.path.join(download_dir, '%(title)s.%(ext)s'),
             # 'outtmpl': os.path.join(download_dir, '%(id)s.%(ext)s'),
-            'format': 'bestaudio/best',  # Video format code. See https://github.com/rg3/youtube-dl/blob/master/youtube_dl/options.py for more information
-            'writethumbnail': True,  # Write the thumbnail image to a file
+            'format': get_format(audio_codec),  # Audio already in the preferred codec is copied without encoding. See https://github.com/rg3/youtube-dl/blob/master/youtube_dl/options.py for more information
+            'writethumbnail': False,  # Artwork is fetched by ArtworkCache only when it is added to metadata
             'ignoreerrors': True,  # Do not stop on download errors.
             'nooverwrites': True,  # Prevent overwriting files.
+            'continuedl': True,  # Resume partially downloaded .part files by byte range.
+            'nopart': False,  # Download into .part files, so a file with the final name is always complete.
             'forceurl': True,  # Force printing final URL.
             'forcethumbnail': True,  # Force printing thumbnail URL.
             'forcefilename': True,  # Force printing final filename.
@@ -132,7 +187,7 @@ class YDLHelper(object):
                 },
                 {
                     'key': 'FFmpegExtractAudio',
-                    'preferredcodec': audio_codec,
+                    'preferredcodec': get_ytdl_codec(audio_codec),
                     'preferredquality': str(audio_bitrate),
                 }
             ],
@@ -140,10 +195,16 @@ class YDLHelper(object):
             'progress_hooks': [self.__download_progress_hook],
         }
 
+        # Audio is transcoded with metadata separately from download
+        if not postprocess:
+            ydl_opts['postprocessors'] = []
+
         # Specify indices of playlist to download
         if self.__download_queue_indices is not None and len(self.__download_queue_indices) > 0:
             ydl_opts['outtmpl'] = os.path.join(download_dir, '%(id)s.%(ext)s')  # Template for output names. See https://github.com/rg3/youtube-dl/blob/master/README.md#output-template for more information
             ydl_opts['playlist_items'] = ','.join([str(index) for index in self.__download_queue_indices])
+        elif queue_index > 0:
+            ydl_opts['outtmpl'] = os.path.join(download_dir, '%(id)s.%(ext)s')  # Template for output names. See https://github.com/rg3/youtube-dl/blob/master/README.md#output-template for more information
         else:
             ydl_opts['outtmpl'] = os.path.join(download_dir, '%(title)s.%(ext)s')  # Template for output names. See https://github.com/rg3/youtube-dl/blob/master/README.md#output-template for more information
             pass
@@ -159,6 +220,14 @@ class YDLHelper(object):
         """
         if data['status'] == 'finished':
 
+            # Format is resolved before the download started, which is the elapsed seconds ago
+            if self.tracer is not None and self.__resolve_started_at is not None:
+                finished_at = time.perf_counter()
+                downloaded_at = finished_at - (data.get('elapsed') or 0)
+                song_id = os.path.splitext(os.path.basename(data['filename']))[0]
+                self.tracer.complete('resolve', self.__resolve_started_at, max(self.__resolve_started_at, downloaded_at), song_id=song_id)
+                self.__resolve_started_at = finished_at
+
             # Playlist
             if self.__download_queue_index > 0:
                 # Callback to MusicDL
@@ -174,8 +243,83 @@ class YDLHelper(object):
 
 class YDLQueueStatus(Enum):
     ready = 'ready'
-    failed = 'failed'
-    finished = 'finished'
+    failed = 'failed'  # Download failed transiently, and is retried after the next eligible time
+    quarantined = 'quarantined'  # Download failed permanently, such as private, removed or geo-blocked videos
+    downloaded = 'downloaded'  # Audio is downloaded but not transcoded yet
+    transcoded = 'transcoded'  # Audio is transcoded but not tagged yet
+    finished = 'finished'  # Audio is tagged. All stages are completed.
+
+
+class YDLRateLimited(YoutubeDL):
+    """
+    YoutubeDL whose requests and downloaded bytes are limited by the limiter of the site.
+    Extractors and downloaders open every request by urlopen,
+    so throttled responses are reported to the limiter before youtube-dl handles them.
+    The first error reported while ignoreerrors is set is kept, so the caller can record why the song failed.
+    """
+
+    def __init__(self, params=None, host_limiter=None, auto_init=True):
+        self.download_error = None  # (Exception or None, Message) of the first error reported
+        super().__init__(params, auto_init)
+        self.host_limiter = host_limiter
+        self.__downloaded_bytes = {}  # Dictionary that maps filename and bytes downloaded at the last progress
+        if host_limiter is not None:
+            self.add_progress_hook(self.__limit_progress_hook)
+
+    def urlopen(self, req):
+        if self.host_limiter is None:
+            return super().urlopen(req)
+
+        self.host_limiter.request()
+        try:
+            return super().urlopen(req)
+        except HTTPError as e:
+            if e.code in THROTTLED_STATUS_CODES:
+                self.host_limiter.throttled(e.code, self.__retry_after(e))
+            raise
+
+    def report_error(self, message, tb=None):
+        # Called in the except clause of the failure, so the exception is still being handled
+        if self.download_error is None:
+            self.download_error = (sys.exc_info()[1], message)
+        super().report_error(message, tb)
+
+    def __limit_progress_hook(self, data):
+        filename = data.get('filename')
+        downloaded_bytes = data.get('downloaded_bytes') or 0
+
+        if data['status'] == 'downloading':
+            # Bytes resumed from a .part file are counted from the first progress
+            last_bytes = self.__downloaded_bytes.get(filename, downloaded_bytes)
+            self.__downloaded_bytes[filename] = downloaded_bytes
+            self.host_limiter.consume(downloaded_bytes - last_bytes)
+
+        elif data['status'] == 'finished':
+            self.__downloaded_bytes.pop(filename, None)
+            self.host_limiter.downloaded(data.get('total_bytes') or downloaded_bytes, data.get('elapsed'))
+
+    @staticmethod
+    def __retry_after(error):
+        try:
+            return float(error.headers.get('Retry-After'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+
+class YDLProcessedPostProcessor(PostProcessor):
+    """
+    Post processor appended to the end of the chain, so the callback receives an entry
+    after FFmpegExtractAudio has written the final audio file.
+    The 'finished' status of the progress hook is reported before post processing starts.
+    """
+
+    def __init__(self, callback, downloader=None):
+        super().__init__(downloader)
+        self.callback = callback
+
+    def run(self, information):
+        self.callback(information)
+        return [], information
 
 
 class YDLLogger(object):
@@ -4,6 +4,7 @@
 import logging
 import re
 import sys
+import threading
 
 import colorama
 
@@ -47,6 +48,79 @@ class ColorizingStreamHandler(logging.StreamHandler):
         return ansi_escape.sub('', s)
 
 
+class ThreadLogBuffer(logging.Filter):
+    """
+    Filter that holds records logged by threads which are buffering,
+    so records of songs processed concurrently can be printed in order.
+    """
+
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.local = threading.local()
+
+    def filter(self, record):
+        records = getattr(self.local, 'records', None)
+        if records is None:
+            return True
+        records.append(record)
+        return False
+
+    def begin(self):
+        """
+        The function that starts holding records logged by the current thread
+        """
+        self.local.records = []
+
+    def end(self):
+        """
+        The function that stops holding records logged by the current thread
+
+        :rtype list
+        :return: Records held, which are printed by logger.handle
+        """
+        records = getattr(self.local, 'records', None) or []
+        self.local.records = None
+        return records
+
+
+class LogSequencer(object):
+    """
+    Sequencer that prints records held by ThreadLogBuffer in order of sequence numbers,
+    so records of songs processed concurrently are printed in the order the songs are queued.
+    """
+
+    def __init__(self):
+        self.reserved = 0
+        self.released = 0
+        self.pending = {}  # Dictionary that maps sequence number and records held
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        The function that reserves the next sequence number. Every number reserved must be released.
+
+        :rtype int
+        :return: Sequence number
+        """
+        with self.lock:
+            self.reserved += 1
+            return self.reserved
+
+    def release(self, sequence, records):
+        """
+        The function that prints the records, and the records of later numbers held, once all earlier numbers are released
+
+        :param int sequence: Sequence number reserved
+        :param list records: Records held by ThreadLogBuffer
+        """
+        with self.lock:
+            self.pending[sequence] = records
+            while self.released + 1 in self.pending:
+                self.released += 1
+                for record in self.pending.pop(self.released):
+                    logger.handle(record)
+
+
 colorama.init(autoreset=True)
 logging.basicConfig(filename='{}.log'.format('music_dl'))
 logger = logging.getLogger('music_dl')
@@ -56,3 +130,5 @@ handler_format = logging.Formatter('[music_dl] %(message)s')
 handler.setFormatter(handler_format)
 logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
+log_buffer = ThreadLogBuffer()
+logger.addFilter(log_buffer)
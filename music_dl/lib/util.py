@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
+
 
 def padded_num(num=-1, max_num=1):
     """
@@ -29,3 +31,27 @@ def contains_at_least(l1, l2):
     """
 
     return any(x in l1 for x in l2)
+
+
+def read_batch_file(batch_file):
+    """
+    The function that reads URLs from a batch file.
+    Empty lines and lines starting with '#', ';' or ']' are ignored as youtube-dl does.
+
+    :param str batch_file: Path to the file which contains one URL per line. '-' reads from standard input.
+    :rtype list
+    :return: List of URLs in order of the file
+    """
+
+    if batch_file == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith(('#', ';', ']')):
+            urls.append(line)
+    return urls
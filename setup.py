@@ -66,8 +66,11 @@ setup(
     ],
     python_requires='>=3.4',
     platforms=['posix'],
-    packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    packages=find_packages(exclude=['contrib', 'docs', 'tests', 'benchmarks']),
     install_requires=requirements('requirements.txt'),
+    extras_require={
+        'artwork': ['Pillow'],  # Downscale and convert artwork
+    },
     entry_points={
         'console_scripts': [
             'music-dl=music_dl:main',
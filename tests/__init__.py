@@ -0,0 +1,10 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+import os
+import tempfile
+
+# Log file of music_dl is written to the temporary directory instead of the current directory.
+# basicConfig of music_dl.lib.log does nothing once the root logger has a handler.
+logging.basicConfig(filename=os.path.join(tempfile.gettempdir(), 'music_dl_tests.log'))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from music_dl.core import artwork
+from music_dl.core.artwork import ArtworkCache
+
+JPEG_DATA = b'\xff\xd8\xff\xe0' + b'jpeg' * 64
+PNG_DATA = b'\x89PNG\r\n\x1a\n' + b'png' * 64
+WEBP_DATA = b'RIFF\x00\x00\x00\x00WEBPVP8 ' + b'webp' * 64
+
+
+class FakeServer(object):
+    """
+    Stand-in for urllib.request.urlopen which serves images by URL and counts requests
+    """
+
+    def __init__(self, images, delay=0):
+        self.images = images
+        self.delay = delay
+        self.requested_urls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, url, timeout=None):
+        with self.lock:
+            self.requested_urls.append(url)
+        time.sleep(self.delay)
+        if url not in self.images:
+            raise OSError('404 Not Found')
+        return io.BytesIO(self.images[url])
+
+
+class TestArtworkCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.server = FakeServer({
+            'https://i.ytimg.com/vi/a/maxresdefault.jpg': JPEG_DATA,
+            'https://i.ytimg.com/vi/b/maxresdefault.jpg': JPEG_DATA,
+            'https://i.ytimg.com/vi/c/maxresdefault.png': PNG_DATA,
+        })
+        patcher = mock.patch('music_dl.core.artwork.urllib.request.urlopen', side_effect=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_artwork_is_fetched_once_for_each_url(self):
+        cache = ArtworkCache(self.working_dir)
+        entry = {'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'}
+
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), cache.get(entry))
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), cache.get(entry))
+        self.assertEqual((PNG_DATA, 'image/png'), cache.get({'thumbnail': 'https://i.ytimg.com/vi/c/maxresdefault.png'}))
+        self.assertEqual(['https://i.ytimg.com/vi/a/maxresdefault.jpg', 'https://i.ytimg.com/vi/c/maxresdefault.png'],
+                         self.server.requested_urls)
+
+    def test_artwork_is_loaded_from_disk_by_next_run(self):
+        entry = {'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'}
+        ArtworkCache(self.working_dir).get(entry)
+
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), ArtworkCache(self.working_dir).get(entry))
+        self.assertEqual(1, len(self.server.requested_urls))
+
+    def test_artwork_is_loaded_from_disk_when_evicted_from_memory(self):
+        cache = ArtworkCache(self.working_dir, memory_size=1)
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'})
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/c/maxresdefault.png'})
+
+        self.assertEqual(1, len(cache.memory_cache))
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), cache.get({'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'}))
+        self.assertEqual(2, len(self.server.requested_urls))
+
+    def test_identical_images_are_saved_once(self):
+        cache = ArtworkCache(self.working_dir)
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'})
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/b/maxresdefault.jpg'})
+
+        image_files = [filename for _, _, filenames in os.walk(cache.cache_dir) for filename in filenames
+                       if not filename.startswith(os.path.basename(cache.database_file))]
+        self.assertEqual(1, len(image_files))
+        self.assertEqual(1, len(cache.memory_cache))
+
+    def test_songs_sharing_cover_wait_for_single_fetch(self):
+        self.server.delay = 0.1
+        cache = ArtworkCache(self.working_dir)
+        entry = {'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'}
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(entry))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([(JPEG_DATA, 'image/jpeg')] * 4, results)
+        self.assertEqual(1, len(self.server.requested_urls))
+        self.assertEqual({}, cache.url_locks)
+
+    def test_failed_fetch_is_retried(self):
+        cache = ArtworkCache(self.working_dir)
+        entry = {'thumbnail': 'https://i.ytimg.com/vi/d/maxresdefault.jpg'}
+
+        self.assertIsNone(cache.get(entry))
+        self.assertEqual({}, cache.url_locks)
+        self.server.images['https://i.ytimg.com/vi/d/maxresdefault.jpg'] = JPEG_DATA
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), cache.get(entry))
+        self.assertEqual(2, len(self.server.requested_urls))
+
+    def test_song_without_artwork(self):
+        cache = ArtworkCache(self.working_dir)
+
+        self.assertIsNone(cache.get({}))
+        self.assertEqual([], self.server.requested_urls)
+
+    def test_least_recently_used_artwork_is_evicted_from_disk(self):
+        cache = ArtworkCache(self.working_dir, max_size=len(JPEG_DATA) + 1)
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'})
+        cache.get({'thumbnail': 'https://i.ytimg.com/vi/c/maxresdefault.png'})
+
+        next_cache = ArtworkCache(self.working_dir)
+        self.assertEqual((PNG_DATA, 'image/png'), next_cache.get({'thumbnail': 'https://i.ytimg.com/vi/c/maxresdefault.png'}))
+        self.assertEqual(2, len(self.server.requested_urls))
+        next_cache.get({'thumbnail': 'https://i.ytimg.com/vi/a/maxresdefault.jpg'})
+        self.assertEqual(3, len(self.server.requested_urls))
+
+
+class TestThumbnailSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ArtworkCache(tempfile.gettempdir(), target_size=600)
+
+    def test_smallest_thumbnail_large_enough(self):
+        thumbnails = [
+            {'url': 'https://example.com/small.jpg', 'width': 320, 'height': 180},
+            {'url': 'https://example.com/large.jpg', 'width': 1920, 'height': 1080},
+            {'url': 'https://example.com/medium.jpg', 'width': 1280, 'height': 720},
+        ]
+        self.assertEqual('https://example.com/medium.jpg', self.cache.select_url(thumbnails))
+
+    def test_largest_thumbnail_when_none_is_large_enough(self):
+        thumbnails = [
+            {'url': 'https://example.com/small.jpg', 'width': 320, 'height': 180},
+            {'url': 'https://example.com/medium.jpg', 'width': 480, 'height': 360},
+        ]
+        self.assertEqual('https://example.com/medium.jpg', self.cache.select_url(thumbnails))
+
+    def test_best_thumbnail_without_size(self):
+        thumbnails = [{'url': 'https://example.com/worst.jpg'}, {'url': 'https://example.com/best.jpg'}]
+        self.assertEqual('https://example.com/best.jpg', self.cache.select_url(thumbnails))
+
+    def test_default_url(self):
+        self.assertEqual('https://example.com/default.jpg', self.cache.select_url([], 'https://example.com/default.jpg'))
+        self.assertIsNone(self.cache.select_url([{'url': None}]))
+
+    @mock.patch('music_dl.core.artwork.Image', None)
+    def test_webp_is_not_selected_without_pillow(self):
+        thumbnails = [
+            {'url': 'https://example.com/cover.jpg', 'width': 1280, 'height': 720},
+            {'url': 'https://example.com/cover.webp?v=1', 'width': 640, 'height': 640},
+        ]
+        self.assertEqual('https://example.com/cover.jpg', self.cache.select_url(thumbnails))
+        # WebP is still selected if it is the only one available
+        self.assertEqual('https://example.com/cover.webp?v=1', self.cache.select_url(thumbnails[1:]))
+
+
+class TestImageNormalization(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ArtworkCache(tempfile.gettempdir(), target_size=600)
+
+    def test_guess_mime_type(self):
+        self.assertEqual('image/jpeg', ArtworkCache.guess_mime_type(JPEG_DATA))
+        self.assertEqual('image/png', ArtworkCache.guess_mime_type(PNG_DATA))
+        self.assertEqual('image/webp', ArtworkCache.guess_mime_type(WEBP_DATA))
+        self.assertIsNone(ArtworkCache.guess_mime_type(b'<html></html>'))
+
+    @mock.patch('music_dl.core.artwork.Image', None)
+    def test_images_are_kept_without_pillow(self):
+        self.assertEqual((JPEG_DATA, 'image/jpeg'), self.cache.normalize(JPEG_DATA))
+        self.assertEqual((PNG_DATA, 'image/png'), self.cache.normalize(PNG_DATA))
+        self.assertEqual((WEBP_DATA, None), self.cache.normalize(WEBP_DATA))
+
+    @unittest.skipUnless(artwork.Image, 'Pillow is not installed')
+    def test_large_image_is_downscaled(self):
+        image_data = self.__image_data((1280, 720), 'JPEG')
+
+        image_data, mime_type = self.cache.normalize(image_data)
+
+        self.assertEqual('image/jpeg', mime_type)
+        self.assertEqual((1067, 600), artwork.Image.open(io.BytesIO(image_data)).size)
+
+    @unittest.skipUnless(artwork.Image, 'Pillow is not installed')
+    def test_small_image_is_kept(self):
+        image_data = self.__image_data((480, 360), 'PNG')
+
+        self.assertEqual((image_data, 'image/png'), self.cache.normalize(image_data))
+
+    @unittest.skipUnless(artwork.Image, 'Pillow is not installed')
+    def test_webp_is_converted_to_jpeg(self):
+        image_data, mime_type = self.cache.normalize(self.__image_data((480, 360), 'WEBP'))
+
+        self.assertEqual('image/jpeg', mime_type)
+        self.assertEqual((480, 360), artwork.Image.open(io.BytesIO(image_data)).size)
+
+    @staticmethod
+    def __image_data(size, image_format):
+        output = io.BytesIO()
+        artwork.Image.new('RGB', size, (200, 40, 40)).save(output, format=image_format)
+        return output.getvalue()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.bench_merge import generate_playlist, generate_saved_playlist, preprocess_playlist
+from benchmarks.bench_suite import CALIBRATION, TAG_CODECS, is_regressed, run_suite
+from benchmarks.bench_tag import CREATORS
+from music_dl.core.codec import find_handler
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.playlist import Playlist
+from music_dl.core.state import StateStore
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Workloads of the benchmark suite give correct results, so the suite does not measure code which does nothing
+    """
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_merge_schedules_unfinished_entries_in_range(self):
+        pl_data = generate_playlist(200, private_ratio=0.1)
+        saved_pl_data = generate_saved_playlist(pl_data)
+        StateStore(self.working_dir).save_playlist('benchmark', saved_pl_data)
+        statuses = {entry['id']: entry['status'] for entry in saved_pl_data['entries']}
+
+        playlist = preprocess_playlist(self.working_dir, pl_data, playlist_start=51, playlist_end=150)
+
+        expected = [index + 1 for index, entry in enumerate(generate_playlist(200, private_ratio=0.1)['entries'])
+                    if 50 <= index < 150 and entry['title'] != '[Private video]' and statuses[entry['id']] != YDLQueueStatus.finished.value]
+        self.assertEqual(expected, playlist.scheduled_queue_indices)
+        self.assertIn('merge', playlist.metrics.phases)
+
+    def test_merge_numbers_tracks_without_private_entries(self):
+        pl_data = generate_playlist(100, private_ratio=0.2)
+        positions = [index + 1 for index, entry in enumerate(pl_data['entries']) if entry['title'] != '[Private video]']
+
+        playlist = preprocess_playlist(self.working_dir, pl_data)
+
+        entries = playlist.playlist_data['entries']
+        self.assertEqual(list(range(1, len(positions) + 1)), [entry['track_number'] for entry in entries])
+        self.assertEqual(positions, [entry['playlist_index'] for entry in entries])
+        saved_entries = playlist.state_store.load_playlist('benchmark')['entries']
+        self.assertEqual([entry['track_number'] for entry in entries], [entry['track_number'] for entry in saved_entries])
+
+    def test_state_round_trip(self):
+        pl_data = generate_saved_playlist(generate_playlist(100, private_ratio=0))
+        state_store = StateStore(self.working_dir)
+        state_store.save_playlist('benchmark', pl_data)
+
+        loaded = state_store.load_playlist('benchmark')
+        self.assertEqual([(entry['id'], entry['status']) for entry in pl_data['entries']],
+                         [(entry['id'], entry['status']) for entry in loaded['entries']])
+
+    def test_set_tagged_finishes_songs(self):
+        playlist = preprocess_playlist(self.working_dir, generate_playlist(50, private_ratio=0))
+        for entry in playlist.playlist_data['entries']:
+            playlist.set_tagged({'id': entry['id']})
+
+        statuses = [entry['status'] for entry in playlist.state_store.load_playlist('benchmark')['entries']]
+        self.assertEqual([YDLQueueStatus.finished.value] * 50, statuses)
+
+    def test_metadata_tags_and_renames_songs(self):
+        pl_data = generate_playlist(5, private_ratio=0)
+        for audio_codec in TAG_CODECS:
+            download_dir = os.path.join(self.working_dir, audio_codec)
+            os.makedirs(download_dir)
+            for entry in pl_data['entries']:
+                CREATORS[audio_codec](os.path.join(download_dir, '{}.{}'.format(entry['id'], audio_codec)), os.urandom(4096))
+            editor = MetadataEditor(audio_codec=audio_codec, no_artwork=True, no_album_title=False, no_album_artist=False,
+                                    no_track_number=False, no_composer=False, no_compilation=False, verbose=False)
+
+            editor.update(download_dir=download_dir, pl_data=pl_data, is_playlist=True)
+
+            for track_number, entry in enumerate(pl_data['entries'], 1):
+                audio_file = os.path.join(download_dir, '{}.{}'.format(entry['title'], audio_codec))
+                handler = find_handler(audio_file)
+                audio = handler.open(audio_file)
+                self.assertEqual(track_number, handler.get(audio, 'track_number'))
+                self.assertEqual(pl_data['title'], handler.get(audio, 'album'))
+
+    def test_cleanup_deletes_empty_files(self):
+        playlist = Playlist(download_url=None, working_dir=self.working_dir)
+        playlist.download_dir = self.working_dir
+        for index in range(10):
+            with open(os.path.join(self.working_dir, 'id{:09d}.m4a'.format(index)), 'wb') as f:
+                f.write(b'' if index % 2 == 0 else b'\0' * 16)
+
+        playlist.cleanup()
+        self.assertEqual(['id{:09d}.m4a'.format(index) for index in range(1, 10, 2)], sorted(os.listdir(self.working_dir)))
+
+    def test_run_suite_measures_every_case(self):
+        results = run_suite([10], [2], repeat=1)
+
+        names = [name for name, _, _ in results]
+        self.assertEqual(CALIBRATION, names[0])
+        self.assertEqual({'merge', 'state_save', 'state_load', 'state_status', 'set_tagged', 'cleanup'} | {'metadata_{}'.format(audio_codec) for audio_codec in TAG_CODECS},
+                         set(names[1:]))
+        self.assertTrue(all(elapsed > 0 for _, _, elapsed in results))
+
+    def test_is_regressed(self):
+        self.assertFalse(is_regressed(1.2, None, 0.25))
+        self.assertFalse(is_regressed(1.2, 1.0, 0.25))
+        self.assertTrue(is_regressed(1.3, 1.0, 0.25))
+        # Differences within noise are not regressions whatever the ratio is
+        self.assertFalse(is_regressed(0.0002, 0.0001, 0.25))
+
+
+if __name__ == '__main__':
+    unittest.main()
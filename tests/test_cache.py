@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from music_dl.core.cache import ExtractionCache
+
+
+class TestExtractionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_make_key(self):
+        self.assertEqual(ExtractionCache.make_key('https://www.youtube.com/playlist?list=PL1&feature=share'),
+                         ExtractionCache.make_key('HTTPS://m.youtube.com/playlist/?list=PL1'))
+        self.assertNotEqual(ExtractionCache.make_key('https://www.youtube.com/playlist?list=PL1'),
+                            ExtractionCache.make_key('https://www.youtube.com/playlist?list=PL2'))
+        self.assertNotEqual(ExtractionCache.make_key('https://www.youtube.com/playlist?list=PL1'),
+                            ExtractionCache.make_key('https://www.youtube.com/playlist?list=PL1', 2, 10))
+
+    def test_data_expires_after_ttl(self):
+        cache = ExtractionCache(self.working_dir, ttl=60)
+        cache.put('key', {'id': 'PL1', 'entries': [{'id': 'a'}]})
+        self.assertEqual({'id': 'PL1', 'entries': [{'id': 'a'}]}, cache.get('key'))
+
+        now = time.time()
+        with mock.patch('time.time', return_value=now + 59):
+            self.assertIsNotNone(cache.get('key'))
+        with mock.patch('time.time', return_value=now + 61):
+            self.assertIsNone(cache.get('key'))
+        # Expired data is deleted
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_data_is_evicted(self):
+        data = {'entries': ['x' * 1000]}
+        cache = ExtractionCache(self.working_dir, ttl=60, max_size=3500)
+        now = time.time()
+        for index, cache_key in enumerate(['a', 'b', 'c']):
+            with mock.patch('time.time', return_value=now + index):
+                cache.put(cache_key, data)
+        with mock.patch('time.time', return_value=now + 3):
+            cache.get('a')
+        with mock.patch('time.time', return_value=now + 4):
+            cache.put('d', data)
+
+        self.assertIsNone(cache.get('b'))
+        for cache_key in ['a', 'c', 'd']:
+            self.assertEqual(data, cache.get(cache_key), cache_key)
+
+    def test_data_larger_than_cache_is_not_cached(self):
+        cache = ExtractionCache(self.working_dir, ttl=60, max_size=100)
+        cache.put('key', {'entries': ['x' * 1000]})
+        self.assertIsNone(cache.get('key'))
+
+    def test_zero_ttl_disables_cache(self):
+        cache = ExtractionCache(self.working_dir, ttl=0)
+        cache.put('key', {'id': 'PL1'})
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get('key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.bench_tag import CREATORS
+from music_dl.core.codec import BEST, HANDLERS, cap_bitrate, find_handler, get_codecs, get_extension, get_format, get_handler, resolve_codec
+
+
+class TestCodecHandlers(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_tags_round_trip(self):
+        artwork = (b'\xff\xd8\xff\xe0' + b'\0' * 1024, 'image/jpeg')
+        values = {'track_number': 3, 'artwork': artwork, 'album': 'Album', 'album_artist': 'Artist', 'composer': 'YoutubeTab', 'compilation': True}
+
+        for audio_codec, create in CREATORS.items():
+            audio_file = os.path.join(self.working_dir, 'song.{}'.format(HANDLERS[audio_codec].extension))
+            create(audio_file, os.urandom(4096))
+            handler = find_handler(audio_file)
+            self.assertIs(HANDLERS[audio_codec], handler)
+
+            audio = handler.open(audio_file)
+            for field, value in values.items():
+                self.assertIsNone(handler.get(audio, field), (audio_codec, field))
+                handler.put(audio, field, value)
+            handler.save(audio, padding=lambda info: 1024)
+
+            audio = handler.open(audio_file)
+            for field, value in values.items():
+                self.assertEqual(value, handler.get(audio, field), (audio_codec, field))
+
+            handler.delete(audio, 'composer')
+            handler.save(audio, padding=lambda info: 1024)
+            self.assertIsNone(handler.get(handler.open(audio_file), 'composer'), audio_codec)
+
+    def test_find_handler(self):
+        self.assertIs(HANDLERS['m4a'], find_handler('/music/Song.M4A'))
+        self.assertIs(HANDLERS['flac'], find_handler('Song.flac'))
+        self.assertIsNone(find_handler('Song.webm'))
+
+    def test_best_codec_keeps_source_codec(self):
+        self.assertIn(BEST, get_codecs())
+        self.assertEqual('m4a', resolve_codec(BEST, 'mp4a.40.2'))
+        self.assertEqual('opus', resolve_codec(BEST, 'opus'))
+        # Codecs which are not written are encoded to mp3 as youtube-dl does
+        self.assertEqual('mp3', resolve_codec(BEST, 'ac-3'))
+        self.assertEqual('flac', resolve_codec('flac', 'opus'))
+        self.assertEqual('m4a', get_extension(BEST, 'mp4a.40.2'))
+        self.assertEqual('mp3', get_extension('mp3'))
+
+    def test_ffmpeg_options(self):
+        handler = get_handler('m4a')
+        self.assertEqual(['-acodec', 'copy', '-bsf:a', 'aac_adtstoasc'], handler.ffmpeg_options(198, 'mp4a.40.2'))
+        self.assertEqual(['-acodec', 'aac', '-b:a', '198k', '-bsf:a', 'aac_adtstoasc'], handler.ffmpeg_options(198, 'opus'))
+        # Opus is remuxed into ogg without encoding
+        self.assertEqual(['-acodec', 'copy'], get_handler(BEST, 'opus').ffmpeg_options(198, 'opus'))
+        # Bitrate is not specified to lossless encoders
+        self.assertNotIn('-b:a', get_handler('flac').ffmpeg_options(198, 'opus'))
+
+
+class TestFormatSelection(unittest.TestCase):
+
+    def test_format_prefers_source_codec(self):
+        self.assertEqual('bestaudio[acodec^=mp4a]/bestaudio/best', get_format('m4a'))
+        self.assertEqual('bestaudio[acodec^=mp4a]/bestaudio/best', get_format('aac'))
+        self.assertEqual('bestaudio[acodec=opus]/bestaudio/best', get_format('opus'))
+        self.assertEqual('bestaudio[acodec=mp3]/bestaudio/best', get_format('mp3'))
+        self.assertEqual('bestaudio/best', get_format(BEST))
+
+    def test_cap_bitrate(self):
+        self.assertEqual(198, cap_bitrate(198))
+        self.assertEqual(198, cap_bitrate(198, 0))
+        self.assertEqual(198, cap_bitrate(198, 256.0))
+        self.assertEqual(129, cap_bitrate(198, 128.6))
+
+    def test_encoded_bitrate_is_capped_by_source(self):
+        self.assertEqual(['-acodec', 'libmp3lame', '-b:a', '129k'], get_handler('mp3').ffmpeg_options(198, 'opus', 128.6))
+        self.assertEqual(['-acodec', 'libmp3lame', '-b:a', '198k'], get_handler('mp3').ffmpeg_options(198, 'opus', 256.0))
+        self.assertEqual(['-acodec', 'libmp3lame', '-b:a', '198k'], get_handler('mp3').ffmpeg_options(198, 'opus'))
+        # Audio copied without encoding keeps its own bitrate
+        self.assertEqual(['-acodec', 'copy'], get_handler('mp3').ffmpeg_options(198, 'mp3', 128.6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from benchmarks.bench_merge import BENCHMARK_URL
+from music_dl.MusicDL import MusicDL
+from music_dl.core.metadata import MetadataEditor
+from music_dl.lib.log import logger, log_buffer, LogSequencer
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self, logging.INFO)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestOrderedLog(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        logger.addHandler(self.handler)
+
+    def tearDown(self):
+        logger.removeHandler(self.handler)
+
+    @staticmethod
+    def log_song(index):
+        # Songs queued later often finish first
+        time.sleep(random.uniform(0, 0.02))
+        logger.info('[Song:{}] Started.'.format(index))
+        time.sleep(random.uniform(0, 0.02))
+        logger.info('[Song:{}] Updated.'.format(index))
+
+    @staticmethod
+    def expected_messages(count):
+        return [message.format(index) for index in range(1, count + 1) for message in ['[Song:{}] Started.', '[Song:{}] Updated.']]
+
+    def test_sequencer_prints_songs_in_order_queued(self):
+        sequencer = LogSequencer()
+
+        def process(index, sequence):
+            log_buffer.begin()
+            try:
+                self.log_song(index)
+            finally:
+                sequencer.release(sequence, log_buffer.end())
+
+        threads = [threading.Thread(target=process, args=(index, sequencer.reserve())) for index in range(1, 21)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.expected_messages(20), self.handler.messages)
+
+    def test_records_are_printed_unless_buffering(self):
+        log_buffer.begin()
+        logger.info('Held.')
+        self.assertEqual([], self.handler.messages)
+        records = log_buffer.end()
+        logger.info('Printed.')
+        self.assertEqual(['Printed.'], self.handler.messages)
+        self.assertEqual(['Held.'], [record.getMessage() for record in records])
+
+    def test_concurrent_metadata_update_prints_songs_in_order_of_tracks(self):
+        editor = MetadataEditor(audio_codec='m4a', no_artwork=True, no_album_title=False, no_album_artist=False,
+                                no_track_number=False, no_composer=False, no_compilation=False, verbose=False, tag_jobs=4)
+        pl_data = {'title': 'Test', 'entries': [{'id': str(index), 'track_number': index} for index in range(1, 21)]}
+        tagged = []
+
+        def update_entry(track_number, **kwargs):
+            self.log_song(track_number)
+            return True
+
+        with mock.patch.object(editor, 'update_entry', side_effect=update_entry):
+            editor.update(download_dir=None, pl_data=pl_data, is_playlist=True, tagged_hook=lambda entry: tagged.append(entry['id']))
+
+        self.assertEqual(['Updating metadata...'] + self.expected_messages(20) + ['Done.'], self.handler.messages)
+        self.assertEqual([str(index) for index in range(1, 21)], tagged)
+
+    def test_pipelined_metadata_update_prints_songs_in_order_queued(self):
+        working_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, working_dir, True)
+        music_dl = MusicDL(download_url=BENCHMARK_URL, working_dir=working_dir, cache_ttl=0, no_artwork=True, tag_jobs=4, test_id='test')
+
+        def download(processed_hook=None, metadata_editor=None):
+            # Songs are handed off by download workers one after another
+            for index in range(1, 21):
+                processed_hook({'id': str(index)}, index, index, 20)
+            return True
+
+        def update_entry(track_number, **kwargs):
+            self.log_song(track_number)
+            return True
+
+        with mock.patch.object(music_dl.playlist, 'preprocess', return_value=working_dir), \
+                mock.patch.object(music_dl.playlist, 'download', side_effect=download), \
+                mock.patch.object(music_dl.playlist, 'cleanup'), \
+                mock.patch.object(music_dl.playlist, 'set_tagged'), \
+                mock.patch.object(music_dl.metadata_editor, 'update_entry', side_effect=update_entry):
+            music_dl.process()
+
+        self.assertEqual(self.expected_messages(20), [message for message in self.handler.messages if message.startswith('[Song:')])
+
+
+if __name__ == '__main__':
+    unittest.main()
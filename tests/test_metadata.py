@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from mutagen._tags import PaddingInfo
+
+from benchmarks.bench_merge import generate_playlist
+from benchmarks.bench_tag import CREATORS, StaticArtworkCache, bytes_rewritten
+from music_dl.RetagDL import RetagDL
+from music_dl.core.codec import find_handler
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.state import StateStore
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+AUDIO_SIZE = 256 * 1024
+
+
+class TestTagPadding(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_padding_callback(self):
+        editor = self.__editor('mp3', tag_padding=64 * 1024)
+        padding = editor._MetadataEditor__padding
+
+        # Existing padding is kept, so tags are rewritten in place
+        self.assertEqual(500, padding(PaddingInfo(500, AUDIO_SIZE)))
+        self.assertEqual(0, padding(PaddingInfo(0, AUDIO_SIZE)))
+        # Budget is reserved when tags do not fit
+        self.assertEqual(64 * 1024, padding(PaddingInfo(-10, AUDIO_SIZE)))
+        self.assertEqual(0, self.__editor('mp3', tag_padding=-1)._MetadataEditor__padding(PaddingInfo(-10, AUDIO_SIZE)))
+
+        info = PaddingInfo(-10, AUDIO_SIZE)
+        self.assertEqual(info.get_default_padding(), self.__editor('mp3', tag_padding=None)._MetadataEditor__padding(info))
+
+    def test_tags_grown_within_budget_are_rewritten_in_place(self):
+        for audio_codec in CREATORS:
+            tag_size, retag_size, rewritten = self.__tag_twice(audio_codec, tag_padding=64 * 1024, artwork_growth=16 * 1024)
+
+            self.assertEqual(tag_size, retag_size, audio_codec)
+            # Audio data following the tags is not moved
+            self.assertLess(rewritten, AUDIO_SIZE, audio_codec)
+
+    def test_tags_grown_beyond_padding_move_audio_data(self):
+        for audio_codec in CREATORS:
+            tag_size, retag_size, rewritten = self.__tag_twice(audio_codec, tag_padding=1024, artwork_growth=16 * 1024)
+
+            self.assertGreater(retag_size, tag_size, audio_codec)
+            self.assertGreater(rewritten, AUDIO_SIZE, audio_codec)
+
+    def __tag_twice(self, audio_codec, tag_padding, artwork_growth):
+        """
+        :rtype (int, int, int)
+        :return: (File size after tagging, File size after re-tagging with larger artwork, Bytes rewritten by re-tagging)
+        """
+        audio_file = os.path.join(self.working_dir, 'id.{}'.format(audio_codec))
+        CREATORS[audio_codec](audio_file, os.urandom(AUDIO_SIZE))
+        editor = self.__editor(audio_codec, tag_padding)
+
+        contents = []
+        for artwork_length in [4096, 4096 + artwork_growth]:
+            editor.artwork_cache.artwork = (b'\xff\xd8\xff\xe0' + os.urandom(artwork_length), 'image/jpeg')
+            self.assertTrue(editor.update_entry(self.working_dir, {'id': 'id', 'title': 'id'}, {'title': 'Album', 'uploader': 'Artist'}, is_playlist=True, track_number=1))
+            with open(audio_file, 'rb') as f:
+                contents.append(f.read())
+
+        return len(contents[0]), len(contents[1]), bytes_rewritten(contents[0], contents[1])
+
+    @staticmethod
+    def __editor(audio_codec, tag_padding):
+        return MetadataEditor(audio_codec=audio_codec, no_artwork=False, no_album_title=False, no_album_artist=False,
+                              no_track_number=False, no_composer=False, no_compilation=False, verbose=False,
+                              artwork_cache=StaticArtworkCache(), tag_padding=tag_padding)
+
+
+class TestRetag(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('pkg_resources.require', mock.Mock(return_value=['music_dl 0.2.1']))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.working_dir = tempfile.mkdtemp()
+        self.playlist_dir = os.path.join(self.working_dir, 'Benchmark')
+        os.makedirs(self.playlist_dir)
+
+        # Songs of the folder are saved in every format, so each handler compares tags of its own
+        pl_data = generate_playlist(len(CREATORS), private_ratio=0)
+        for track_number, (entry, (audio_codec, create)) in enumerate(zip(pl_data['entries'], CREATORS.items()), 1):
+            entry.update(status=YDLQueueStatus.finished.value, track_number=track_number)
+            create(os.path.join(self.playlist_dir, '{}.{}'.format(entry['id'], audio_codec)), os.urandom(4096))
+        state_store = StateStore(self.working_dir)
+        state_store.save_playlist('Benchmark', pl_data)
+        state_store.save_downloaded('Benchmark', pl_data)
+        state_store.close()
+
+        RetagDL(self.playlist_dir, no_artwork=True).retag()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_retag_without_changes_writes_nothing(self):
+        before = self.__snapshot()
+        self.assertEqual(sorted('Song {}.{}'.format(index, audio_codec) for index, audio_codec in enumerate(CREATORS, 1)), sorted(before))
+
+        with self.assertLogs('music_dl', level='INFO') as logs:
+            RetagDL(self.playlist_dir, no_artwork=True).retag()
+
+        self.assertEqual(before, self.__snapshot())
+        self.assertEqual(len(CREATORS), len([output for output in logs.output if output.endswith('Up to date.')]))
+        self.assertFalse([output for output in logs.output if output.endswith('Updated.')])
+
+    def test_retag_removes_forbidden_tags(self):
+        before = self.__snapshot()
+
+        RetagDL(self.playlist_dir, no_artwork=True, no_composer=True).retag()
+
+        after = self.__snapshot()
+        for filename in before:
+            self.assertNotEqual(before[filename], after[filename], filename)
+            audio_file = os.path.join(self.playlist_dir, filename)
+            handler = find_handler(audio_file)
+            audio = handler.open(audio_file)
+            self.assertIsNone(handler.get(audio, 'composer'), filename)
+            self.assertEqual('Benchmark', handler.get(audio, 'album'), filename)
+
+    def __snapshot(self):
+        """
+        :rtype dict
+        :return: Dictionary that maps filename and (content, modification time) of songs in the playlist folder
+        """
+        snapshot = {}
+        for filename in os.listdir(self.playlist_dir):
+            audio_file = os.path.join(self.playlist_dir, filename)
+            with open(audio_file, 'rb') as f:
+                snapshot[filename] = (f.read(), os.stat(audio_file).st_mtime_ns)
+        return snapshot
+
+
+if __name__ == '__main__':
+    unittest.main()
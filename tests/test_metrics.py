@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from music_dl.core.metrics import MetricsRecorder, PROMETHEUS_FILENAME, TRACKS_FILENAME
+
+
+class TestMetricsRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+    def record(self):
+        recorder = MetricsRecorder()
+        recorder.add('PL1', 'a', bytes=1000, download_seconds=2.0)
+        recorder.add('PL1', 'a', bytes=1000, download_seconds=2.0, retries=1)
+        recorder.add('PL1', 'a', tag_seconds=0.5)
+        recorder.set('PL1', 'a', status='finished')
+        recorder.set('PL1', 'b', status='failed')
+        with recorder.phase('download'):
+            pass
+        return recorder
+
+    def read_lines(self):
+        with open(os.path.join(self.metrics_dir, TRACKS_FILENAME), encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_jsonl(self):
+        recorder = self.record()
+        recorder.write(self.metrics_dir)
+        track_a, track_b, run = self.read_lines()
+
+        self.assertEqual({'type': 'track', 'run_id': recorder.run_id, 'playlist': 'PL1', 'id': 'a', 'status': 'finished',
+                          'bytes': 2000, 'download_seconds': 4.0, 'transcode_seconds': 0, 'tag_seconds': 0.5, 'rename_seconds': 0,
+                          'retries': 1, 'throughput': 500.0}, track_a)
+        self.assertEqual('failed', track_b['status'])
+        self.assertIsNone(track_b['throughput'])
+        self.assertEqual('run', run['type'])
+        self.assertEqual(recorder.run_id, run['run_id'])
+        self.assertEqual(2, run['tracks'])
+        self.assertEqual(['download'], list(run['phases']))
+
+    def test_jsonl_is_appended_by_each_run(self):
+        self.record().write(self.metrics_dir)
+        self.record().write(self.metrics_dir)
+        lines = self.read_lines()
+        self.assertEqual(6, len(lines))
+        self.assertEqual(2, len({line['run_id'] for line in lines}))
+
+    def test_prometheus(self):
+        self.record().write(self.metrics_dir)
+        with open(os.path.join(self.metrics_dir, PROMETHEUS_FILENAME), encoding='utf-8') as f:
+            samples = dict(line.rsplit(' ', 1) for line in f.read().splitlines() if not line.startswith('#'))
+
+        self.assertEqual('1', samples['music_dl_tracks{status="finished"}'])
+        self.assertEqual('1', samples['music_dl_tracks{status="failed"}'])
+        self.assertEqual('2000', samples['music_dl_downloaded_bytes'])
+        self.assertEqual('4.0', samples['music_dl_download_seconds'])
+        self.assertEqual('500.0', samples['music_dl_throughput_bytes_per_second'])
+        self.assertEqual('1', samples['music_dl_retries'])
+        self.assertIn('music_dl_phase_seconds{phase="download"}', samples)
+        self.assertEqual([], [name for name in os.listdir(self.metrics_dir) if name.endswith('.temp')])
+
+
+if __name__ == '__main__':
+    unittest.main()
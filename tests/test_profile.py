@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest import mock
+
+from music_dl.core import profile
+from music_dl.core.args import parse_args
+from music_dl.core.profile import PhaseProfiler, PROFILE_PREFIX
+
+
+def work_in_phase():
+    return [bytearray(1024) for _ in range(100)]
+
+
+def work_in_thread():
+    return sum(range(10000))
+
+
+class TestPhaseProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def profile_phase(self, profiler):
+        with profiler.phase('download'):
+            data = work_in_phase()
+            thread = threading.Thread(target=work_in_thread)
+            thread.start()
+            thread.join()
+        return data
+
+    @staticmethod
+    def function_names(stats):
+        return {function for _, _, function in stats.stats}
+
+    def test_write(self):
+        profiler = PhaseProfiler()
+        self.profile_phase(profiler)
+        paths = profiler.write(self.profile_dir)
+
+        self.assertEqual([os.path.join(self.profile_dir, '{}.download.pstats'.format(PROFILE_PREFIX)),
+                          os.path.join(self.profile_dir, '{}.alloc.txt'.format(PROFILE_PREFIX))], paths)
+        self.assertIn('work_in_phase', self.function_names(pstats.Stats(paths[0])))
+        with open(paths[1], encoding='utf-8') as f:
+            self.assertTrue(f.readline().startswith('[Phase:download] Peak '))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @unittest.skipUnless(profile.PER_THREAD_PROFILERS, 'Threads are profiled separately before Python 3.12')
+    def test_threads_are_profiled(self):
+        profiler = PhaseProfiler()
+        self.profile_phase(profiler)
+        self.assertIn('work_in_thread', self.function_names(profiler.stats['download']))
+
+    def test_single_profiler(self):
+        profiler = PhaseProfiler()
+        with mock.patch.object(profile, 'PER_THREAD_PROFILERS', False), mock.patch('threading.setprofile') as setprofile:
+            self.profile_phase(profiler)
+        setprofile.assert_not_called()
+        self.assertIn('work_in_phase', self.function_names(profiler.stats['download']))
+
+    def test_tracemalloc_without_reset_peak(self):
+        # Python older than 3.9
+        names = [name for name in dir(tracemalloc) if name != 'reset_peak']
+        profiler = PhaseProfiler()
+        with mock.patch.object(profile, 'tracemalloc', mock.Mock(spec=names, wraps=tracemalloc)):
+            self.profile_phase(profiler)
+        self.assertGreater(profiler.allocations['download'][0], 0)
+
+
+# Version is read from the installed distribution
+@mock.patch('pkg_resources.require', mock.Mock(return_value=[mock.Mock(version='0.2.1')]))
+class TestProfileArguments(unittest.TestCase):
+
+    def test_profile_with_single_url(self):
+        with mock.patch('sys.argv', ['music-dl', '--url', 'https://www.youtube.com/watch?v=abcdefghijk', '--profile']):
+            self.assertTrue(parse_args().profile)
+
+    def test_profile_with_batch_file_is_rejected(self):
+        for option in ['--batch-file', '--retag']:
+            with mock.patch('sys.argv', ['music-dl', option, 'path', '--profile']), mock.patch('sys.stderr'):
+                with self.assertRaises(SystemExit):
+                    parse_args()
+
+
+if __name__ == '__main__':
+    unittest.main()
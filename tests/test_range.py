@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import shutil
+import tempfile
+import unittest
+
+from youtube_dl.utils import OnDemandPagedList
+
+from benchmarks.bench_merge import generate_playlist, preprocess_playlist
+from music_dl.core.youtube_dl import YDLHelper
+
+
+class TestSliceEntries(unittest.TestCase):
+
+    def test_list(self):
+        entries = list(range(1, 11))
+        self.assertEqual([3, 4, 5], list(YDLHelper.slice_entries(entries, 3, 5)))
+        self.assertEqual([9, 10], list(YDLHelper.slice_entries(entries, 9)))
+
+    def test_paged_list(self):
+        fetched_pages = []
+
+        def fetch_page(page):
+            fetched_pages.append(page)
+            return range(page * 10 + 1, page * 10 + 11)
+
+        entries = OnDemandPagedList(fetch_page, 10)
+        self.assertEqual([25, 26, 27], list(YDLHelper.slice_entries(entries, 25, 27)))
+        # Only the page covering the range is fetched
+        self.assertEqual([2], fetched_pages)
+
+    def test_generator(self):
+        yielded = []
+
+        def generate():
+            for entry in range(1, 1001):
+                yielded.append(entry)
+                yield entry
+
+        self.assertEqual([3, 4, 5], list(YDLHelper.slice_entries(generate(), 3, 5)))
+        # Generator stops at the end of the range
+        self.assertEqual([1, 2, 3, 4, 5], yielded)
+
+
+class TestRangeTrackNumbers(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def generate_playlist(self):
+        # The second entry is private, so songs after it are numbered one less than their position
+        pl_data = generate_playlist(8, private_ratio=0)
+        pl_data['entries'][1]['title'] = '[Private video]'
+        return pl_data
+
+    @staticmethod
+    def track_numbers(playlist):
+        return {entry['id']: entry['track_number'] for entry in playlist.playlist_data['entries']}
+
+    def test_range_keeps_track_numbers_of_whole_playlist(self):
+        full_numbers = self.track_numbers(preprocess_playlist(self.working_dir, self.generate_playlist()))
+        self.assertEqual(3, full_numbers['id000000003'])
+
+        playlist = preprocess_playlist(self.working_dir, self.generate_playlist(), playlist_start=3, playlist_end=6)
+        self.assertEqual({entry_id: full_numbers[entry_id] for entry_id in ['id000000002', 'id000000003', 'id000000004', 'id000000005']},
+                         self.track_numbers(playlist))
+
+    def test_new_entries_in_range_are_numbered_by_position(self):
+        preprocess_playlist(self.working_dir, self.generate_playlist())
+
+        pl_data = self.generate_playlist()
+        pl_data['entries'][4] = dict(pl_data['entries'][4], id='new', url='new')
+        playlist = preprocess_playlist(self.working_dir, pl_data, playlist_start=4, playlist_end=6)
+        self.assertEqual({'id000000003': 3, 'new': 5, 'id000000005': 5}, self.track_numbers(playlist))
+
+    def test_range_of_playlist_never_enumerated_is_numbered_by_position(self):
+        playlist = preprocess_playlist(self.working_dir, self.generate_playlist(), playlist_start=3, playlist_end=4)
+        self.assertEqual({'id000000002': 3, 'id000000003': 4}, self.track_numbers(playlist))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+from benchmarks.bench_ratelimit import QuietLogger, bench_ratelimit
+from music_dl.core.ratelimit import AdaptiveConcurrency, RateLimiter, TokenBucket
+from music_dl.core.youtube_dl import YDLRateLimited
+
+
+class RecordingServer(ThreadingHTTPServer):
+    """
+    Stand-in for a site which records when requests arrive, and responds with HTTP 429 to the first requests
+    """
+
+    def __init__(self, throttled=0, retry_after=None):
+        super().__init__(('127.0.0.1', 0), RecordingHandler)
+        self.throttled = throttled
+        self.retry_after = retry_after
+        self.requested_at = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/song'.format(self.server_address[1])
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requested_at.append(time.monotonic())
+            is_throttled = len(self.server.requested_at) <= self.server.throttled
+
+        self.send_response(429 if is_throttled else 200)
+        if is_throttled and self.server.retry_after is not None:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def start_server(self, **kwargs):
+        server = RecordingServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    @staticmethod
+    def create_ydl(host_limiter):
+        return YDLRateLimited(params={'logger': QuietLogger(), 'noprogress': True}, host_limiter=host_limiter)
+
+    def test_token_bucket_spaces_requests(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started_at = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # First token is in the bucket, and the rest are refilled at the rate
+        self.assertGreaterEqual(time.monotonic() - started_at, 5 / 20 * 0.9)
+
+    def test_requests_to_site_are_spaced_by_request_rate(self):
+        server = self.start_server()
+        host_limiter = RateLimiter(request_rate=10).get(server.url)
+        ydl = self.create_ydl(host_limiter)
+
+        for _ in range(15):
+            ydl.urlopen(server.url).read()
+
+        # Ten requests are sent as a burst, and the rest are sent at the rate
+        self.assertEqual(15, len(server.requested_at))
+        self.assertGreaterEqual(server.requested_at[-1] - server.requested_at[0], 5 / 10 * 0.9)
+
+    def test_throttled_response_pauses_requests_and_reduces_concurrency(self):
+        server = self.start_server(throttled=1, retry_after=1)
+        host_limiter = RateLimiter(max_concurrency=8).get(server.url)
+        ydl = self.create_ydl(host_limiter)
+
+        with self.assertRaises(HTTPError) as context:
+            ydl.urlopen(server.url)
+        self.assertEqual(429, context.exception.code)
+        self.assertEqual(4, int(host_limiter.concurrency.limit))
+
+        # Request after the 429 waits for the seconds the site asked
+        ydl.urlopen(server.url).read()
+        self.assertGreaterEqual(server.requested_at[1] - server.requested_at[0], 0.9)
+
+    def test_concurrency_is_not_decreased_again_while_cooling_down(self):
+        concurrency = AdaptiveConcurrency(max_limit=8, cooldown=60)
+        self.assertTrue(concurrency.decrease())
+        self.assertFalse(concurrency.decrease())
+        self.assertEqual(4, int(concurrency.limit))
+
+    def test_concurrency_is_increased_after_successful_downloads(self):
+        concurrency = AdaptiveConcurrency(max_limit=4, cooldown=0)
+        concurrency.decrease()
+        concurrency.decrease()
+        self.assertEqual(1, int(concurrency.limit))
+        self.assertTrue(concurrency.increase())
+        self.assertEqual(2, int(concurrency.limit))
+        # Limit grows by one after about as many downloads as the limit, up to the maximum
+        for _ in range(20):
+            concurrency.increase()
+        self.assertEqual(4.0, concurrency.limit)
+
+    def test_concurrency_is_reduced_by_throttling_site(self):
+        # Site allows one song at a time, and eight songs are started at once by four workers
+        elapsed, downloaded, throttled, limit = bench_ratelimit(songs=8, jobs=4, allowed=1, size=256 * 1024, adaptive=True)
+        self.assertGreater(throttled, 0)
+        self.assertGreater(downloaded, 0)
+        self.assertLess(limit, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.bench_merge import generate_playlist, preprocess_playlist
+from music_dl.core.error import PlaylistDownloadException
+from music_dl.core.playlist import Playlist
+from music_dl.core.scheduler import DownloadScheduler
+from music_dl.core.transcode import Transcoder
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+is_download_complete = Playlist._Playlist__is_download_complete
+
+
+class TestDownloadCompletion(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.downloaded_file = os.path.join(self.working_dir, 'id0001.webm')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def write(self, size):
+        with open(self.downloaded_file, 'wb') as f:
+            f.write(b'\0' * size)
+
+    def test_complete_file(self):
+        self.write(1000)
+        self.assertTrue(is_download_complete({'filepath': self.downloaded_file, 'filesize': 1000}))
+        # Size is not reported by every site
+        self.assertTrue(is_download_complete({'filepath': self.downloaded_file}))
+        self.assertTrue(is_download_complete({'filepath': self.downloaded_file, 'filesize': None}))
+
+    def test_truncated_file(self):
+        self.write(999)
+        self.assertFalse(is_download_complete({'filepath': self.downloaded_file, 'filesize': 1000}))
+
+    def test_empty_file(self):
+        self.write(0)
+        self.assertFalse(is_download_complete({'filepath': self.downloaded_file}))
+
+    def test_missing_file(self):
+        self.assertFalse(is_download_complete({'filepath': self.downloaded_file, 'filesize': 1000}))
+        self.assertFalse(is_download_complete({}))
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.playlist = preprocess_playlist(self.working_dir, generate_playlist(1, private_ratio=0))
+
+        # Attributes set by Playlist.download
+        self.playlist.transcoder = Transcoder(workers=1)
+        self.playlist.running_scheduler = DownloadScheduler()
+        self.playlist.transcode_futures = []
+
+        self.entry = self.playlist.playlist_data['entries'][0]
+        self.data = {'id': self.entry['id'], 'title': 'Song 1', 'acodec': 'opus', 'ext': 'webm', 'filesize': 1000,
+                     'filepath': os.path.join(self.playlist.download_dir, '{}.webm'.format(self.entry['id']))}
+
+    def tearDown(self):
+        self.playlist.running_scheduler.shutdown()
+        self.playlist.state_store.close()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def write(self, size):
+        with open(self.data['filepath'], 'wb') as f:
+            f.write(b'\0' * size)
+
+    def test_truncated_download_is_removed_and_failed(self):
+        self.write(999)
+
+        with self.assertRaises(PlaylistDownloadException):
+            self.playlist._Playlist__transcode_hook(self.data)
+
+        self.assertFalse(os.path.exists(self.data['filepath']))
+        self.assertEqual([], self.playlist.transcode_futures)
+        self.assertEqual(YDLQueueStatus.failed.value, self.playlist.state_store.get_status(self.playlist.playlist_key, self.entry['id']))
+
+    def test_complete_download_is_resumed(self):
+        self.write(1000)
+        self.playlist.state_store.save_downloaded(self.playlist.playlist_key, {'entries': [self.data]})
+
+        self.assertEqual(self.data, self.playlist._Playlist__load_downloaded_entry(self.entry, 1, 1))
+
+    def test_truncated_download_is_not_resumed(self):
+        self.write(999)
+        self.playlist.state_store.save_downloaded(self.playlist.playlist_key, {'entries': [self.data]})
+
+        self.assertIsNone(self.playlist._Playlist__load_downloaded_entry(self.entry, 1, 1))
+
+        os.remove(self.data['filepath'])
+        self.assertIsNone(self.playlist._Playlist__load_downloaded_entry(self.entry, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
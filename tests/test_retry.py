@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from urllib.error import HTTPError
+
+from youtube_dl.utils import GeoRestrictedError
+
+from benchmarks.bench_merge import BENCHMARK_URL, PlaylistYoutubeDL, generate_playlist
+from music_dl.core.playlist import Playlist
+from music_dl.core.retry import PERMANENT_MESSAGES, RetryPolicy
+from music_dl.core.state import StateStore
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_permanent_messages(self):
+        for permanent_message in PERMANENT_MESSAGES:
+            message = 'ERROR: abcdefghijk: {}.'.format(permanent_message.capitalize())
+            self.assertTrue(RetryPolicy.is_permanent(None, message), message)
+
+    def test_transient_messages(self):
+        for message in ['ERROR: unable to download video data: HTTP Error 429: Too Many Requests',
+                        'ERROR: unable to download video data: HTTP Error 503: Service Unavailable',
+                        'ERROR: Unable to download webpage: <urlopen error timed out>',
+                        'ERROR: Did not get any data blocks']:
+            self.assertFalse(RetryPolicy.is_permanent(None, message), message)
+
+    def test_permanent_errors(self):
+        self.assertTrue(RetryPolicy.is_permanent(GeoRestrictedError('The uploader has not made this video available in your country.')))
+        self.assertTrue(RetryPolicy.is_permanent(HTTPError('http://example.com', 404, 'Not Found', {}, None)))
+        self.assertTrue(RetryPolicy.is_permanent(HTTPError('http://example.com', 410, 'Gone', {}, None)))
+        self.assertFalse(RetryPolicy.is_permanent(HTTPError('http://example.com', 429, 'Too Many Requests', {}, None)))
+        self.assertFalse(RetryPolicy.is_permanent(HTTPError('http://example.com', 503, 'Service Unavailable', {}, None)))
+        self.assertFalse(RetryPolicy.is_permanent(None))
+
+    def test_backoff_schedule(self):
+        retry_policy = RetryPolicy(base_delay=2.0, max_delay=60.0)
+        for attempts, delay in [(1, 2.0), (2, 4.0), (3, 8.0), (4, 16.0), (5, 32.0), (6, 60.0), (100, 60.0)]:
+            # Jitter takes between half and all of the exponential delay
+            with mock.patch('random.uniform', side_effect=lambda low, high: low):
+                self.assertEqual(delay / 2, retry_policy.delay(attempts))
+            with mock.patch('random.uniform', side_effect=lambda low, high: high):
+                self.assertEqual(delay, retry_policy.delay(attempts))
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= retry_policy.delay(attempts) <= delay)
+
+    def test_transient_failure_is_retried_with_backoff(self):
+        retry_policy = RetryPolicy(base_delay=2.0, retry_wait=60.0)
+        failure = retry_policy.fail(None, None, 'ERROR: unable to download video data: HTTP Error 503: Service Unavailable')
+        self.assertEqual(1, failure['attempts'])
+        self.assertFalse(failure['is_permanent'])
+        self.assertTrue(retry_policy.is_retried_soon(failure))
+
+        now = time.time()
+        failure = retry_policy.fail(failure, None, 'ERROR: unable to download video data: HTTP Error 503: Service Unavailable')
+        self.assertEqual(2, failure['attempts'])
+        self.assertTrue(now + 2.0 <= failure['retry_at'] <= time.time() + 4.0)
+        self.assertFalse(retry_policy.is_due(failure, now))
+        self.assertTrue(retry_policy.is_due(failure, now + 4.0))
+
+    def test_quarantine_expires(self):
+        retry_policy = RetryPolicy(quarantine_ttl=3600.0)
+        now = time.time()
+        failure = retry_policy.fail(None, None, 'ERROR: Private video')
+        self.assertTrue(failure['is_permanent'])
+        self.assertFalse(retry_policy.is_retried_soon(failure))
+        self.assertFalse(retry_policy.is_due(failure, now + 3599.0))
+        self.assertTrue(retry_policy.is_due(failure, now + 3601.0))
+
+
+class TestRetryFailed(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.pl_data = generate_playlist(5, private_ratio=0)
+        failure = RetryPolicy().fail(None, None, 'ERROR: This video has been removed by the user.')
+        StateStore(self.working_dir).save_failure(self.pl_data['entries'][2]['id'], failure)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def preprocess(self, retry_failed):
+        playlist = Playlist(download_url=BENCHMARK_URL, working_dir=self.working_dir, cache_ttl=0, retry_failed=retry_failed, test_id='test')
+        playlist.ydl = PlaylistYoutubeDL(pl_data=dict(self.pl_data, entries=[dict(entry) for entry in self.pl_data['entries']]))
+        playlist.preprocess(playlist.download_url, self.working_dir)
+        return playlist
+
+    def test_quarantined_song_is_skipped(self):
+        playlist = self.preprocess(retry_failed=False)
+        self.assertEqual([1, 2, 4, 5], playlist.scheduled_queue_indices)
+        self.assertIn(self.pl_data['entries'][2]['id'], playlist.state_store.load_failures())
+
+    def test_retry_failed_clears_quarantine(self):
+        playlist = self.preprocess(retry_failed=True)
+        self.assertEqual([1, 2, 3, 4, 5], playlist.scheduled_queue_indices)
+        self.assertEqual({}, playlist.state_store.load_failures())
+
+
+if __name__ == '__main__':
+    unittest.main()
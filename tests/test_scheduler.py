@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+
+from music_dl.core.scheduler import DownloadScheduler
+
+
+class TestDownloadScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = DownloadScheduler(jobs=4)
+        self.lock = threading.Lock()
+        self.running = {}  # Dictionary that maps source id and number of downloads running at once
+        self.overlapped = []  # Source ids downloaded twice at once
+        self.calls = []
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def download(self, source_id, playlist_key, seconds=0.05):
+        with self.lock:
+            self.running[source_id] = self.running.get(source_id, 0) + 1
+            if self.running[source_id] > 1:
+                self.overlapped.append(source_id)
+            self.calls.append((source_id, playlist_key))
+        time.sleep(seconds)
+        with self.lock:
+            self.running[source_id] -= 1
+        return source_id, playlist_key
+
+    def test_same_song_is_not_downloaded_at_once(self):
+        futures = [self.scheduler.submit(source_id, self.download, source_id, playlist_key)
+                   for playlist_key in ['pA', 'pB', 'pC'] for source_id in ['a', 'b']]
+
+        self.assertEqual([(source_id, playlist_key) for playlist_key in ['pA', 'pB', 'pC'] for source_id in ['a', 'b']],
+                         [future.result(timeout=10) for future in futures])
+        self.assertEqual([], self.overlapped)
+        # Song of the first playlist is downloaded first, and the others after it
+        self.assertEqual({('a', 'pA'), ('b', 'pA')}, set(self.calls[:2]))
+
+    def test_different_songs_are_downloaded_concurrently(self):
+        started_at = time.monotonic()
+        futures = [self.scheduler.submit(source_id, self.download, source_id, 'pA', 0.2) for source_id in ['a', 'b', 'c', 'd']]
+        for future in futures:
+            future.result(timeout=10)
+        self.assertLess(time.monotonic() - started_at, 0.6)
+
+    def test_extended_work_defers_download(self):
+        transcoded = Future()
+        first = self.scheduler.submit('a', self.download, 'a', 'pA')
+        first.result(timeout=10)
+        self.scheduler.extend('a', transcoded)
+
+        second = self.scheduler.submit('a', self.download, 'a', 'pB')
+        time.sleep(0.1)
+        self.assertFalse(second.done())
+
+        transcoded.set_result(None)
+        self.assertEqual(('a', 'pB'), second.result(timeout=10))
+
+    def test_exception_is_set_on_deferred_future(self):
+        def fail():
+            raise ValueError('failed')
+
+        first = self.scheduler.submit('a', self.download, 'a', 'pA')
+        second = self.scheduler.submit('a', fail)
+        first.result(timeout=10)
+        with self.assertRaises(ValueError):
+            second.result(timeout=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
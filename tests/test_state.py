@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.bench_tag import CREATORS
+from music_dl.core.codec import find_handler
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.state import StateStore
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+
+def create_playlist(ids, status=YDLQueueStatus.ready.value):
+    return {
+        'id': 'PLtest',
+        'title': 'Test',
+        'extractor': 'youtube:tab',
+        'entries': [{'id': entry_id, 'title': 'Song {}'.format(entry_id), 'status': status, 'track_number': index}
+                    for index, entry_id in enumerate(ids, 1)],
+    }
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.state_store = StateStore(self.working_dir)
+
+    def tearDown(self):
+        self.state_store.close()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_playlist_round_trip(self):
+        pl_data = create_playlist(['a', 'b', 'a'])
+        pl_data['entries'][1]['status'] = YDLQueueStatus.finished.value
+        self.state_store.save_playlist('test', pl_data)
+
+        loaded = self.state_store.load_playlist('test')
+        self.assertEqual('Test', loaded['title'])
+        self.assertEqual([('a', 'ready', 1), ('b', 'finished', 2), ('a', 'ready', 3)],
+                         [(entry['id'], entry['status'], entry['track_number']) for entry in loaded['entries']])
+        # The same video may appear more than once on the playlist
+        self.assertEqual(['ready', 'ready'], list(self.state_store.load_queue_status('test')['a']))
+        self.assertIsNone(self.state_store.load_playlist('other'))
+
+    def test_status_and_downloaded_entries(self):
+        self.state_store.save_playlist('test', create_playlist(['a', 'b', 'c']))
+        self.state_store.set_status('test', 'b', YDLQueueStatus.downloaded.value)
+        self.state_store.save_downloaded('test', {'entries': [{'id': 'b', 'ext': 'webm'}, None]})
+
+        self.assertEqual(YDLQueueStatus.downloaded.value, self.state_store.get_status('test', 'b'))
+        self.assertEqual({'id': 'b', 'ext': 'webm'}, self.state_store.load_info('test', 'b'))
+        self.assertEqual([{'id': 'b', 'ext': 'webm', 'track_number': 2}], self.state_store.load_downloaded('test')['entries'])
+
+        # Entry data is kept when the playlist is saved again
+        self.state_store.save_playlist('test', create_playlist(['c', 'b']))
+        self.assertEqual({'id': 'b', 'ext': 'webm'}, self.state_store.load_info('test', 'b'))
+
+    def test_range_keeps_entries_out_of_range(self):
+        self.state_store.save_playlist('test', create_playlist(['a', 'b', 'c', 'd']))
+        pl_data = create_playlist(['x', 'y'], status=YDLQueueStatus.finished.value)
+        for entry in pl_data['entries']:
+            entry['track_number'] += 1
+        self.state_store.save_playlist('test', pl_data, 1, 3)
+
+        self.assertEqual(['a', 'x', 'y', 'd'], [entry['id'] for entry in self.state_store.load_playlist('test')['entries']])
+
+    def test_staged_entries_replace_playlist_when_finished(self):
+        self.state_store.save_playlist('test', create_playlist(['a', 'b'], status=YDLQueueStatus.finished.value))
+
+        self.state_store.begin_stream('test')
+        self.state_store.append_stream('test', [(0, {'id': 'b', 'status': 'finished', 'track_number': 1}), (1, {'id': 'c', 'track_number': 2})])
+        # Saved playlist is looked up until the enumeration completes
+        self.assertEqual(YDLQueueStatus.finished.value, self.state_store.get_status('test', 'a'))
+        self.assertIsNone(self.state_store.get_status('test', 'c'))
+        # Status of a staged entry is updated as well
+        self.state_store.set_status('test', 'c', YDLQueueStatus.downloaded.value)
+
+        self.state_store.finish_stream('test', {'id': 'PLtest', 'title': 'Test'})
+        self.assertEqual([('b', 'finished'), ('c', 'downloaded')],
+                         [(entry['id'], entry['status']) for entry in self.state_store.load_playlist('test')['entries']])
+
+    def test_staged_entries_are_discarded(self):
+        self.state_store.save_playlist('test', create_playlist(['a', 'b']))
+
+        self.state_store.begin_stream('test')
+        self.state_store.append_stream('test', [(0, {'id': 'c', 'track_number': 1})])
+        self.state_store.discard_stream('test')
+
+        self.assertEqual(['a', 'b'], [entry['id'] for entry in self.state_store.load_playlist('test')['entries']])
+        self.assertIsNone(self.state_store.get_status('test', 'c'))
+
+    def test_failures(self):
+        failure = {'error': 'DownloadError', 'message': 'Private video', 'attempts': 1, 'retry_at': 1.0, 'is_permanent': True}
+        self.state_store.save_failure('a', failure)
+        self.state_store.save_failure('b', dict(failure, is_permanent=False))
+        self.assertEqual({'a': failure, 'b': dict(failure, is_permanent=False)}, self.state_store.load_failures())
+
+        self.state_store.clear_failure('a')
+        self.assertEqual(['b'], list(self.state_store.load_failures()))
+        self.state_store.clear_failure()
+        self.assertEqual({}, self.state_store.load_failures())
+
+    def test_migrate_queued_json(self):
+        download_dir = os.path.join(self.working_dir, 'test')
+        os.makedirs(download_dir)
+        pl_data = create_playlist(['a', 'b', 'c'])
+        pl_data['entries'][0]['status'] = YDLQueueStatus.finished.value
+        # Files written by released versions
+        with open(os.path.join(download_dir, '.queued.json'), 'w') as f:
+            json.dump(pl_data, f)
+        with open(os.path.join(download_dir, '.downloaded.json'), 'w') as f:
+            json.dump({'entries': []}, f)
+
+        self.state_store.migrate('test', download_dir)
+
+        self.assertEqual([('a', 'finished', 1), ('b', 'ready', 2), ('c', 'ready', 3)],
+                         [(entry['id'], entry['status'], entry['track_number']) for entry in self.state_store.load_playlist('test')['entries']])
+        self.assertEqual(['.queued.json.migrated'], os.listdir(download_dir))
+
+    def test_migrate_keeps_saved_playlist(self):
+        download_dir = os.path.join(self.working_dir, 'test')
+        os.makedirs(download_dir)
+        self.state_store.save_playlist('test', create_playlist(['x']))
+        with open(os.path.join(download_dir, '.queued.json'), 'w') as f:
+            json.dump(create_playlist(['a']), f)
+
+        self.state_store.migrate('test', download_dir)
+
+        self.assertEqual(['x'], [entry['id'] for entry in self.state_store.load_playlist('test')['entries']])
+        # Nothing is migrated the next time
+        self.state_store.migrate('test', download_dir)
+        self.assertEqual(['.queued.json.migrated'], os.listdir(download_dir))
+
+
+class TestSavedTrackNumbers(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_metadata_is_tagged_with_saved_track_numbers(self):
+        state_store = StateStore(self.working_dir)
+        pl_data = create_playlist(['a', 'b', 'c', 'd'])
+        state_store.save_playlist('test', pl_data)
+        # Only some songs are downloaded by this run
+        state_store.save_downloaded('test', {'entries': [{'id': 'b', 'title': 'Song b'}, {'id': 'd', 'title': 'Song d'}]})
+        for entry_id in ['b', 'd']:
+            CREATORS['m4a'](os.path.join(self.working_dir, '{}.m4a'.format(entry_id)), os.urandom(4096))
+
+        editor = MetadataEditor(audio_codec='m4a', no_artwork=True, no_album_title=False, no_album_artist=False,
+                                no_track_number=False, no_composer=False, no_compilation=False, verbose=False)
+        editor.update(download_dir=self.working_dir, pl_data=state_store.load_downloaded('test'), is_playlist=True)
+
+        for entry_id, track_number in [('b', 2), ('d', 4)]:
+            audio_file = os.path.join(self.working_dir, 'Song {}.m4a'.format(entry_id))
+            handler = find_handler(audio_file)
+            self.assertEqual(track_number, handler.get(handler.open(audio_file), 'track_number'))
+        state_store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
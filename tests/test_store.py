@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from music_dl.core.store import TrackStore
+
+
+class TestTrackStore(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.store = TrackStore(self.working_dir, audio_codec='m4a', audio_bitrate=256)
+        self.downloaded_file = os.path.join(self.working_dir, 'playlist_a', 'id0001.m4a')
+        os.makedirs(os.path.dirname(self.downloaded_file))
+        with open(self.downloaded_file, 'wb') as f:
+            f.write(b'audio')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def test_store_dir_is_keyed_by_codec_and_bitrate(self):
+        self.assertEqual(os.path.join(self.working_dir, '.tracks', 'm4a', '256'), self.store.store_dir)
+        self.assertEqual(os.path.join(self.store.store_dir, 'id0001.mp3'), self.store.audio_file('id0001', 'mp3'))
+
+    def test_add_and_load(self):
+        self.assertIsNone(self.store.load('id0001'))
+        self.store.add({'id': 'id0001', 'title': 'Song', 'ext': 'm4a', 'filepath': self.downloaded_file})
+
+        self.assertEqual({'id': 'id0001', 'title': 'Song', 'ext': 'm4a'}, self.store.load('id0001'))
+        # Downloaded file stays in the playlist folder, and the store keeps its own file
+        self.assertTrue(os.path.isfile(self.downloaded_file))
+        self.assertEqual(1, os.stat(self.downloaded_file).st_nlink)
+        with open(self.store.audio_file('id0001'), 'rb') as f:
+            self.assertEqual(b'audio', f.read())
+
+    def test_song_without_audio_is_not_stored(self):
+        self.store.add({'id': 'id0001', 'ext': 'm4a', 'filepath': self.downloaded_file})
+        os.remove(self.store.audio_file('id0001'))
+        self.assertIsNone(self.store.load('id0001'))
+
+        self.store.add({'id': 'id0002', 'ext': 'm4a', 'filepath': os.path.join(self.working_dir, 'missing.m4a')})
+        self.assertIsNone(self.store.load('id0002'))
+
+    def test_link_creates_independent_file(self):
+        self.store.add({'id': 'id0001', 'ext': 'm4a', 'filepath': self.downloaded_file})
+        target_file = os.path.join(self.working_dir, 'playlist_b', 'id0001.m4a')
+        os.makedirs(os.path.dirname(target_file))
+        self.store.link('id0001', target_file)
+
+        self.assertEqual(1, os.stat(target_file).st_nlink)
+        self.assertFalse(os.path.samefile(target_file, self.store.audio_file('id0001')))
+        self.assertEqual([], [name for name in os.listdir(os.path.dirname(target_file)) if name.endswith('.tmp')])
+
+        # Tags written into the playlist folder never change the stored file
+        with open(target_file, 'ab') as f:
+            f.write(b'tags')
+        with open(self.store.audio_file('id0001'), 'rb') as f:
+            self.assertEqual(b'audio', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmarks.bench_merge import BENCHMARK_URL, PlaylistYoutubeDL, generate_playlist
+from music_dl.core.playlist import Playlist
+from music_dl.core.state import StateStore, STAGING_SUFFIX
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+
+class TestStreamStaging(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.state_store = StateStore(self.working_dir)
+        pl_data = generate_playlist(3, private_ratio=0)
+        for entry in pl_data['entries']:
+            entry['status'] = YDLQueueStatus.finished.value
+        self.state_store.save_playlist('test', pl_data)
+
+    def tearDown(self):
+        self.state_store.close()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def stage(self, entry_ids, status=YDLQueueStatus.ready.value):
+        self.state_store.begin_stream('test')
+        self.state_store.append_stream('test', [(position, {'id': entry_id, 'status': status, 'track_number': position + 1})
+                                                for position, entry_id in enumerate(entry_ids)])
+
+    def test_saved_playlist_is_kept_while_streaming(self):
+        self.stage(['new'])
+        self.assertEqual(YDLQueueStatus.finished.value, self.state_store.get_status('test', 'id000000000'))
+        self.assertIsNone(self.state_store.get_status('test', 'new'))
+        self.assertEqual(YDLQueueStatus.ready.value, self.state_store.get_status('test' + STAGING_SUFFIX, 'new'))
+
+    def test_finish_replaces_saved_playlist(self):
+        self.stage(['id000000001', 'new'])
+        self.state_store.finish_stream('test', {'id': 'PLtest', 'title': 'Streamed'})
+
+        pl_data = self.state_store.load_playlist('test')
+        self.assertEqual('Streamed', pl_data['title'])
+        self.assertEqual(['id000000001', 'new'], [entry['id'] for entry in pl_data['entries']])
+        self.assertFalse(self.state_store.has_playlist('test' + STAGING_SUFFIX) or self.state_store.load_queue_status('test' + STAGING_SUFFIX))
+
+    def test_finish_replaces_only_range_streamed(self):
+        self.state_store.begin_stream('test')
+        self.state_store.append_stream('test', [(1, {'id': 'new', 'status': YDLQueueStatus.ready.value, 'track_number': 2})])
+        self.state_store.finish_stream('test', {'id': 'PLtest'}, 1, 2)
+        self.assertEqual(['id000000000', 'new', 'id000000002'], [entry['id'] for entry in self.state_store.load_playlist('test')['entries']])
+
+    def test_discard_keeps_saved_playlist(self):
+        self.stage(['new'])
+        self.state_store.discard_stream('test')
+        self.assertEqual(['id000000000', 'id000000001', 'id000000002'], [entry['id'] for entry in self.state_store.load_playlist('test')['entries']])
+        self.assertIsNone(self.state_store.get_status('test' + STAGING_SUFFIX, 'new'))
+
+
+class TestStreamWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.lock = threading.Lock()
+        self.yielded = 0
+        self.finished = 0
+        self.max_outstanding = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def stream(self, pl_data, stream_window=4, fail_at=None):
+        entries = pl_data['entries']
+
+        def generate():
+            for index, entry in enumerate(entries):
+                if index == fail_at:
+                    raise IOError('Connection reset')
+                # Private or deleted entries are removed without downloading
+                if entry['title'] != '[Private video]':
+                    with self.lock:
+                        self.yielded += 1
+                yield entry
+
+        def download_entry(entry, queue_index, queue_total):
+            with self.lock:
+                self.max_outstanding = max(self.max_outstanding, self.yielded - self.finished)
+            time.sleep(random.uniform(0, 0.01))
+            with self.lock:
+                self.finished += 1
+            return {'id': entry['id'], 'title': entry['title']}
+
+        playlist = Playlist(download_url=BENCHMARK_URL, working_dir=self.working_dir, jobs=3, stream=True, stream_window=stream_window,
+                            cache_ttl=0, test_id='test')
+        playlist.ydl = PlaylistYoutubeDL(pl_data=dict(pl_data, entries=generate()))
+        playlist.preprocess(playlist.download_url, self.working_dir)
+        playlist._Playlist__download_entry = download_entry
+        playlist.download()
+        return playlist
+
+    def test_entries_in_memory_are_bounded_by_window(self):
+        playlist = self.stream(generate_playlist(40, private_ratio=0.1))
+
+        self.assertLessEqual(self.max_outstanding, 4)
+        self.assertEqual(self.yielded, self.finished)
+        # Songs finished in any order are listed in order of the playlist
+        downloaded_ids = [entry['id'] for entry in playlist.downloaded_playlist_data['entries']]
+        self.assertEqual(sorted(downloaded_ids), downloaded_ids)
+        self.assertEqual(self.finished, len(downloaded_ids))
+        self.assertIsNotNone(playlist.state_store.load_playlist(playlist.playlist_key))
+
+    def test_interrupted_stream_keeps_saved_playlist(self):
+        playlist = self.stream(generate_playlist(10, private_ratio=0), fail_at=6)
+        self.assertEqual(6, self.finished)
+        self.assertFalse(playlist.state_store.has_playlist(playlist.playlist_key))
+        self.assertIsNone(playlist.state_store.load_queue_status(playlist.playlist_key + STAGING_SUFFIX))
+
+
+if __name__ == '__main__':
+    unittest.main()
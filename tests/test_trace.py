@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from music_dl.core.trace import TraceRecorder
+
+
+class TestTraceRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.trace_dir = tempfile.mkdtemp()
+        self.trace_file = os.path.join(self.trace_dir, 'trace', 'music_dl.trace.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.trace_dir, ignore_errors=True)
+
+    def load(self, recorder):
+        recorder.write(self.trace_file)
+        with open(self.trace_file, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_write(self):
+        recorder = TraceRecorder()
+        with recorder.span('extract', url='https://example.com'):
+            pass
+        started_at = time.perf_counter()
+        worker = threading.Thread(target=lambda: recorder.complete('download', started_at, started_at + 0.5, song_id='a'), name='worker')
+        worker.start()
+        worker.join()
+
+        trace = self.load(recorder)
+
+        self.assertEqual('ms', trace['displayTimeUnit'])
+        metadata = [event for event in trace['traceEvents'] if event['ph'] == 'M']
+        spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual({'name': 'music_dl'}, metadata[0]['args'])
+        self.assertEqual({'MainThread', 'worker'}, {event['args']['name'] for event in metadata if event['name'] == 'thread_name'})
+
+        extract, download = spans
+        self.assertEqual(('extract', 'run', {'url': 'https://example.com'}), (extract['name'], extract['cat'], extract['args']))
+        self.assertEqual(('download', 'song', {'id': 'a'}), (download['name'], download['cat'], download['args']))
+        self.assertAlmostEqual(500000, download['dur'])
+        self.assertLessEqual(extract['ts'], download['ts'])
+        self.assertNotEqual(extract['tid'], download['tid'])
+
+    def test_events_follow_chrome_trace_format(self):
+        recorder = TraceRecorder()
+        threads = [threading.Thread(target=lambda index=index: [recorder.complete(name, time.perf_counter(), song_id='id{}'.format(index))
+                                                                for name in ['download', 'transcode', 'tag']], name='worker-{}'.format(index))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        trace = self.load(recorder)
+
+        self.assertEqual({'traceEvents', 'displayTimeUnit'}, set(trace))
+        thread_names = {}
+        for event in trace['traceEvents']:
+            self.assertEqual(os.getpid(), event['pid'])
+            self.assertIsInstance(event['tid'], int)
+            self.assertIsInstance(event['args'], dict)
+            if event['ph'] == 'M':
+                self.assertIn(event['name'], ['process_name', 'thread_name', 'thread_sort_index'])
+                if event['name'] == 'thread_name':
+                    thread_names[event['tid']] = event['args']['name']
+            else:
+                self.assertEqual('X', event['ph'])
+                # Timestamps and durations are microseconds from the start of the run
+                self.assertIsInstance(event['ts'], float)
+                self.assertGreaterEqual(event['ts'], 0)
+                self.assertGreaterEqual(event['dur'], 0)
+                self.assertIn(event['tid'], thread_names)
+
+        spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(12, len(spans))
+        self.assertEqual(sorted(span['ts'] for span in spans), [span['ts'] for span in spans])
+        self.assertEqual({'worker-{}'.format(index) for index in range(4)}, set(thread_names.values()))
+        for span in spans:
+            self.assertEqual('worker-{}'.format(span['args']['id'][2:]), thread_names[span['tid']])
+
+    def test_span_is_recorded_when_block_fails(self):
+        recorder = TraceRecorder()
+        with self.assertRaises(ValueError):
+            with recorder.span('tag', song_id='a'):
+                raise ValueError()
+
+        spans = [event for event in self.load(recorder)['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual([('tag', {'id': 'a'})], [(span['name'], span['args']) for span in spans])
+
+
+if __name__ == '__main__':
+    unittest.main()
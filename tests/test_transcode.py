@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks.bench_merge import generate_playlist, preprocess_playlist
+from music_dl.core.metadata import MetadataEditor
+from music_dl.core.scheduler import DownloadScheduler
+from music_dl.core.transcode import Transcoder
+from music_dl.core.youtube_dl import YDLQueueStatus
+
+# JPEG embedded as artwork
+ARTWORK = (b'\xff\xd8\xff\xe0' + b'\0' * 1024, 'image/jpeg')
+
+
+class FakeFFmpeg(object):
+    """
+    Stand-in for subprocess.run which writes the output file of ffmpeg, or fails as ffmpeg older than 4.4 does if artwork is embedded into m4a
+    """
+
+    def __init__(self, fails=False, fails_with_artwork=False):
+        self.fails = fails
+        self.fails_with_artwork = fails_with_artwork
+        self.commands = []
+
+    def __call__(self, command, **kwargs):
+        self.commands.append(command)
+        if self.fails:
+            return subprocess.CompletedProcess(command, 1, b'', b'Invalid data found when processing input')
+        if self.fails_with_artwork and 'attached_pic' in command:
+            return subprocess.CompletedProcess(command, 1, b'', b'Could not find tag for codec mjpeg in stream #1')
+        with open(command[-1], 'wb') as f:
+            f.write(b'transcoded')
+        return subprocess.CompletedProcess(command, 0, b'', b'')
+
+
+class TestTranscoder(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.source_file = os.path.join(self.working_dir, 'id0001.webm')
+        with open(self.source_file, 'wb') as f:
+            f.write(b'downloaded')
+        self.callbacks = []
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def transcode(self, ffmpeg, transcoder=None, **kwargs):
+        transcoder = transcoder or Transcoder(workers=1)
+        with mock.patch('music_dl.core.transcode.subprocess.run', side_effect=ffmpeg):
+            transcoder.start()
+            future = transcoder.submit(self.source_file, 'm4a', 198, source_codec='opus', callback=lambda *args: self.callbacks.append(args), **kwargs)
+            transcoder.join()
+        return future
+
+    def test_transcode(self):
+        ffmpeg = FakeFFmpeg()
+        future = self.transcode(ffmpeg, metadata={'title': 'Song'}, source_bitrate=128.4)
+
+        target_file = os.path.join(self.working_dir, 'id0001.m4a')
+        self.assertEqual(target_file, future.result())
+        command, = ffmpeg.commands
+        self.assertEqual(['ffmpeg', '-y', '-loglevel', 'error', '-i', self.source_file, '-map', '0:a',
+                          '-acodec', 'aac', '-b:a', '128k', '-bsf:a', 'aac_adtstoasc', '-metadata', 'title=Song'], command[:-1])
+        # Transcoded file is written with a temporary name and renamed when it is complete
+        self.assertNotEqual(target_file, command[-1])
+        self.assertEqual(['id0001.m4a'], os.listdir(self.working_dir))
+        self.assertEqual([(target_file, self.callbacks[0][1], False)], self.callbacks)
+
+    def test_nice_and_ionice(self):
+        ffmpeg = FakeFFmpeg()
+        with mock.patch('shutil.which', return_value='/usr/bin/ionice'):
+            self.transcode(ffmpeg, Transcoder(workers=1, ionice='idle')).result()
+        self.assertEqual(['ionice', '-c', '3', 'ffmpeg'], ffmpeg.commands[0][:4])
+
+    def test_failure(self):
+        future = self.transcode(FakeFFmpeg(fails=True), artwork=ARTWORK)
+
+        with self.assertRaises(RuntimeError) as context:
+            future.result()
+        self.assertIn('Invalid data found when processing input', str(context.exception))
+        # Downloaded file is kept, and neither temporary files nor artwork are left
+        self.assertEqual(['id0001.webm'], os.listdir(self.working_dir))
+        self.assertEqual([], self.callbacks)
+
+    def test_source_metadata(self):
+        metadata = Transcoder.source_metadata({'title': 'Video', 'track': 'Song', 'uploader': 'Uploader', 'upload_date': '20180101',
+                                               'description': 'Description', 'track_number': 3})
+        self.assertEqual({'title': 'Song', 'artist': 'Uploader', 'date': '20180101', 'description': 'Description', 'comment': 'Description',
+                          'track': 3}, metadata)
+
+
+class TestArtworkDropped(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.playlist = preprocess_playlist(self.working_dir, generate_playlist(1, private_ratio=0))
+        self.processed = []
+        self.editor = MetadataEditor(audio_codec='m4a', no_artwork=False, no_album_title=False, no_album_artist=False,
+                                     no_track_number=False, no_composer=False, no_compilation=False, verbose=False)
+
+        # Attributes set by Playlist.download
+        self.playlist.processed_hook = lambda entry, track_number, process_index, process_total: self.processed.append((entry['id'], track_number))
+        self.playlist.metadata_editor = self.editor
+        self.playlist.transcoder = Transcoder(workers=1).start()
+        self.playlist.running_scheduler = DownloadScheduler()
+        self.playlist.transcode_futures = []
+
+        self.song_id = self.playlist.playlist_data['entries'][0]['id']
+        self.data = {'id': self.song_id, 'title': 'Song 1', 'acodec': 'opus', 'ext': 'webm',
+                     'filepath': os.path.join(self.playlist.download_dir, '{}.webm'.format(self.song_id))}
+        with open(self.data['filepath'], 'wb') as f:
+            f.write(b'downloaded')
+
+    def tearDown(self):
+        self.playlist.running_scheduler.shutdown()
+        self.playlist.state_store.close()
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+    def transcode(self, ffmpeg):
+        with mock.patch('music_dl.core.transcode.subprocess.run', side_effect=ffmpeg), mock.patch.object(self.editor, 'get_artwork', return_value=ARTWORK):
+            self.playlist._Playlist__transcode_hook(self.data)
+            self.playlist.transcoder.join()
+        for _, future in self.playlist.transcode_futures:
+            future.result()
+
+    def test_song_tagged_by_ffmpeg_is_finished(self):
+        ffmpeg = FakeFFmpeg()
+        self.transcode(ffmpeg)
+
+        self.assertEqual(1, len(ffmpeg.commands))
+        self.assertEqual([], self.processed)
+        self.assertEqual(YDLQueueStatus.finished.value, self.playlist.state_store.get_status(self.playlist.playlist_key, self.song_id))
+
+    def test_song_without_artwork_is_passed_to_processed_hook(self):
+        ffmpeg = FakeFFmpeg(fails_with_artwork=True)
+        self.transcode(ffmpeg)
+
+        # Song is transcoded again without artwork, and artwork is added by metadata editor
+        self.assertEqual(2, len(ffmpeg.commands))
+        self.assertNotIn('attached_pic', ffmpeg.commands[1])
+        self.assertEqual([(self.song_id, 1)], self.processed)
+        self.assertEqual(YDLQueueStatus.transcoded.value, self.playlist.state_store.get_status(self.playlist.playlist_key, self.song_id))
+        self.assertTrue(os.path.isfile(os.path.join(self.playlist.download_dir, 'Song 1.m4a')))
+
+
+if __name__ == '__main__':
+    unittest.main()